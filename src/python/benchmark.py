@@ -0,0 +1,427 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from config_manager import DEFAULT_CONFIG
+from frame_cache import encode_session
+from itch_clock import nanoseconds_since_midnight
+from market_data_gen_new import generate_realistic_market_data, save_to_csv, load_from_csv
+from market_data_generator import generate_market_data
+from matching_engine import MatchingEngine
+from order_ids import OrderIdAllocator, remap_session_ids
+from session_columns import SessionColumns, load_session_csv
+from packet_utils import create_add_order_packet, create_cancel_order_packet, parse_fpga_response_packet
+from stock_book import StockBook
+from tb_stimulus import write_stimulus
+
+BOOK_DEPTHS = [16, 64, 256, 1024, 4096]
+
+# Registered benchmarks: name -> setup function returning (callable, operations per call)
+BENCHMARKS = {}
+
+def benchmark(name):
+    """Register a benchmark setup function under a name."""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+@benchmark("clock/nanoseconds_since_midnight")
+def bench_clock():
+    def run():
+        for _ in range(1000):
+            nanoseconds_since_midnight()
+    return run, 1000
+
+@benchmark("encode/add_order")
+def bench_encode_add():
+    def run():
+        for i in range(1000):
+            create_add_order_packet(i & 3, i & 0xFF, 75.5, 100, True)
+    return run, 1000
+
+@benchmark("encode/cancel_order")
+def bench_encode_cancel():
+    def run():
+        for i in range(1000):
+            create_cancel_order_packet(i & 3, i & 0xFF, 100)
+    return run, 1000
+
+@benchmark("encode/frame_cache")
+def bench_encode_frame_cache():
+    cache = encode_session(_session(1000))
+    def run():
+        for i in range(1000):
+            cache.frame(i)
+    return run, 1000
+
+@benchmark("decode/fpga_response")
+def bench_decode_response():
+    packets = [bytearray([7, i & 3, 1, 100, 0, 75, 128]) for i in range(1000)]
+    def run():
+        for packet in packets:
+            parse_fpga_response_packet(packet)
+    return run, 1000
+
+@benchmark("matching/submit")
+def bench_matching():
+    # Orders around a common mid price, so a large share of them cross and trade
+    rng = random.Random(0)
+    orders = [(i, i & 3, rng.random() < 0.5, round(rng.gauss(75, 0.5), 2), rng.randint(1, 255))
+              for i in range(10000)]
+    def run():
+        engine = MatchingEngine()
+        for order_id, stock_id, is_buy, price, quantity in orders:
+            engine.submit(order_id, stock_id, is_buy, price, quantity)
+            if order_id % 3 == 0:
+                engine.cancel(order_id - 30)
+    return run, len(orders)
+
+@benchmark("order_ids/allocate_release")
+def bench_order_ids():
+    # Allocator kept full, so every allocation follows an eviction or release
+    allocator = OrderIdAllocator()
+    while not allocator.full:
+        allocator.allocate(0, True)
+    def run():
+        for i in range(1000):
+            if i & 1:
+                allocator.evict()
+            else:
+                allocator.release(allocator.oldest()[0])
+            allocator.allocate(i & 3, i & 2 == 0)
+    return run, 1000
+
+@benchmark("order_ids/remap_session")
+def bench_remap_session():
+    # Sequential source IDs: every order needs a board ID and the space fills up
+    session = SessionColumns.from_rows(_session(5000))
+    for index in range(len(session)):
+        session.order_ids[index] += 1000
+    def run():
+        remap_session_ids(session)
+    return run, len(session)
+
+def _filled_book(depth, num_stocks=4):
+    rng = random.Random(depth)
+    book = StockBook()
+    for order_id in range(depth * num_stocks):
+        book.add_order(order_id, order_id % num_stocks, rng.random() < 0.5,
+                       round(rng.uniform(50, 100), 2), rng.randint(1, 255))
+    return book
+
+def _make_book_benchmarks(depth):
+    @benchmark(f"book/add_remove/depth_{depth}")
+    def bench_add_remove():
+        book = _filled_book(depth, 1)
+        rng = random.Random(1)
+        prices = [round(rng.uniform(50, 100), 2) for _ in range(100)]
+        next_id = [depth]
+        def run():
+            # Add and remove 100 orders around a book held at the target depth
+            start = next_id[0]
+            for i, price in enumerate(prices):
+                book.add_order(start + i, 0, i & 1 == 0, price, 10)
+            for i in range(len(prices)):
+                book.remove_order(start + i)
+            next_id[0] = start + len(prices)
+        return run, 2 * len(prices)
+
+    @benchmark(f"book/best_price/depth_{depth}")
+    def bench_best_price():
+        book = _filled_book(depth)
+        def run():
+            for _ in range(250):
+                for stock_id in range(4):
+                    book.get_highest_buy(stock_id)
+                    book.get_lowest_sell(stock_id)
+        return run, 2000
+
+    @benchmark(f"book/depth_query/depth_{depth}")
+    def bench_depth_query():
+        # Unchanged book: served from the per-side cache
+        book = _filled_book(depth)
+        def run():
+            for _ in range(125):
+                for stock_id in range(4):
+                    book.get_depth(stock_id, True)
+                    book.get_depth(stock_id, False)
+        return run, 1000
+
+    @benchmark(f"book/depth_after_update/depth_{depth}")
+    def bench_depth_after_update():
+        # Every query follows a change to the same side and re-aggregates it
+        book = _filled_book(depth, 1)
+        next_id = [depth]
+        def run():
+            start = next_id[0]
+            for i in range(100):
+                book.add_order(start + i, 0, True, 75.0 + (i & 7) / 100, 10)
+                book.get_depth(0, True)
+            for i in range(100):
+                book.remove_order(start + i)
+            next_id[0] = start + 100
+        return run, 100
+
+for _depth in BOOK_DEPTHS:
+    _make_book_benchmarks(_depth)
+
+@benchmark("generator/market_data_generator")
+def bench_generator():
+    config = dict(DEFAULT_CONFIG)
+    def run():
+        random.seed(1)
+        generate_market_data(5000, config)
+    return run, 5000
+
+@benchmark("generator/market_data_gen_new")
+def bench_generator_new():
+    def run():
+        random.seed(1)
+        generate_realistic_market_data(number_of_stocks=4, rows_per_stock=1250)
+    return run, 5000
+
+def _session(rows=5000):
+    random.seed(1)
+    return generate_market_data(rows, dict(DEFAULT_CONFIG))
+
+@benchmark("csv/save")
+def bench_csv_save():
+    data = _session()
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, "session.csv")
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            save_to_csv(data, filename)
+    return run, len(data)
+
+@benchmark("csv/load")
+def bench_csv_load():
+    data = _session()
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, "session.csv")
+    with contextlib.redirect_stdout(io.StringIO()):
+        save_to_csv(data, filename)
+    def run():
+        load_from_csv(filename)
+    return run, len(data)
+
+@benchmark("csv/load_columns")
+def bench_csv_load_columns():
+    data = _session()
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, "session.csv")
+    with contextlib.redirect_stdout(io.StringIO()):
+        save_to_csv(data, filename)
+    def run():
+        load_session_csv(filename)
+    return run, len(data)
+
+@benchmark("tb/stimulus")
+def bench_tb_stimulus():
+    data = _session(20000)
+    prefix = os.path.join(tempfile.mkdtemp(), "session")
+    def run():
+        write_stimulus(data, prefix)
+    return run, len(data)
+
+@benchmark("tb/stimulus_uart")
+def bench_tb_stimulus_uart():
+    data = _session(20000)
+    prefix = os.path.join(tempfile.mkdtemp(), "session")
+    def run():
+        write_stimulus(data, prefix, uart=True)
+    return run, len(data)
+
+@benchmark("plot/update_plot")
+def bench_update_plot():
+    # Needs a display, Tk and matplotlib; reported as skipped otherwise
+    import tkinter as tk
+    from real_time_plotter import RealTimePlotter
+
+    root = tk.Tk()
+    root.withdraw()
+    plotter = RealTimePlotter(root, max_points=100)
+    for i in range(100):
+        plotter.add_data_point(0, 75 + i / 100, 100 + i)
+        plotter.add_highest_order_price(0, 76 + i / 100)
+    def run():
+        plotter.update_plot(0)
+    return run, 1
+
+# Entry points whose cold start (a fresh interpreter importing the module) is tracked
+STARTUP_MODULES = ['main', 'wire_capture', 'itch_replayer', 'top_of_book', 'book_service',
+                   'market_data_gen_new', 'metrics']
+
+def _startup(code):
+    command = [sys.executable, "-c", code]
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    def run():
+        subprocess.run(command, cwd=cwd, check=True, capture_output=True)
+    return run, 1
+
+@benchmark("startup/python")
+def bench_startup_python():
+    # Bare interpreter start, the floor for the entry points below
+    return _startup("pass")
+
+def _make_startup_benchmark(module):
+    @benchmark(f"startup/{module}")
+    def bench_startup():
+        return _startup(f"import {module}")
+
+for _module in STARTUP_MODULES:
+    _make_startup_benchmark(_module)
+
+def run_benchmark(setup, min_time=0.2, repeat=5):
+    """
+    Time a benchmark.
+
+    The callable is run enough times per sample to take at least
+    min_time / repeat seconds; the reported figure is the median of the
+    samples, per operation.
+
+    Parameters:
+    - setup: Setup function returning (callable, operations per call)
+    - min_time: Approximate total measuring time in seconds
+    - repeat: Number of samples
+
+    Returns:
+    - Dictionary with ns_per_op (median), min_ns_per_op, ops_per_sec and samples
+    """
+    func, ops = setup()
+    func()  # warm up
+
+    # Calibrate the number of calls per sample
+    calls = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(calls):
+            func()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= min_time * 1e9 / repeat or calls >= 1 << 20:
+            break
+        calls *= 2
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(calls):
+            func()
+        samples.append((time.perf_counter_ns() - start) / (calls * ops))
+
+    median = statistics.median(samples)
+    return {
+        'ns_per_op': median,
+        'min_ns_per_op': min(samples),
+        'ops_per_sec': 1e9 / median if median else 0.0,
+        'samples': samples,
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+def run_suite(selected=None, min_time=0.2, repeat=5):
+    """
+    Run all (or the selected) benchmarks.
+
+    Parameters:
+    - selected: Optional list of name prefixes to run
+    - min_time: Approximate measuring time per benchmark in seconds
+    - repeat: Number of samples per benchmark
+
+    Returns:
+    - Result dictionary suitable for JSON output
+    """
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if selected and not any(name.startswith(prefix) for prefix in selected):
+            continue
+        try:
+            results[name] = run_benchmark(setup, min_time, repeat)
+        except Exception as e:  # missing GUI stack, no display, ...
+            results[name] = {'skipped': f"{type(e).__name__}: {e}"}
+    return {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'results': results,
+    }
+
+def compare(baseline, current, threshold=0.10):
+    """
+    Compare two result sets.
+
+    Parameters:
+    - baseline: Result dictionary from an earlier run
+    - current: Result dictionary from this run
+    - threshold: Relative slowdown that counts as a regression
+
+    Returns:
+    - List of (name, baseline ns/op, current ns/op, ratio, regressed) tuples
+    """
+    rows = []
+    for name, result in current['results'].items():
+        old = baseline['results'].get(name)
+        if not old or 'ns_per_op' not in old or 'ns_per_op' not in result:
+            continue
+        ratio = result['ns_per_op'] / old['ns_per_op'] if old['ns_per_op'] else 0.0
+        rows.append((name, old['ns_per_op'], result['ns_per_op'], ratio, ratio > 1 + threshold))
+    return rows
+
+def main():
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the simulator's hot paths")
+    parser.add_argument("names", nargs="*", help="Only run benchmarks starting with these prefixes")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Compare against a previous JSON result file")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Regression threshold (default 10%%)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Measuring time per benchmark in seconds")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--list", action="store_true", help="List benchmark names")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return 0
+
+    suite = run_suite(args.names, args.min_time, args.repeat)
+    for name, result in suite['results'].items():
+        if 'skipped' in result:
+            print(f"{name:40} skipped ({result['skipped']})")
+        else:
+            print(f"{name:40} {result['ns_per_op']:12.1f} ns/op {result['ops_per_sec']:14.0f} ops/s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(suite, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = 0
+        print(f"\nCompared with {baseline.get('commit') or args.compare}:")
+        for name, old, new, ratio, regressed in compare(baseline, suite, args.threshold):
+            regressions += regressed
+            print(f"{name:40} {old:12.1f} -> {new:12.1f} ns/op  x{ratio:5.2f}{'  REGRESSION' if regressed else ''}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+import os
+import struct
+
+from stock_book import StockBook
+
+JOURNAL_MAGIC = b'HFTJRNL'
+JOURNAL_VERSION = 1
+JOURNAL_HEADER = struct.Struct('<7sHQ')  # magic, version, sequence of the first record
+
+# Fixed-size records make seeking to the tail after a snapshot O(1)
+JOURNAL_RECORD = struct.Struct('<QBQIBdI')  # sequence, op, order_id, stock_id, is_buy, price, quantity
+
+OP_ADD = 1
+OP_REMOVE = 2
+OP_REDUCE = 3  # quantity is the number of shares taken off
+
+class BookJournal:
+    """
+    Write-ahead journal and periodic snapshots for a StockBook.
+
+    Every book change goes through the journal, which applies it to the
+    book and appends a fixed-size record. Every snapshot_interval changes
+    a snapshot is written atomically and the journal restarts, so recovery
+    only has to replay the journal tail recorded after the last snapshot.
+    """
+
+    def __init__(self, journal_file, snapshot_file, book=None, snapshot_interval=10000):
+        """
+        Open (recovering if needed) a journaled book.
+
+        Parameters:
+        - journal_file: Path of the journal
+        - snapshot_file: Path of the snapshot
+        - book: Optional StockBook to start from when no journal exists
+        - snapshot_interval: Number of journal records between snapshots (0 disables)
+        """
+        self.journal_file = journal_file
+        self.snapshot_file = snapshot_file
+        self.snapshot_interval = snapshot_interval
+
+        self.since_snapshot = 0
+        if os.path.exists(journal_file) or os.path.exists(snapshot_file):
+            self.book, self.sequence, self.replayed = recover(journal_file, snapshot_file)
+            # Snapshot the recovered book and start a fresh journal: appending to the
+            # old one would put new records after a torn last record, misaligned
+            self.file = open(journal_file, 'ab')
+            self.snapshot()
+        else:
+            self.book = book if book is not None else StockBook()
+            self.sequence = 0
+            self.replayed = 0
+            self.file = open(journal_file, 'wb')
+            self.file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION, self.sequence + 1))
+
+    def add_order(self, order_id, stock_id, is_buy, price, quantity):
+        """
+        Journal and apply an order addition (same parameters as StockBook.add_order).
+        """
+        self._append(OP_ADD, order_id, stock_id, is_buy, price, quantity)
+        self.book.add_order(order_id, stock_id, is_buy, price, quantity)
+        self._maybe_snapshot()
+
+    def remove_order(self, order_id):
+        """
+        Journal and apply an order removal.
+
+        Parameters:
+        - order_id: Identifier of the order to remove
+
+        Returns:
+        - True if the order was found and removed, False otherwise
+        """
+        order = self.book.orders.get(order_id)
+        if order is None:
+            return False
+        self._append(OP_REMOVE, order_id, order["stock_id"], order["is_buy"], 0.0, 0)
+        self.book.remove_order(order_id)
+        self._maybe_snapshot()
+        return True
+
+    def reduce_order(self, order_id, quantity):
+        """
+        Journal and apply a partial reduction (see StockBook.reduce_order).
+
+        Returns:
+        - Remaining quantity, or None if the order is not in the book
+        """
+        order = self.book.orders.get(order_id)
+        if order is None:
+            return None
+        self._append(OP_REDUCE, order_id, order["stock_id"], order["is_buy"], 0.0, quantity)
+        remaining = self.book.reduce_order(order_id, quantity)
+        self._maybe_snapshot()
+        return remaining
+
+    def execute_order(self, order_id, quantity):
+        """
+        Journal and apply an execution (see StockBook.execute_order).
+
+        Returns:
+        - Shares actually executed
+        """
+        order = self.book.orders.get(order_id)
+        if order is None:
+            return 0
+        executed = min(quantity, order["quantity"])
+        self.reduce_order(order_id, quantity)
+        return executed
+
+    def replace_order(self, order_id, new_order_id, price, quantity):
+        """
+        Journal and apply a replace as a removal followed by an addition.
+
+        Returns:
+        - True if the original order was found and replaced, False otherwise
+        """
+        order = self.book.orders.get(order_id)
+        if order is None:
+            return False
+        stock_id, is_buy = order["stock_id"], order["is_buy"]
+        self.remove_order(order_id)
+        self.add_order(new_order_id, stock_id, is_buy, price, quantity)
+        return True
+
+    def _append(self, op, order_id, stock_id, is_buy, price, quantity):
+        self.sequence += 1
+        self.file.write(JOURNAL_RECORD.pack(self.sequence, op, order_id, stock_id, is_buy,
+                                            price if price is not None else 0.0,
+                                            quantity if quantity is not None else 0))
+
+    def _maybe_snapshot(self):
+        self.since_snapshot += 1
+        if self.snapshot_interval and self.since_snapshot >= self.snapshot_interval:
+            self.snapshot()
+
+    def snapshot(self):
+        """Write a snapshot of the current book atomically and truncate the journal."""
+        self.file.flush()
+        temp_file = self.snapshot_file + '.tmp'
+        with open(temp_file, 'wb') as f:
+            f.write(self.book.to_snapshot(self.sequence))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.snapshot_file)
+        self.since_snapshot = 0
+        
+        # Everything up to self.sequence is in the snapshot, so start a fresh journal
+        self.file.close()
+        self.file = open(self.journal_file, 'wb')
+        self.file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION, self.sequence + 1))
+
+    def flush(self):
+        """Flush buffered journal records to the OS."""
+        self.file.flush()
+
+    def close(self):
+        """Write a final snapshot and close the journal."""
+        self.snapshot()
+        self.file.close()
+
+def read_journal(journal_file, after_sequence=0):
+    """
+    Read journal records newer than a sequence number.
+
+    Parameters:
+    - journal_file: Path of the journal
+    - after_sequence: Only records with a larger sequence are returned
+
+    Yields:
+    - (sequence, op, order_id, stock_id, is_buy, price, quantity) tuples
+    """
+    with open(journal_file, 'rb') as f:
+        header = f.read(JOURNAL_HEADER.size)
+        if len(header) < JOURNAL_HEADER.size:
+            return
+        magic, version, first_sequence = JOURNAL_HEADER.unpack(header)
+        if magic != JOURNAL_MAGIC:
+            raise ValueError(f"{journal_file} is not a book journal")
+        if version != JOURNAL_VERSION:
+            raise ValueError(f"Unsupported journal version {version}")
+
+        # Jump straight to the first record after the snapshot
+        skip = max(0, after_sequence + 1 - first_sequence)
+        f.seek(JOURNAL_HEADER.size + skip * JOURNAL_RECORD.size)
+        data = f.read()
+
+    usable = len(data) - len(data) % JOURNAL_RECORD.size  # drop a torn last record
+    for record in JOURNAL_RECORD.iter_unpack(data[:usable]):
+        if record[0] > after_sequence:
+            yield record
+
+def recover(journal_file, snapshot_file):
+    """
+    Rebuild a book from the last snapshot plus the journal tail.
+
+    Parameters:
+    - journal_file: Path of the journal
+    - snapshot_file: Path of the snapshot
+
+    Returns:
+    - Tuple (StockBook, last sequence number, number of replayed records)
+    """
+    if os.path.exists(snapshot_file):
+        with open(snapshot_file, 'rb') as f:
+            book, sequence = StockBook.from_snapshot(f.read())
+    else:
+        book, sequence = StockBook(), 0
+
+    replayed = 0
+    if os.path.exists(journal_file):
+        for sequence, op, order_id, stock_id, is_buy, price, quantity in read_journal(journal_file, sequence):
+            if op == OP_ADD:
+                book.add_order(order_id, stock_id, bool(is_buy), price, quantity)
+            elif op == OP_REMOVE:
+                book.remove_order(order_id)
+            elif op == OP_REDUCE:
+                book.reduce_order(order_id, quantity)
+            replayed += 1
+    return book, sequence, replayed
+
+def book_to_packets(book):
+    """
+    Produce ADD rows that re-create a book on a freshly reset board.
+
+    Orders are emitted in insertion order so the board sees the same time
+    priority as the host.
+
+    Parameters:
+    - book: StockBook to re-create
+
+    Returns:
+    - List of session row dictionaries
+    """
+    return [{
+        'type': 'ADD',
+        'stock_id': order["stock_id"],
+        'order_id': order_id,
+        'is_buy': order["is_buy"],
+        'price': order["price"],
+        'quantity': order["quantity"]
+    } for order_id, order in book.orders.items()]
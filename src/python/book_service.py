@@ -0,0 +1,358 @@
+import struct
+import time
+from collections import deque
+
+from stock_book import StockBook
+from top_of_book import TopOfBookTable
+
+# Command ring layout: producer index, consumer index and stop flag on
+# separate cache lines, followed by fixed-size command records
+RING_INDEX = struct.Struct('<Q')
+RING_HEAD_OFFSET = 0
+RING_TAIL_OFFSET = 64
+RING_STOP_OFFSET = 128
+RING_HEADER_SIZE = 192
+COMMAND = struct.Struct('<BQIBdI7x')  # op, order_id, stock_id, is_buy, price, quantity (32 bytes)
+
+OP_ADD = 1
+OP_REMOVE = 2
+OP_REDUCE = 3  # quantity is the number of shares taken off
+
+class ShmRing:
+    """
+    Single-producer/single-consumer ring of fixed-size records in shared memory.
+
+    The producer only ever writes the head index and the consumer the tail
+    index, so neither side takes a lock. Records are book commands unless
+    another struct is given (both sides must use the same one).
+    """
+
+    def __init__(self, capacity=65536, name=None, record=COMMAND):
+        """
+        Create a ring, or attach to an existing one by name.
+
+        Parameters:
+        - capacity: Number of command slots (ignored when attaching)
+        - name: Shared memory name of an existing ring
+        - record: struct.Struct of one record
+        """
+        from multiprocessing import shared_memory
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=RING_HEADER_SIZE + capacity * record.size)
+            self.shm.buf[:RING_HEADER_SIZE] = bytes(RING_HEADER_SIZE)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.record = record
+        self.buf = self.shm.buf
+        self.capacity = (self.shm.size - RING_HEADER_SIZE) // record.size
+        self.head = RING_INDEX.unpack_from(self.buf, RING_HEAD_OFFSET)[0]
+        self.tail = RING_INDEX.unpack_from(self.buf, RING_TAIL_OFFSET)[0]
+
+    def push(self, *fields):
+        """
+        Append a record (producer side).
+
+        Parameters:
+        - fields: Record fields; for book commands op, order_id, stock_id,
+          is_buy, price and quantity
+
+        Returns:
+        - False if the ring is full, True otherwise
+        """
+        head = self.head
+        if head - self.tail >= self.capacity:
+            self.tail = RING_INDEX.unpack_from(self.buf, RING_TAIL_OFFSET)[0]
+            if head - self.tail >= self.capacity:
+                return False
+        record = self.record
+        record.pack_into(self.buf, RING_HEADER_SIZE + (head % self.capacity) * record.size, *fields)
+        # Publish the record only after it has been written
+        self.head = head + 1
+        RING_INDEX.pack_into(self.buf, RING_HEAD_OFFSET, self.head)
+        return True
+
+    def peek_batch(self, limit=4096):
+        """
+        Read up to limit commands without consuming them (consumer side).
+
+        Call consume() once they have been applied, so pending() only
+        reaches zero when the work is really done.
+
+        Returns:
+        - List of command tuples
+        """
+        head = RING_INDEX.unpack_from(self.buf, RING_HEAD_OFFSET)[0]
+        tail = self.tail
+        count = min(head - tail, limit)
+        if count <= 0:
+            return []
+        unpack_from = self.record.unpack_from
+        size = self.record.size
+        buf = self.buf
+        capacity = self.capacity
+        return [unpack_from(buf, RING_HEADER_SIZE + ((tail + i) % capacity) * size)
+                for i in range(count)]
+
+    def consume(self, count):
+        """Release count commands returned by peek_batch() (consumer side)."""
+        self.tail += count
+        RING_INDEX.pack_into(self.buf, RING_TAIL_OFFSET, self.tail)
+
+    def pending(self):
+        """Number of commands written but not consumed yet."""
+        return RING_INDEX.unpack_from(self.buf, RING_HEAD_OFFSET)[0] - \
+            RING_INDEX.unpack_from(self.buf, RING_TAIL_OFFSET)[0]
+
+    def stop_requested(self):
+        """Whether the owner asked the consumer to exit."""
+        return self.buf[RING_STOP_OFFSET] != 0
+
+    def request_stop(self):
+        """Ask the consumer to exit."""
+        self.buf[RING_STOP_OFFSET] = 1
+
+    def close(self, unlink=False):
+        """
+        Detach from the ring.
+
+        Parameters:
+        - unlink: Also free the shared memory (owner only)
+        """
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+def _worker_main(ring_name, top_name, idle_sleep):
+    # Runs in the worker process: apply commands, then publish every touched stock once per batch
+    ring = ShmRing(name=ring_name)
+    top = TopOfBookTable(name=top_name, create=False)
+    book = StockBook()
+    try:
+        while not ring.stop_requested():
+            commands = ring.peek_batch()
+            if not commands:
+                time.sleep(idle_sleep)
+                continue
+            touched = set()
+            for op, order_id, stock_id, is_buy, price, quantity in commands:
+                if op == OP_ADD:
+                    book.add_order(order_id, stock_id, bool(is_buy), price, quantity)
+                elif op == OP_REDUCE:
+                    book.reduce_order(order_id, quantity)
+                else:
+                    book.remove_order(order_id)
+                touched.add(stock_id)
+            for stock_id in touched:
+                book.publish_top_of_book(stock_id, top)
+            ring.consume(len(commands))
+    finally:
+        ring.close()
+        top.close()
+
+class BookService:
+    """
+    Order book maintenance sharded over worker processes.
+
+    Stocks are assigned to workers by stock_id % num_workers. The caller
+    (the TX thread) only packs commands into each worker's shared-memory
+    ring and never waits: when a ring is full, commands are held in a
+    local backlog and flushed on later calls. Workers publish best
+    bid/ask per stock into a TopOfBookTable that any thread or process can
+    read.
+
+    The read methods mirror StockBook's, so the service can stand in for
+    it wherever only best prices and counts are needed.
+    """
+
+    def __init__(self, num_workers=2, max_stocks=256, ring_capacity=65536, idle_sleep=0.0005, table_name=None):
+        """
+        Start the workers.
+
+        Parameters:
+        - num_workers: Number of worker processes
+        - max_stocks: Size of the top-of-book table (stock IDs 0..max_stocks-1)
+        - ring_capacity: Command slots per worker ring
+        - idle_sleep: Seconds a worker sleeps when its ring is empty
+        - table_name: Shared memory name for the top-of-book table, so other
+          processes can attach to it (None picks a random name)
+        """
+        self.num_workers = num_workers
+        self.max_stocks = max_stocks
+        self.top = TopOfBookTable(max_stocks, table_name)
+        self.rings = [ShmRing(ring_capacity) for _ in range(num_workers)]
+        self.backlogs = [deque() for _ in range(num_workers)]
+        # order_id -> [stock_id, is_buy, remaining quantity], to route removals
+        # and reductions and to forget orders that are fully executed
+        self.orders = {}
+
+        import multiprocessing
+
+        context = multiprocessing.get_context('spawn')
+        self.workers = []
+        for ring in self.rings:
+            worker = context.Process(target=_worker_main, args=(ring.name, self.top.name, idle_sleep),
+                                     name="book-worker")
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def _send(self, stock_id, command):
+        shard = stock_id % self.num_workers
+        backlog = self.backlogs[shard]
+        ring = self.rings[shard]
+        while backlog:
+            if not ring.push(*backlog[0]):
+                backlog.append(command)
+                return
+            backlog.popleft()
+        if not ring.push(*command):
+            backlog.append(command)
+
+    def add_order(self, order_id, stock_id, is_buy, price, quantity):
+        """
+        Queue an order addition (same parameters as StockBook.add_order).
+        """
+        if not 0 <= stock_id < self.max_stocks:
+            raise ValueError(f"stock_id {stock_id} is outside the top-of-book table")
+        self.orders[order_id] = [stock_id, is_buy, quantity or 0]
+        self._send(stock_id, (OP_ADD, order_id, stock_id, is_buy, price or 0.0, quantity or 0))
+
+    def remove_order(self, order_id, stock_id=None):
+        """
+        Queue an order removal.
+
+        Parameters:
+        - order_id: Identifier of the order to remove
+        - stock_id: Stock of the order (looked up when omitted)
+
+        Returns:
+        - True if the order was known, False otherwise
+        """
+        known = self.orders.pop(order_id, None)
+        if stock_id is None and known is not None:
+            stock_id = known[0]
+        if stock_id is None:
+            return False
+        self._send(stock_id, (OP_REMOVE, order_id, stock_id, 0, 0.0, 0))
+        return known is not None
+
+    def reduce_order(self, order_id, quantity):
+        """
+        Queue a partial reduction (see StockBook.reduce_order).
+
+        The worker applies it to its book; the remaining quantity is also
+        tracked here so fully executed orders are forgotten on both sides.
+
+        Returns:
+        - True if the order was known, False otherwise
+        """
+        order = self.orders.get(order_id)
+        if order is None:
+            return False
+        order[2] -= quantity
+        if order[2] <= 0:
+            del self.orders[order_id]
+        self._send(order[0], (OP_REDUCE, order_id, order[0], 0, 0.0, quantity))
+        return True
+
+    def execute_order(self, order_id, quantity):
+        """
+        Queue an execution (see StockBook.execute_order).
+
+        Returns:
+        - True if the order was known, False otherwise
+        """
+        return self.reduce_order(order_id, quantity)
+
+    def replace_order(self, order_id, new_order_id, price, quantity):
+        """
+        Queue a replace as a removal followed by an addition on the same stock and side.
+
+        Parameters:
+        - order_id: Identifier of the order being replaced
+        - new_order_id: Identifier of the replacement order
+        - price: New price
+        - quantity: New quantity
+
+        Returns:
+        - True if the original order was known, False otherwise
+        """
+        order = self.orders.get(order_id)
+        if order is None:
+            return False
+        stock_id, is_buy, _ = order
+        self.remove_order(order_id, stock_id)
+        self.add_order(new_order_id, stock_id, is_buy, price, quantity)
+        return True
+
+    def flush(self):
+        """Push held-back commands into rings that have room again."""
+        for shard, backlog in enumerate(self.backlogs):
+            ring = self.rings[shard]
+            while backlog and ring.push(*backlog[0]):
+                backlog.popleft()
+
+    def pending(self):
+        """Number of commands not yet applied by the workers."""
+        return sum(ring.pending() for ring in self.rings) + sum(len(backlog) for backlog in self.backlogs)
+
+    def wait_idle(self, timeout=10.0):
+        """
+        Wait until the workers have applied every queued command.
+
+        Parameters:
+        - timeout: Maximum seconds to wait
+
+        Returns:
+        - True if the service drained in time
+        """
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            self.flush()
+            if not self.pending():
+                return True
+            time.sleep(0.0005)
+        return False
+
+    def top_of_book(self, stock_id):
+        """
+        Read a stock's best prices.
+
+        Returns:
+        - Tuple (bid price, bid qty, ask price, ask qty, order count);
+          quantities are 0 for an empty side
+        """
+        return self.top.read(stock_id)[:5]
+
+    def get_highest_buy(self, stock_id):
+        """Best bid as {'price', 'quantity'} or None (see StockBook.get_highest_buy)."""
+        bid, bid_qty, _, _, _ = self.top_of_book(stock_id)
+        return {"price": bid, "quantity": bid_qty} if bid_qty else None
+
+    def get_lowest_sell(self, stock_id):
+        """Best ask as {'price', 'quantity'} or None (see StockBook.get_lowest_sell)."""
+        _, _, ask, ask_qty, _ = self.top_of_book(stock_id)
+        return {"price": ask, "quantity": ask_qty} if ask_qty else None
+
+    def get_order_count(self, stock_id):
+        """Number of resting orders for a stock."""
+        return self.top_of_book(stock_id)[4]
+
+    def get_all_stocks(self):
+        """Sorted IDs of stocks with resting orders."""
+        return self.top.active_stocks()
+
+    def close(self):
+        """Stop the workers and free the shared memory."""
+        for ring in self.rings:
+            ring.request_stop()
+        for worker in self.workers:
+            worker.join(timeout=2)
+            if worker.is_alive():
+                worker.terminate()
+        for ring in self.rings:
+            ring.close(unlink=True)
+        self.top.close()
@@ -1,5 +1,4 @@
 import os
-import configparser
 
 # Default configuration settings
 DEFAULT_CONFIG = {
@@ -15,6 +14,48 @@ DEFAULT_CONFIG = {
     "cancel_probability": 0.3,  # probability of generating a cancel order
     "buy_orders_only": False,  # if True, generate only buy orders
     "cancel_highest_price": False,  # if True, always cancel the highest price order
+    "execute_probability": 0.0,  # probability of generating a partial/full execution of a resting order
+    "replace_probability": 0.0,  # probability of generating a replace (order_book.v parses 0xAA but does not apply it yet)
+    "symbol_file": "",    # optional CSV symbol table (stock_id, symbol, tick_size, baseline_price)
+    "capture_file": "",   # if set, record every TX frame and RX chunk to this wire capture
+    "book_journal_file": "",   # if set, journal host book changes and recover them on startup
+    "book_snapshot_file": "book.snapshot",  # snapshot written alongside the journal
+    "snapshot_interval": 10000,  # journal records between snapshots
+    "metrics_enabled": False,  # record hot-path counters and timings from startup
+    "metrics_port": 0,    # if non-zero, serve Prometheus metrics on http://127.0.0.1:<port>/metrics
+    "metrics_dump_file": "",   # if set, append a JSON metrics snapshot to this file periodically
+    "metrics_dump_interval": 5.0,  # seconds between JSON dumps
+    "frame_cache_dir": ".frame_cache",  # pre-encoded frames of loaded CSVs ("" keeps them in memory only)
+    "top_of_book_name": "",  # if set, publish best bid/ask per stock to shared memory under this name
+    "book_workers": 0,    # if > 0, maintain the host book in this many worker processes (ignored with a journal)
+    "plot_process": False,  # if True, draw the real-time plots in a separate process fed through shared memory instead of the plots tab
+    "matching_engine": False,  # match crossing orders and FPGA responses, sending fills to the board as EXECUTE rows
+    "pnl_fill_model": "immediate",  # PnL of FPGA responses: "immediate" (filled at their price), "touch" (only when crossing the book), "" disables; engine fills are used in matching mode
+    "ramp_start_rate": 50.0,  # frames/s of the first throughput ramp step
+    "ramp_max_rate": 1000.0,  # highest rate the ramp tries
+    "ramp_step_factor": 1.25,  # rate multiplier between ramp steps
+    "ramp_step_seconds": 5.0,  # sending time per ramp step
+    "ramp_loss_threshold": 0.01,  # fraction of unanswered frames at which a step counts as saturated
+    "ramp_latency_factor": 3.0,  # p99 latency growth over the first step at which a step counts as saturated
+    "ramp_output_file": "ramp.csv",  # throughput/latency curve of the last ramp ("" to skip)
+    "flow_control": False,  # pace TX by the board's answers (AIMD on the send rate) instead of packet_delay
+    "flow_window": 8,  # most unanswered frames in flight under flow control
+    "flow_min_delay": 0.0,  # bounds of the flow control delay between frames in seconds
+    "flow_max_delay": 1.0,
+    "flow_latency_factor": 3.0,  # answer latency growth over the fastest one that cuts the send rate
+    "flow_timeout": 1.0,  # seconds after which an unanswered frame counts as lost
+    "profile_enabled": False,  # sample every thread's stack from startup (also toggled from the stats tab or with SIGUSR1)
+    "profile_interval": 0.005,  # seconds between profiler samples
+    "profile_output": "profile",  # stopping the profiler writes <this>.collapsed and <this>.speedscope.json
+    "soak_mode": False,  # bound every run-time buffer below so long board tests run in flat memory, and log memory use
+    "soak_rx_queue": 10000,  # received packets waiting for the UI
+    "soak_plot_points": 5000,  # points per stock and series in the plots
+    "soak_text_lines": 5000,  # lines kept in the sent/received packet logs
+    "soak_overflow": "drop",  # full buffers: "drop" the oldest, "sample" (thin the history), "spill" the oldest to soak_spill_dir
+    "soak_spill_dir": "soak_spill",
+    "memory_log_file": "memory.jsonl",  # soak mode: RSS and tracemalloc snapshots, as JSON lines
+    "memory_log_interval": 60.0,  # seconds between memory snapshots
+    "memory_top_n": 10,  # allocation sites per snapshot (0: RSS only, without tracemalloc overhead)
 }
 
 def load_config(config_file='config.ini'):
@@ -27,6 +68,8 @@ def load_config(config_file='config.ini'):
     Returns:
     - Dictionary containing the configuration settings
     """
+    import configparser  # only needed once a config is actually read or written
+
     config = DEFAULT_CONFIG.copy()
     
     if os.path.exists(config_file):
@@ -69,6 +112,8 @@ def save_config(config, config_file='config.ini'):
     - config: Dictionary containing the configuration settings
     - config_file: Path to the configuration file
     """
+    import configparser
+
     parser = configparser.ConfigParser()
     parser['Settings'] = {str(k): str(v) for k, v in config.items()}
     with open(config_file, 'w') as f:
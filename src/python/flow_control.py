@@ -0,0 +1,221 @@
+import threading
+import time
+
+from tb_stimulus import BookReference, parse_stream
+from throughput_ramp import BOARD_STOCKS, ResponseTracker
+
+RESPONSE_BYTES = 7 * BOARD_STOCKS  # custom_msg_generator sends one 7-byte packet per stock
+UART_FRAME_BITS = 10  # 8N1
+
+class FlowController:
+    """
+    Paces the TX thread to the fastest rate the board answers without loss.
+
+    The board has no flow control of its own: frames sent faster than its
+    UART receiver, parser and response generator keep up with are lost, and
+    the host book drifts away from the board's. The controller treats the
+    board's decisions as acknowledgements (see ResponseTracker) and adapts
+    the send rate to them with AIMD:
+
+    - until the first congestion signal every answer raises the rate by
+      slow_start (exponential search from initial_delay);
+    - after that, every answer adds increase times the rate at the last
+      congestion, so the rate climbs back to it linearly;
+    - an answer slower than latency_factor times the fastest one seen, or
+      a frame left unanswered (the board drops frames, it does not queue
+      them), cuts the rate by beta, at most once per smoothed round trip.
+
+    Answers carry no sequence number; the same latency bounds keep the
+    matching of answers to frames aligned (see ResponseTracker). A
+    mismatched answer can look faster than the board is, so the fastest
+    round trip is never taken below the wire time of the shortest frame
+    and an answer burst.
+
+    Independently of the rate, at most window frames are left unanswered,
+    which bounds what is lost when the board stops answering altogether;
+    while the window rather than the rate holds the sender back, answers
+    do not raise the rate. The board only answers while every book holds
+    an order, so a reference model of its books (BookReference) decides
+    which frames are expected to be answered; the others are paced but
+    not waited for.
+    """
+
+    def __init__(self, initial_delay=0.1, window=8, min_delay=0.0, max_delay=1.0, latency_factor=3.0,
+                 beta=0.7, increase=0.01, slow_start=1.25, timeout=1.0, baud_rate=115200):
+        """
+        Initialize a controller sending at the initial delay.
+
+        Parameters:
+        - initial_delay: Seconds between frames until the first answer
+        - window: Most unanswered frames in flight
+        - min_delay, max_delay: Bounds of the delay between frames in seconds
+        - latency_factor: Latency growth over the fastest answer that counts as congestion
+        - beta: Rate multiplier on congestion
+        - increase: Rate added per answer, as a fraction of the rate at the last congestion
+        - slow_start: Rate multiplier per answer before the first congestion
+        - timeout: Seconds after which an unanswered frame is lost
+        - baud_rate: UART baud rate, for the shortest possible round trip
+        """
+        self.initial_delay = initial_delay
+        self.window = window
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.latency_factor = latency_factor
+        self.beta = beta
+        self.increase = increase
+        self.slow_start = slow_start
+        self.timeout = timeout
+        self.byte_time = UART_FRAME_BITS / baud_rate
+        self.shortest_frame = None  # bytes
+        self.condition = threading.Condition()
+        self.tracker = ResponseTracker(timeout, keep_latencies=False)
+        self.board = BookReference()  # follows the board's books across resets
+        self.reset()
+
+    def reset(self):
+        """Start over from the initial delay, e.g. after reconnecting."""
+        with self.condition:
+            self.tracker.reset()
+            self.tracker.min_latency = 0.0
+            self.tracker.max_latency = None
+            self.rate = None  # frames/s, None until the first answer
+            self.congestion_rate = None  # rate at the last congestion signal
+            self.srtt = None  # smoothed round trip in seconds
+            self.min_rtt = None
+            self.next_send = 0.0
+            self.window_limited = False  # the window was full after the last send
+            self.last_decrease = 0.0
+            self.lost_seen = 0
+            self.decreases = 0
+            self.condition.notify_all()
+
+    @property
+    def delay(self):
+        """Current delay between frames in seconds."""
+        delay = self.initial_delay if self.rate is None else 1.0 / self.rate
+        return min(max(delay, self.min_delay), self.max_delay)
+
+    def wait(self, running):
+        """
+        Block until the window and pacing allow the next frame.
+
+        Parameters:
+        - running: Callable returning False when the sender is stopping
+
+        Returns:
+        - True when the frame may be sent, False if running() turned False
+        """
+        tracker = self.tracker
+        with self.condition:
+            while running():
+                now = time.perf_counter()
+                self._check_loss(now)
+                if tracker.in_flight < self.window:
+                    if now >= self.next_send:
+                        return True
+                    self.condition.wait(min(self.next_send - now, 0.05))
+                else:
+                    self.condition.wait(0.05)  # answers notify; wake up to expire lost frames
+            return False
+
+    def on_sent(self, frame, timestamp):
+        """
+        Record a frame written to the board.
+
+        Parameters:
+        - frame: Encoded frame (or several)
+        - timestamp: time.perf_counter() after the write
+        """
+        board = self.board
+        with self.condition:
+            if self.shortest_frame is None or len(frame) < self.shortest_frame:
+                self.shortest_frame = len(frame)
+            for request, stock, _, order_id, quantity, order_to_add in parse_stream(frame):
+                board.apply(request, stock, order_id, quantity, order_to_add & 0xFFFF)
+                if board.valid:
+                    self.tracker.on_sent(timestamp)
+            self.window_limited = self.tracker.in_flight >= self.window
+            self.next_send = timestamp + self.delay
+
+    def on_packet(self, parsed, timestamp):
+        """
+        Record a response packet from the board.
+
+        Parameters:
+        - parsed: Packet as returned by parse_fpga_response_packet
+        - timestamp: time.perf_counter() when it was read
+        """
+        latency = self.tracker.on_packet(parsed, timestamp)
+        with self.condition:
+            if latency is not None:
+                if self.srtt is None:
+                    self.srtt = latency
+                    self.rate = 1.0 / max(self.delay, 1e-6)
+                else:
+                    self.srtt = 0.875 * self.srtt + 0.125 * latency
+                if self.min_rtt is None or latency < self.min_rtt:
+                    self.min_rtt = max(latency, (self.shortest_frame + RESPONSE_BYTES) * self.byte_time)
+                    self.tracker.min_latency = self.min_rtt / 2
+                    self.tracker.max_latency = self.latency_factor * self.min_rtt
+                if latency > self.latency_factor * self.min_rtt:
+                    self._decrease(timestamp)
+                elif self.window_limited:
+                    pass  # the rate was not what held the sender back
+                elif self.congestion_rate is None:
+                    self.rate *= self.slow_start
+                else:
+                    self.rate += self.increase * self.congestion_rate
+            self._check_loss(timestamp)
+            self.condition.notify_all()
+
+    def _check_loss(self, now):
+        self.tracker.expire(now)
+        lost = self.tracker.lost
+        if lost > self.lost_seen:
+            self.lost_seen = lost
+            self._decrease(now)
+
+    def _decrease(self, now):
+        if self.rate is None or now - self.last_decrease < self.srtt:
+            return  # one cut per round trip: its other losses were already in flight
+        self.last_decrease = now
+        # Clamped first, so a rate run past min_delay does not take several cuts to matter
+        self.congestion_rate = 1.0 / self.delay if self.delay > 0 else self.rate
+        self.rate = self.congestion_rate * self.beta
+        self.decreases += 1
+
+    def snapshot(self):
+        """
+        Get the controller state.
+
+        Returns:
+        - Dictionary with delay, srtt, min_rtt (in seconds, None before the
+          first answer), in_flight, sent, acknowledged, lost and decreases
+        """
+        tracker = self.tracker
+        with self.condition:
+            return {
+                'delay': self.delay,
+                'srtt': self.srtt,
+                'min_rtt': self.min_rtt,
+                'in_flight': tracker.in_flight,
+                'sent': tracker.sent,
+                'acknowledged': tracker.responses,
+                'lost': tracker.lost,
+                'decreases': self.decreases,
+            }
+
+    def summary_lines(self):
+        """
+        Format the controller state for the stats tab.
+
+        Returns:
+        - List of strings
+        """
+        snapshot = self.snapshot()
+        rtt = (f"srtt {snapshot['srtt'] * 1e3:.2f} ms, min {snapshot['min_rtt'] * 1e3:.2f} ms"
+               if snapshot['srtt'] is not None else "no answers yet")
+        return [f"Flow control: {snapshot['delay'] * 1e3:.3f} ms between frames, "
+                f"{snapshot['in_flight']}/{self.window} in flight, {rtt}",
+                f"  {snapshot['acknowledged']}/{snapshot['sent']} answered, {snapshot['lost']} lost, "
+                f"{snapshot['decreases']} rate cuts"]
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import struct
+from array import array
+
+from itch_clock import nanoseconds_since_midnight
+from packet_utils import create_packet
+
+CACHE_MAGIC = b'HFTFRM'
+CACHE_VERSION = 2  # 2: sessions are cached after their order IDs are remapped
+CACHE_HEADER = struct.Struct('<6sHII')  # magic, version, frame count, buffer length
+
+# Every board frame starts with length(1), type(1), stock locate(2), then the
+# per-send fields: tracking number(2) and a 6-byte timestamp at offset 4
+STAMP_OFFSET = 4
+STAMP = struct.Struct('<HIH')  # tracking number, timestamp low 32 bits, timestamp high 16 bits
+
+class FrameCache:
+    """
+    A session encoded once into one contiguous buffer of board frames.
+
+    offsets[i]:offsets[i + 1] is frame i. Sending only patches the
+    tracking number and timestamp in place and hands a memoryview of the
+    frame to the serial port, so repeated replays never re-encode.
+    """
+
+    def __init__(self, buffer, offsets):
+        """
+        Wrap an encoded session.
+
+        Parameters:
+        - buffer: bytearray holding all frames back to back
+        - offsets: array('I') of frame start offsets plus the end offset
+        """
+        self.buffer = buffer
+        self.offsets = offsets
+        self.view = memoryview(buffer)
+        self.tracking_number = 0
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def frame(self, index):
+        """
+        Stamp a frame with the current time and the next tracking number.
+
+        Parameters:
+        - index: Frame (row) index
+
+        Returns:
+        - memoryview of the frame, valid until the frame is stamped again
+        """
+        start = self.offsets[index]
+        timestamp = nanoseconds_since_midnight()
+        self.tracking_number = (self.tracking_number + 1) & 0xFFFF
+        STAMP.pack_into(self.buffer, start + STAMP_OFFSET, self.tracking_number,
+                        timestamp & 0xFFFFFFFF, timestamp >> 32)
+        return self.view[start:self.offsets[index + 1]]
+
+    def to_bytes(self):
+        """
+        Serialize the cache.
+
+        Returns:
+        - Bytes with a header, the offset index and the frame buffer
+        """
+        return CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, len(self), len(self.buffer)) + \
+            self.offsets.tobytes() + bytes(self.buffer)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Deserialize a cache written by to_bytes().
+
+        Parameters:
+        - data: Serialized cache
+
+        Returns:
+        - FrameCache
+        """
+        magic, version, count, length = CACHE_HEADER.unpack_from(data, 0)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION:
+            raise ValueError("Not a compatible frame cache")
+        offsets = array('I')
+        start = CACHE_HEADER.size
+        offsets.frombytes(data[start:start + (count + 1) * offsets.itemsize])
+        start += (count + 1) * offsets.itemsize
+        buffer = bytearray(data[start:start + length])
+        if len(offsets) != count + 1 or len(buffer) != length or offsets[-1] != length:
+            raise ValueError("Truncated frame cache")
+        return cls(buffer, offsets)
+
+def encode_session(rows, symbol_table=None):
+    """
+    Encode session rows into a FrameCache.
+
+    Parameters:
+    - rows: Sequence of session row dictionaries
+    - symbol_table: Optional SymbolTable supplying ADD order symbols
+
+    Returns:
+    - FrameCache
+    """
+    frames = []
+    offsets = array('I', [0])
+    end = 0
+    for row in rows:
+        symbol = symbol_table.symbol(row['stock_id']) if symbol_table is not None else None
+        frame = create_packet(row, symbol)
+        frames.append(frame)
+        end += len(frame)
+        offsets.append(end)
+    return FrameCache(bytearray(b''.join(frames)), offsets)
+
+def cache_key(filename, symbol_table=None):
+    """
+    Key a session file's frames by its contents and the encoding config.
+
+    Parameters:
+    - filename: Session file
+    - symbol_table: Optional SymbolTable used for encoding
+
+    Returns:
+    - Hex digest string
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    digest.update(f"v{CACHE_VERSION}".encode())
+    if symbol_table is not None:
+        for stock_id in symbol_table.stock_ids():
+            digest.update(symbol_table.symbol(stock_id))
+    return digest.hexdigest()
+
+def load_frame_cache(filename, rows, symbol_table=None, cache_dir=""):
+    """
+    Get the encoded frames of a session, from disk when possible.
+
+    Parameters:
+    - filename: Session file the rows were loaded from
+    - rows: Session rows (encoded when there is no usable cache entry)
+    - symbol_table: Optional SymbolTable supplying ADD order symbols
+    - cache_dir: Directory holding cache entries ("" keeps the cache in memory only)
+
+    Returns:
+    - FrameCache
+    """
+    if not cache_dir:
+        return encode_session(rows, symbol_table)
+
+    path = os.path.join(cache_dir, cache_key(filename, symbol_table) + '.frames')
+    if os.path.exists(path):
+        try:
+            with open(path, 'rb') as f:
+                cache = FrameCache.from_bytes(f.read())
+            if len(cache) == len(rows):
+                return cache
+        except (ValueError, struct.error):
+            pass  # stale or damaged entry, rebuild it
+
+    cache = encode_session(rows, symbol_table)
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(cache.to_bytes())
+    os.replace(temp_path, path)
+    return cache
@@ -0,0 +1,116 @@
+import time
+
+NS_PER_SECOND = 1_000_000_000
+NS_PER_DAY = 86_400 * NS_PER_SECOND
+
+def local_midnight_ns(wall_ns):
+    """
+    Get the local midnight at or before a wall clock time.
+
+    Parameters:
+    - wall_ns: Wall clock time in nanoseconds since the epoch
+
+    Returns:
+    - Local midnight in nanoseconds since the epoch
+    """
+    utc_offset_ns = time.localtime(wall_ns // NS_PER_SECOND).tm_gmtoff * NS_PER_SECOND
+    return wall_ns - (wall_ns + utc_offset_ns) % NS_PER_DAY
+
+class MidnightClock:
+    """
+    Nanoseconds-since-midnight clock for ITCH timestamps.
+
+    Midnight and the wall clock are sampled once per day; in between, time
+    is derived from perf_counter_ns() with integer arithmetic only, so
+    timestamps are exact, monotonic and cheap to produce.
+    """
+
+    def __init__(self):
+        """Initialize the clock and anchor it to the current day."""
+        self.anchor()
+
+    def anchor(self):
+        """Re-sample the wall clock and local midnight."""
+        perf_ns = time.perf_counter_ns()
+        wall_ns = time.time_ns()
+        midnight_ns = local_midnight_ns(wall_ns)
+        # now() = perf_counter_ns() - self.offset_ns
+        self.offset_ns = perf_ns - (wall_ns - midnight_ns)
+        self.next_anchor_ns = NS_PER_DAY
+
+    def now(self):
+        """
+        Get the current time.
+
+        Returns:
+        - Integer nanoseconds since local midnight
+        """
+        ns = time.perf_counter_ns() - self.offset_ns
+        if ns >= self.next_anchor_ns:
+            self.anchor()
+            ns = time.perf_counter_ns() - self.offset_ns
+        return ns
+
+class VirtualClock:
+    """
+    Externally driven clock for replays and deterministic tests.
+
+    The replayer sets it to each message's original timestamp, so re-encoded
+    frames carry the recorded times instead of the replay time.
+    """
+
+    def __init__(self, start_ns=0):
+        """
+        Initialize the clock.
+
+        Parameters:
+        - start_ns: Initial nanoseconds since midnight
+        """
+        self.ns = start_ns
+
+    def set(self, ns):
+        """Set the current time (nanoseconds since midnight)."""
+        self.ns = ns
+
+    def advance(self, delta_ns):
+        """Move the clock forward by delta_ns nanoseconds."""
+        self.ns += delta_ns
+
+    def now(self):
+        """
+        Get the current time.
+
+        Returns:
+        - Integer nanoseconds since midnight
+        """
+        return self.ns
+
+_clock = MidnightClock()
+
+def get_clock():
+    """Get the clock used for frame timestamps."""
+    return _clock
+
+def set_clock(clock):
+    """
+    Replace the clock used for frame timestamps.
+
+    Parameters:
+    - clock: Object with a now() method (None restores the real-time clock)
+
+    Returns:
+    - The previous clock
+    """
+    global _clock
+    previous = _clock
+    _clock = clock if clock is not None else MidnightClock()
+    return previous
+
+def nanoseconds_since_midnight():
+    """
+    Get the current time as nanoseconds since midnight (ITCH timestamp).
+
+    Returns:
+    - Integer nanoseconds
+    """
+    return _clock.now()
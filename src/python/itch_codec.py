@@ -0,0 +1,419 @@
+import struct
+
+# Field kinds -> struct format characters. 'ts' is the 6-byte ITCH timestamp,
+# split into a 16-bit and a 32-bit part so it can live in a precompiled Struct.
+FIELD_FORMATS = {
+    'u8': 'B',
+    'u16': 'H',
+    'u32': 'I',
+    'u64': 'Q',
+    'char': 'c',
+    'mpid': '4s',
+    'stock': '8s',
+    'price': 'I',
+}
+
+# Values used for fields left out of encode_dict()
+FIELD_DEFAULTS = {
+    'char': b' ',
+    'mpid': b' ' * 4,
+    'stock': b' ' * 8,
+}
+
+# Common header shared by every ITCH 5.0 message (after the message type)
+HEADER_FIELDS = [
+    ('stock_locate', 'u16'),
+    ('tracking_number', 'u16'),
+    ('timestamp', 'ts'),
+]
+
+# ITCH 5.0 message table: type -> (name, board opcode, body fields).
+# Body fields are (name, kind) or (name, kind, False) for fields the board's
+# parser_top does not consume and which are therefore left out of board frames.
+# Board opcodes match the case statement in parser_top.v; System Event and
+# Stock Directory have no board opcode and fall into PARSE_IGNORED_MSG.
+ITCH_MESSAGES = {
+    'S': ('system_event', ord('S'), [
+        ('event_code', 'char'),
+    ]),
+    'R': ('stock_directory', ord('R'), [
+        ('stock', 'stock'),
+        ('market_category', 'char'),
+        ('financial_status_indicator', 'char'),
+        ('round_lot_size', 'u32'),
+        ('round_lots_only', 'char'),
+        ('issue_classification', 'char'),
+        ('issue_sub_type', 'u16'),
+        ('authenticity', 'char'),
+        ('short_sale_threshold_indicator', 'char'),
+        ('ipo_flag', 'char'),
+        ('luld_reference_price_tier', 'char'),
+        ('etp_flag', 'char'),
+        ('etp_leverage_factor', 'u32'),
+        ('inverse_indicator', 'char'),
+    ]),
+    'A': ('add_order', 0x82, [
+        ('order_reference_number', 'u64'),
+        ('buy_sell_indicator', 'char'),
+        ('shares', 'u32'),
+        ('stock', 'stock'),
+        ('price', 'price'),
+    ]),
+    'F': ('add_order_mpid', 0x86, [
+        ('order_reference_number', 'u64'),
+        ('buy_sell_indicator', 'char'),
+        ('shares', 'u32'),
+        ('stock', 'stock'),
+        ('price', 'price'),
+        ('attribution', 'mpid'),
+    ]),
+    'E': ('order_executed', 0x2A, [
+        ('order_reference_number', 'u64'),
+        ('executed_shares', 'u32'),
+        ('match_number', 'u64', False),
+    ]),
+    'C': ('order_executed_with_price', 0xC2, [
+        ('order_reference_number', 'u64'),
+        ('executed_shares', 'u32'),
+        ('match_number', 'u64'),
+        ('printable', 'char'),
+        ('execution_price', 'price'),
+    ]),
+    'X': ('order_cancel', 0xA1, [
+        ('order_reference_number', 'u64'),
+        ('cancelled_shares', 'u32'),
+    ]),
+    'D': ('order_delete', 0x22, [
+        ('order_reference_number', 'u64'),
+    ]),
+    'U': ('order_replace', 0xAA, [
+        ('original_order_reference_number', 'u64'),
+        ('new_order_reference_number', 'u64'),
+        ('shares', 'u32'),
+        ('price', 'price'),
+    ]),
+}
+
+# Buy/sell indicator values per dialect
+ITCH_BUY, ITCH_SELL = b'B', b'S'
+BOARD_BUY, BOARD_SELL = b'A', b'B'  # parser_top.v treats 0x41 as buy
+
+# The board reads an 8.8 fixed-point price from the low two bytes; the upper
+# two bytes are filler, kept identical to create_add_order_packet's frames
+BOARD_PRICE_FILL = 0x0606 << 16
+
+def itch_price(price):
+    """
+    Convert a decimal price to the ITCH Price(4) representation (4 implied decimals).
+
+    Parameters:
+    - price: Price as a float
+
+    Returns:
+    - Integer price
+    """
+    return int(round(price * 10000))
+
+def board_price(price):
+    """
+    Convert a decimal price to the board's 8.8 fixed-point price field.
+
+    Parameters:
+    - price: Price as a float (0-255.xx)
+
+    Returns:
+    - 32-bit integer price field
+    """
+    price_int = int(price)
+    price_frac = int((price - price_int) * 256) & 0xFF
+    return BOARD_PRICE_FILL | (price_int & 0xFF) << 8 | price_frac
+
+def price_from_itch(value):
+    """Convert an ITCH Price(4) field to a float."""
+    return value / 10000.0
+
+def price_from_board(value):
+    """Convert a board price field to a float."""
+    return ((value >> 8) & 0xFF) + (value & 0xFF) / 256.0
+
+class MessageCodec:
+    """
+    Precompiled encoder/decoder for one message type in one dialect.
+
+    Values are passed and returned as flat tuples in field order, which is
+    what struct works with directly; dict helpers are provided for
+    convenience off the hot path.
+    """
+
+    def __init__(self, type_code, name, type_byte, fields, byteorder, length_format):
+        """
+        Compile the struct layout for a message.
+
+        Parameters:
+        - type_code: ITCH message type character (e.g. 'A')
+        - name: Descriptive message name (e.g. 'add_order')
+        - type_byte: Message type byte written on the wire
+        - fields: List of (name, kind) tuples, header included
+        - byteorder: '>' (ITCH) or '<' (board)
+        - length_format: struct format of the length prefix
+        """
+        self.type_code = type_code
+        self.name = name
+        self.type_byte = type_byte
+        self.field_names = tuple(field_name for field_name, _ in fields)
+        self.defaults = tuple(FIELD_DEFAULTS.get(kind, 0) for _, kind in fields)
+
+        fmt = ''
+        self.ts_index = None
+        for index, (field_name, kind) in enumerate(fields):
+            if kind == 'ts':
+                # Big-endian: high 16 bits first; little-endian: low 32 bits first
+                fmt += 'HI' if byteorder == '>' else 'IH'
+                self.ts_index = index
+            else:
+                fmt += FIELD_FORMATS[kind]
+
+        self.body = struct.Struct(byteorder + 'B' + fmt)
+        # Board frames count the length byte itself, ITCH frames do not
+        self.frame_length = self.body.size + (struct.calcsize(length_format) if byteorder == '<' else 0)
+        self.frame = struct.Struct(byteorder + length_format + 'B' + fmt)
+        self.byteorder = byteorder
+
+    @property
+    def size(self):
+        """Size of the message body (type byte included, length prefix excluded)."""
+        return self.body.size
+
+    def _split(self, values):
+        index = self.ts_index
+        if index is None:
+            return values
+        timestamp = values[index]
+        if self.byteorder == '>':
+            parts = (timestamp >> 32, timestamp & 0xFFFFFFFF)
+        else:
+            parts = (timestamp & 0xFFFFFFFF, timestamp >> 32)
+        return values[:index] + parts + values[index + 1:]
+
+    def _join(self, values):
+        index = self.ts_index
+        if index is None:
+            return values
+        if self.byteorder == '>':
+            timestamp = values[index] << 32 | values[index + 1]
+        else:
+            timestamp = values[index + 1] << 32 | values[index]
+        return values[:index] + (timestamp,) + values[index + 2:]
+
+    def encode(self, values):
+        """
+        Encode a framed message (length prefix included).
+
+        Parameters:
+        - values: Tuple of field values in field order
+
+        Returns:
+        - bytes containing the frame
+        """
+        return self.frame.pack(self.frame_length, self.type_byte, *self._split(tuple(values)))
+
+    def encode_into(self, buffer, offset, values):
+        """
+        Encode a framed message into a preallocated buffer.
+
+        Parameters:
+        - buffer: Writable buffer (bytearray, memoryview)
+        - offset: Byte offset of the frame
+        - values: Tuple of field values in field order
+
+        Returns:
+        - Offset just past the written frame
+        """
+        self.frame.pack_into(buffer, offset, self.frame_length, self.type_byte, *self._split(tuple(values)))
+        return offset + self.frame.size
+
+    def decode(self, buffer, offset=0):
+        """
+        Decode a message body (starting at the type byte).
+
+        Parameters:
+        - buffer: Buffer holding the message
+        - offset: Offset of the type byte
+
+        Returns:
+        - Tuple of field values in field order
+        """
+        return self._join(self.body.unpack_from(buffer, offset)[1:])
+
+    def to_dict(self, values):
+        """Convert a value tuple to a {field_name: value} dict."""
+        return dict(zip(self.field_names, values))
+
+    def from_dict(self, fields):
+        """Convert a {field_name: value} dict to a value tuple; missing fields default to 0/spaces."""
+        values = []
+        for field_name, default in zip(self.field_names, self.defaults):
+            values.append(fields.get(field_name, default))
+        return tuple(values)
+
+class ItchCodec:
+    """
+    Table-driven codec for a wire dialect of ITCH 5.0.
+
+    Two dialects are provided as module-level instances:
+    - ITCH: standard NASDAQ layout, big-endian, 2-byte length prefix (as in
+      TotalView-ITCH files and SoupBinTCP payloads)
+    - BOARD: the FPGA's UART framing, little-endian, 1-byte length prefix that
+      counts itself, and parser_top.v opcodes
+    """
+
+    def __init__(self, dialect):
+        """
+        Build codecs for every message in ITCH_MESSAGES.
+
+        Parameters:
+        - dialect: 'itch' or 'board'
+        """
+        if dialect not in ('itch', 'board'):
+            raise ValueError(f"Unknown dialect {dialect!r}")
+        self.dialect = dialect
+        byteorder = '>' if dialect == 'itch' else '<'
+        length_format = 'H' if dialect == 'itch' else 'B'
+
+        self.by_type = {}  # type code ('A') -> MessageCodec
+        self.by_name = {}  # name ('add_order') -> MessageCodec
+        self.by_wire_type = [None] * 256  # type byte -> MessageCodec
+
+        for type_code, (name, board_opcode, body) in ITCH_MESSAGES.items():
+            fields = list(HEADER_FIELDS)
+            for field in body:
+                if dialect == 'board' and len(field) > 2 and not field[2]:
+                    continue
+                fields.append(field[:2])
+            type_byte = ord(type_code) if dialect == 'itch' else board_opcode
+            codec = MessageCodec(type_code, name, type_byte, fields, byteorder, length_format)
+            self.by_type[type_code] = codec
+            self.by_name[name] = codec
+            self.by_wire_type[type_byte] = codec
+
+        self.buy, self.sell = (ITCH_BUY, ITCH_SELL) if dialect == 'itch' else (BOARD_BUY, BOARD_SELL)
+        self.price = itch_price if dialect == 'itch' else board_price
+        self.price_to_float = price_from_itch if dialect == 'itch' else price_from_board
+
+    def codec(self, message_type):
+        """
+        Look up the codec for a message type code or name.
+
+        Parameters:
+        - message_type: Type code ('A') or name ('add_order')
+
+        Returns:
+        - MessageCodec
+        """
+        codec = self.by_type.get(message_type) or self.by_name.get(message_type)
+        if codec is None:
+            raise KeyError(f"Unsupported ITCH message type {message_type!r}")
+        return codec
+
+    def encode(self, message_type, *values):
+        """
+        Encode a framed message.
+
+        Parameters:
+        - message_type: Type code or name
+        - values: Field values in field order
+
+        Returns:
+        - bytes containing the frame
+        """
+        return self.codec(message_type).encode(values)
+
+    def encode_dict(self, message_type, fields):
+        """
+        Encode a framed message from a dict of field values.
+
+        Parameters:
+        - message_type: Type code or name
+        - fields: {field_name: value}; missing fields are zero/space filled
+
+        Returns:
+        - bytes containing the frame
+        """
+        codec = self.codec(message_type)
+        return codec.encode(codec.from_dict(fields))
+
+    def frames(self, data, offset=0):
+        """
+        Split a byte stream into message bodies.
+
+        Parameters:
+        - data: bytes/bytearray/memoryview holding consecutive frames
+        - offset: Offset of the first frame
+
+        Yields:
+        - (offset_of_type_byte, body_length) for each complete frame
+        """
+        end = len(data)
+        if self.dialect == 'itch':
+            while offset + 2 <= end:
+                length = data[offset] << 8 | data[offset + 1]
+                if offset + 2 + length > end:
+                    break
+                yield offset + 2, length
+                offset += 2 + length
+        else:
+            while offset < end:
+                length = data[offset]
+                if length == 0:
+                    # parser_top skips 0x00 idle bytes
+                    offset += 1
+                    continue
+                if offset + length > end:
+                    break
+                yield offset + 1, length - 1
+                offset += length
+
+    def decode_stream(self, data, offset=0, skip_unknown=True):
+        """
+        Decode every complete message in a byte stream.
+
+        This is the hot path: it yields raw tuples and does no dict building.
+
+        Parameters:
+        - data: bytes/bytearray/memoryview holding consecutive frames
+        - offset: Offset of the first frame
+        - skip_unknown: If False, raise on message types without a codec
+
+        Yields:
+        - (MessageCodec, values) for each message
+        """
+        by_wire_type = self.by_wire_type
+        for body_offset, length in self.frames(data, offset):
+            codec = by_wire_type[data[body_offset]]
+            if codec is None or length < codec.size:
+                if skip_unknown:
+                    continue
+                raise ValueError(f"Cannot decode message type 0x{data[body_offset]:02X} "
+                                 f"of length {length} at offset {body_offset}")
+            yield codec, codec.decode(data, body_offset)
+
+    def decode_message(self, frame):
+        """
+        Decode a single framed message into a dict.
+
+        Parameters:
+        - frame: bytes containing one frame (length prefix included)
+
+        Returns:
+        - Dictionary with 'type', 'name' and the message fields, or None if
+          the frame is incomplete or of an unknown type
+        """
+        for codec, values in self.decode_stream(frame):
+            message = codec.to_dict(values)
+            message['type'] = codec.type_code
+            message['name'] = codec.name
+            return message
+        return None
+
+ITCH = ItchCodec('itch')
+BOARD = ItchCodec('board')
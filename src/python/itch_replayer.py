@@ -0,0 +1,304 @@
+import gzip
+import mmap
+import time
+
+from itch_codec import ITCH, ITCH_BUY, price_from_itch
+from order_ids import MAX_ORDER_ID, OrderIdAllocator
+from symbol_table import format_symbol
+
+BLOCK_SIZE = 4 * 1024 * 1024  # read size for compressed captures
+NUM_BOARD_SLOTS = 4  # `NUM_STOCKS in constants.v
+MAX_BOARD_ORDER_ID = MAX_ORDER_ID  # `ORDER_INDEX 7 -> 8-bit order IDs
+MAX_BOARD_QUANTITY = 255  # `QUANTITY_INDEX 7 -> 8-bit quantities
+MAX_BOARD_PRICE = 255 + 255 / 256.0  # 8.8 fixed point
+
+def iter_itch_messages(filename, block_size=BLOCK_SIZE):
+    """
+    Stream messages from a TotalView-ITCH 5.0 file.
+
+    Plain files are memory-mapped and decoded in place; gzip files are
+    decompressed in large blocks, carrying partial messages across blocks.
+
+    Parameters:
+    - filename: Path to the ITCH file (optionally .gz)
+    - block_size: Decompressed block size for gzip files
+
+    Yields:
+    - (MessageCodec, values) for every supported message
+    """
+    with open(filename, 'rb') as f:
+        magic = f.read(2)
+        f.seek(0)
+        if magic == b'\x1f\x8b':
+            yield from _iter_blocks(gzip.GzipFile(fileobj=f), block_size)
+            return
+
+        if f.seek(0, 2) == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield from ITCH.decode_stream(mapped)
+
+def _iter_blocks(stream, block_size):
+    by_wire_type = ITCH.by_wire_type
+    pending = b''
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        data = pending + block if pending else block
+        consumed = 0
+        for body_offset, length in ITCH.frames(data):
+            codec = by_wire_type[data[body_offset]]
+            if codec is not None and length >= codec.size:
+                yield codec, codec.decode(data, body_offset)
+            consumed = body_offset + length
+        pending = data[consumed:]
+
+class ItchTranslator:
+    """
+    Converts ITCH 5.0 order flow for selected stocks into board session rows.
+
+    The selected symbols (or stock locates) are remapped onto the board's
+    stock slots, 64-bit order reference numbers onto the board's 8-bit
+    order IDs, and every order event onto the ADD/CANCEL rows that
+    create_add_order_packet/create_cancel_order_packet encode:
+    - Add / Add with MPID -> ADD
+    - Cancel / Executed / Executed with Price -> EXECUTE of the board lots
+      taken off (nothing when the scaled quantity does not change), or
+      CANCEL once no board lot is left
+    - Delete -> CANCEL of the remaining shares
+    - Replace -> CANCEL of the original order followed by ADD of the new one
+    """
+
+    def __init__(self, symbols=None, locates=None, num_slots=NUM_BOARD_SLOTS,
+                 price_divisor=1.0, quantity_divisor=1):
+        """
+        Initialize the translator.
+
+        Parameters:
+        - symbols: Symbols to replay, in slot order (resolved via Stock Directory messages)
+        - locates: Stock locate codes to replay, in slot order
+        - num_slots: Number of board stock slots
+        - price_divisor: ITCH prices are divided by this to fit the board's 0-255.xx range
+        - quantity_divisor: ITCH shares are divided by this to fit the board's 8-bit quantity
+        """
+        self.num_slots = num_slots
+        self.price_divisor = price_divisor
+        self.quantity_divisor = quantity_divisor
+
+        self.slot_by_locate = {}  # stock locate -> board stock slot
+        self.wanted_symbols = {}  # 8-byte symbol -> board stock slot
+        for slot, symbol in enumerate(symbols or []):
+            self.wanted_symbols[format_symbol(symbol)] = slot
+        for slot, locate in enumerate(locates or [], start=len(self.wanted_symbols)):
+            self.slot_by_locate[locate] = slot
+        if len(self.wanted_symbols) + len(self.slot_by_locate) > num_slots:
+            raise ValueError(f"At most {num_slots} stocks can be mapped onto the board")
+        self.symbols_by_slot = {}  # board stock slot -> symbol, for reporting
+
+        self.orders = {}  # ITCH order reference -> [order_id, slot, is_buy, price, shares, board quantity]
+        self.order_ids = OrderIdAllocator(max_id=MAX_BOARD_ORDER_ID)
+
+        self.dropped_orders = 0  # adds skipped (out of range price or no free order ID)
+        self.messages_seen = 0
+
+    def _board_quantity(self, shares):
+        return min(MAX_BOARD_QUANTITY, shares // self.quantity_divisor)
+
+    def _add(self, stock_locate, timestamp, reference, is_buy, shares, raw_price, rows):
+        slot = self.slot_by_locate.get(stock_locate)
+        if slot is None:
+            return
+        price = round(price_from_itch(raw_price) / self.price_divisor, 2)
+        order_id = self.order_ids.allocate(slot, is_buy) if 0 < price <= MAX_BOARD_PRICE else None
+        if order_id is None:
+            self.dropped_orders += 1
+            return
+        quantity = max(1, self._board_quantity(shares))
+        self.orders[reference] = [order_id, slot, is_buy, price, shares, quantity]
+        rows.append({
+            'type': 'ADD',
+            'stock_id': slot,
+            'order_id': order_id,
+            'is_buy': is_buy,
+            'price': price,
+            'quantity': quantity,
+            'timestamp': timestamp
+        })
+
+    def _reduce(self, reference, timestamp, shares, rows):
+        order = self.orders.get(reference)
+        if order is None:
+            return
+        order_id, slot, is_buy, price, remaining, board_quantity = order
+        remaining = 0 if shares is None else remaining - min(shares, remaining)
+        order[4] = remaining
+        # The board holds the scaled (and clamped) quantity, so it only changes
+        # when the scaled remainder does
+        board_remaining = min(board_quantity, self._board_quantity(remaining))
+        if board_remaining == board_quantity:
+            return
+        order[5] = board_remaining
+        # The board deletes the whole order on CANCEL, so partial reductions
+        # go out as EXECUTE, which only takes the lots off
+        rows.append({
+            'type': 'CANCEL' if board_remaining <= 0 else 'EXECUTE',
+            'stock_id': slot,
+            'order_id': order_id,
+            'is_buy': is_buy,
+            'price': price,
+            'quantity': board_quantity - board_remaining,
+            'timestamp': timestamp
+        })
+        if board_remaining <= 0:
+            # Gone from the board; later messages for the order are ignored
+            del self.orders[reference]
+            self.order_ids.release(order_id)
+
+    def translate(self, codec, values):
+        """
+        Translate one decoded ITCH message.
+
+        Parameters:
+        - codec: MessageCodec of the message
+        - values: Decoded value tuple
+
+        Returns:
+        - List of session rows (possibly empty)
+        """
+        self.messages_seen += 1
+        rows = []
+        type_code = codec.type_code
+        stock_locate = values[0]
+        timestamp = values[2]
+
+        if type_code == 'A' or type_code == 'F':
+            self._add(stock_locate, timestamp, values[3], values[4] == ITCH_BUY, values[5], values[7], rows)
+        elif type_code == 'X' or type_code == 'E' or type_code == 'C':
+            self._reduce(values[3], timestamp, values[4], rows)
+        elif type_code == 'D':
+            self._reduce(values[3], timestamp, None, rows)
+        elif type_code == 'U':
+            order = self.orders.get(values[3])
+            if order is not None:
+                is_buy = order[2]
+                self._reduce(values[3], timestamp, None, rows)
+                self._add(stock_locate, timestamp, values[4], is_buy, values[5], values[6], rows)
+        elif type_code == 'R':
+            slot = self.wanted_symbols.get(values[3])
+            if slot is not None:
+                self.slot_by_locate[stock_locate] = slot
+                self.symbols_by_slot[slot] = values[3].decode('ascii').rstrip()
+        return rows
+
+def iter_session_rows(filename, translator, block_size=BLOCK_SIZE):
+    """
+    Stream board session rows translated from an ITCH file.
+
+    Parameters:
+    - filename: Path to the ITCH file (optionally .gz)
+    - translator: ItchTranslator holding the symbol/locate selection
+    - block_size: Decompressed block size for gzip files
+
+    Yields:
+    - Session row dictionaries with an extra 'timestamp' (ns since midnight)
+    """
+    translate = translator.translate
+    for codec, values in iter_itch_messages(filename, block_size):
+        rows = translate(codec, values)
+        if rows:
+            yield from rows
+
+def replay(rows, send, time_compression=1.0, max_delay=None, clock=None):
+    """
+    Send session rows while preserving their original spacing.
+
+    Parameters:
+    - rows: Iterable of session rows carrying 'timestamp'
+    - send: Callable invoked with each row
+    - time_compression: Factor by which original gaps are shortened
+      (1.0 = real time, 0 or None = as fast as possible)
+    - max_delay: Optional cap in seconds on any single gap
+    - clock: Optional VirtualClock set to each row's original timestamp
+      before it is sent, so frames carry the recorded ITCH times
+
+    Returns:
+    - Number of rows sent
+    """
+    count = 0
+    first_ts = None
+    start = time.perf_counter()
+    pause_total = 0.0
+    last_target = 0.0
+
+    for row in rows:
+        if time_compression:
+            if first_ts is None:
+                first_ts = row['timestamp']
+            target = (row['timestamp'] - first_ts) / 1e9 / time_compression - pause_total
+            if max_delay is not None and target - last_target > max_delay:
+                # Skip over long idle gaps (e.g. pre-open) without drifting later rows
+                pause_total += target - last_target - max_delay
+                target = last_target + max_delay
+            last_target = target
+            wait = target - (time.perf_counter() - start)
+            if wait > 0:
+                time.sleep(wait)
+        if clock is not None:
+            clock.set(row['timestamp'])
+        send(row)
+        count += 1
+    return count
+
+def main():
+    """
+    Command line entry point: replay an ITCH capture to a serial port or CSV.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay a TotalView-ITCH 5.0 capture into the board")
+    parser.add_argument("itch_file", help="ITCH 5.0 file (optionally gzip compressed)")
+    parser.add_argument("--symbols", default="", help="Comma separated symbols mapped onto board slots 0..3")
+    parser.add_argument("--locates", default="", help="Comma separated stock locate codes (alternative to --symbols)")
+    parser.add_argument("--price-divisor", type=float, default=1.0, help="Divide ITCH prices to fit 0-255.xx")
+    parser.add_argument("--quantity-divisor", type=int, default=1, help="Divide ITCH shares to fit 8 bits")
+    parser.add_argument("--csv", help="Write the translated session to this CSV instead of a serial port")
+    parser.add_argument("--port", help="Serial port connected to the board")
+    parser.add_argument("--baud-rate", type=int, default=115200)
+    parser.add_argument("--time-compression", type=float, default=1.0,
+                        help="Speed-up factor for the original timing (0 = as fast as possible)")
+    parser.add_argument("--max-delay", type=float, default=None, help="Cap on any single gap in seconds")
+    parser.add_argument("--original-timestamps", action="store_true",
+                        help="Stamp frames with the recorded ITCH timestamps instead of the current time")
+    args = parser.parse_args()
+
+    symbols = [s for s in args.symbols.split(",") if s]
+    locates = [int(l) for l in args.locates.split(",") if l]
+    translator = ItchTranslator(symbols, locates, price_divisor=args.price_divisor,
+                                quantity_divisor=args.quantity_divisor)
+    rows = iter_session_rows(args.itch_file, translator)
+
+    if args.csv:
+        from market_data_gen_new import save_to_csv
+        save_to_csv(rows, args.csv)  # written as the file is read
+    elif args.port:
+        import serial
+        from itch_clock import VirtualClock, set_clock
+        from packet_utils import create_packet
+
+        clock = None
+        if args.original_timestamps:
+            clock = VirtualClock()
+            set_clock(clock)
+        with serial.Serial(args.port, args.baud_rate, timeout=0.1) as port:
+            sent = replay(rows, lambda row: port.write(create_packet(row)),
+                          args.time_compression, args.max_delay, clock)
+        print(f"Sent {sent} packets")
+    else:
+        parser.error("one of --csv or --port is required")
+
+    print(f"Processed {translator.messages_seen} messages, dropped {translator.dropped_orders} orders, "
+          f"slots: {translator.symbols_by_slot}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import deque
+
+class LazyPlotter:
+    """
+    Stand-in for RealTimePlotter that defers importing matplotlib.
+
+    matplotlib and its Tk backend take longer to import than the rest of
+    the simulator together, and most sessions never look at the plots.
+    Until the plots tab is first selected, data points are only timestamped
+    and kept in bounded per-stock buffers. Selecting the tab imports
+    real_time_plotter, creates the plotter and replays the buffers into it;
+    from then on calls go straight through. Points may arrive from the TX
+    and UI threads, so buffering and the switch-over take a lock.
+    """
+
+    def __init__(self, parent, notebook, max_points=100, symbol_table=None, buffer_points=10000, history=None):
+        """
+        Initialize the stand-in and watch the notebook for the plots tab.
+
+        Parameters:
+        - parent: Frame of the plots tab the plotter is created in
+        - notebook: ttk.Notebook holding the plots tab
+        - max_points: Passed on to RealTimePlotter
+        - symbol_table: Passed on to RealTimePlotter
+        - buffer_points: Points kept per stock and series until the plotter exists
+        - history: Passed on to RealTimePlotter, and used instead of buffer_points
+          for the buffers when given
+        """
+        self.parent = parent
+        self.notebook = notebook
+        self.max_points = max_points
+        self.symbol_table = symbol_table
+        self.buffer_points = buffer_points
+        self.history = history
+        self.plotter = None  # RealTimePlotter once the tab has been shown
+        self.lock = threading.Lock()
+        self.received = {}  # stock_id -> deque of (time, price, quantity)
+        self.highest = {}  # stock_id -> deque of (time, price)
+        self.pnl_series = None  # last series passed to plot_pnl()
+        notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed, add="+")
+
+    @property
+    def loaded(self):
+        """True once the real plotter has been created."""
+        return self.plotter is not None
+
+    def _on_tab_changed(self, event=None):
+        if self.plotter is None and self.notebook.select() == str(self.parent):
+            self.load()
+
+    def load(self):
+        """
+        Create the real plotter now and replay everything buffered so far.
+
+        Returns:
+        - The RealTimePlotter
+        """
+        if self.plotter is not None:
+            return self.plotter
+        from real_time_plotter import RealTimePlotter
+
+        plotter = RealTimePlotter(self.parent, max_points=self.max_points, symbol_table=self.symbol_table,
+                                  history=self.history)
+        with self.lock:
+            # Replay in arrival order: highest order prices are only plotted
+            # once the first received point has started the plot clock
+            events = [(t, 0, stock_id, price, quantity)
+                      for stock_id, points in self.received.items() for t, price, quantity in points]
+            events += [(t, 1, stock_id, price, None)
+                       for stock_id, points in self.highest.items() for t, price in points]
+            events.sort(key=lambda event: event[:2])
+            for t, kind, stock_id, price, quantity in events:
+                if kind == 0:
+                    plotter.add_data_point(stock_id, price, quantity, timestamp=t, redraw=False)
+                else:
+                    plotter.add_highest_order_price(stock_id, price, timestamp=t, redraw=False)
+            self.received = {}
+            self.highest = {}
+            self.plotter = plotter
+        plotter.update_all_plots()
+        if self.pnl_series is not None:
+            plotter.plot_pnl(self.pnl_series)
+        return plotter
+
+    def _buffer(self, name):
+        if self.history is not None:
+            return self.history(name)
+        return deque(maxlen=self.buffer_points)
+
+    def add_data_point(self, stock_id, price, quantity):
+        """Add a received data point (see RealTimePlotter.add_data_point)."""
+        # Read once: clear_plots() on the Tk thread may reset it in between
+        plotter = self.plotter
+        if plotter is None:
+            with self.lock:
+                plotter = self.plotter
+                if plotter is None:
+                    points = self.received.get(stock_id)
+                    if points is None:
+                        points = self.received[stock_id] = self._buffer(f"pending_received_{stock_id}")
+                    points.append((time.time(), price, quantity))
+                    return
+        plotter.add_data_point(stock_id, price, quantity)
+
+    def add_highest_order_price(self, stock_id, highest_price):
+        """Add a highest order price point (see RealTimePlotter.add_highest_order_price)."""
+        plotter = self.plotter
+        if plotter is None:
+            with self.lock:
+                plotter = self.plotter
+                if plotter is None:
+                    points = self.highest.get(stock_id)
+                    if points is None:
+                        points = self.highest[stock_id] = self._buffer(f"pending_highest_{stock_id}")
+                    points.append((time.time(), highest_price))
+                    return
+        plotter.add_highest_order_price(stock_id, highest_price)
+
+    def point_count(self):
+        """
+        Count the points held, buffered or plotted.
+
+        Returns:
+        - Number of points over all stocks and series
+        """
+        if self.plotter is None:
+            series = list(self.received.values()) + list(self.highest.values())
+        else:
+            series = list(self.plotter.stock_data.values()) + list(self.plotter.highest_order_data.values())
+        return sum(len(points) for points in series)
+
+    def plot_pnl(self, series):
+        """Plot the strategy's PnL (see RealTimePlotter.plot_pnl)."""
+        self.pnl_series = series
+        if self.plotter is not None:
+            self.plotter.plot_pnl(series)
+
+    def clear_plots(self):
+        """Drop all plotted and buffered data, recreating the plotter if it exists."""
+        with self.lock:
+            self.received = {}
+            self.highest = {}
+            self.pnl_series = None
+            plotter = self.plotter
+            self.plotter = None
+        if plotter is None:
+            return
+        plotter.clear_plots()
+        for widget in self.parent.winfo_children():
+            widget.destroy()
+        self.load()
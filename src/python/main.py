@@ -1,31 +1,53 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext
-import serial
 import threading
 import csv
+import os
 import time
 import queue
+from collections import deque
 from datetime import datetime
-import serial.tools.list_ports
 
 # Import our modular components
 from config_manager import load_config, save_config, create_default_config
 from stock_book import StockBook
-from packet_utils import create_add_order_packet, create_cancel_order_packet, parse_fpga_response_packet
+from packet_utils import create_packet, parse_fpga_response_packet, split_response_packets
 from market_data_generator import generate_market_data
-# Import the updated plotter 
-# Note: Make sure to place the updated real_time_plotter.py in your project directory
-from real_time_plotter import RealTimePlotter
-
-# Ensure default configuration exists
-create_default_config()
-
-# Load configuration
-CONFIG = load_config()
+from session_columns import SessionColumns, load_session_csv
+from symbol_table import load_symbol_table
+from wire_capture import WireCapture
+from book_journal import BookJournal, book_to_packets
+from book_service import BookService
+from top_of_book import TopOfBookTable
+from frame_cache import load_frame_cache
+from metrics import METRICS, MetricsServer, MetricsDumper
+from matching_engine import MatchingEngine, fill_to_execute_row
+from pnl_tracker import ENGINE_FILLS, PnLTracker, mark_price
+from order_ids import remap_session_ids
+from throughput_ramp import ThroughputRamp, save_curve
+from flow_control import FlowController
+from profiler import SamplingProfiler
+from soak import BoundedQueue, MemoryMonitor, TextLog, buffer_factory, rss_bytes
+# The plotter (and matplotlib) is only imported once the plots tab is shown,
+# or runs in a process of its own
+from lazy_plotter import LazyPlotter
+from plot_process import PlotProcess
 
 class ExchangeSimulator:
-    def __init__(self, root):
+    def __init__(self, root, config, symbols, config_file='config.ini'):
+        """
+        Build the simulator window.
+        
+        Parameters:
+        - root: Tk root window
+        - config: Configuration dictionary (see load_config)
+        - symbols: SymbolTable of the stock universe
+        - config_file: File the Save Config button writes to
+        """
         self.root = root
+        self.config = config
+        self.symbols = symbols
+        self.config_file = config_file
         self.root.title("HFT Exchange Simulator")
         self.root.geometry("1400x800")  # Increased width for better side-by-side display
         
@@ -34,10 +56,96 @@ class ExchangeSimulator:
         self.rx_thread = None
         self.running = False
         self.stock_book = StockBook()
+        self.book_journal = None  # BookJournal when book_journal_file is set
+        if self.config["book_journal_file"]:
+            self.book_journal = BookJournal(self.config["book_journal_file"], self.config["book_snapshot_file"],
+                                            self.stock_book, self.config["snapshot_interval"])
+            self.stock_book = self.book_journal.book
+        # Book changes go through the journal when one is configured
+        self.book_writer = self.book_journal or self.stock_book
+        self.book_service = None  # BookService when book_workers > 0
+        self.top_of_book = None  # TopOfBookTable published for external readers
+        table_name = self.config["top_of_book_name"] or None
+        if self.config["book_workers"] > 0 and not self.book_journal:
+            # Large universes: the TX thread only queues commands, workers keep the books
+            self.book_service = BookService(self.config["book_workers"], max(256, len(self.symbols)), table_name=table_name)
+            self.book_writer = self.book_service
+        elif table_name:
+            self.top_of_book = TopOfBookTable(max(256, len(self.symbols)), table_name)
+            self.stock_book.attach_top_of_book(self.top_of_book)
         self.next_order_id = 1
-        self.packet_queue = queue.Queue()
-        self.rx_queue = queue.Queue()
+        self.session = None  # SessionColumns being sent
+        self.next_row = 0  # index of the next session row to send
+        self.frame_cache = None  # FrameCache of a session loaded from CSV, indexed by row
+        # Soak mode bounds every buffer that grows with the run time
+        self.soak = self.config["soak_mode"]
+        spill_dir = self.config["soak_spill_dir"]
+        if self.soak:
+            self.rx_queue = BoundedQueue(self.config["soak_rx_queue"], self.config["soak_overflow"],
+                                         os.path.join(spill_dir, "rx_queue.jsonl"))
+        else:
+            self.rx_queue = queue.Queue()
         self.orderbook_updating = True  # Flag to control order book updates
+        self.capture = None  # WireCapture while connected with capture_file set
+        self.ramp = None  # ThroughputRamp while a ramp test runs
+        # Paces the TX thread by the board's answers instead of the fixed packet delay
+        self.flow = FlowController(self.config["packet_delay"], self.config["flow_window"],
+                                   self.config["flow_min_delay"], self.config["flow_max_delay"],
+                                   self.config["flow_latency_factor"], timeout=self.config["flow_timeout"],
+                                   baud_rate=self.config["baud_rate"])
+        self.flow_active = False  # flow control setting of the running simulation
+        
+        # Host-side matching: crossing orders and FPGA responses trade, and the
+        # fills are sent to the board as EXECUTE rows by the TX thread
+        self.matching_engine = None
+        self.match_lock = threading.Lock()  # the RX thread matches FPGA responses too
+        self.match_feedback = deque()  # EXECUTE rows waiting to be sent
+        if self.config["matching_engine"]:
+            self.matching_engine = MatchingEngine()
+            for order_id, order in self.stock_book.orders.items():
+                self.matching_engine.rest(order_id, order["stock_id"], order["is_buy"],
+                                          order["price"], order["quantity"])
+        
+        # Hot-path instrumentation, exported over HTTP and/or to a JSON file
+        METRICS.set_enabled(self.config["metrics_enabled"])
+        METRICS.register_gauge("tx_rows_pending", self.rows_pending)
+        METRICS.register_gauge("rx_queue_depth", self.rx_queue.qsize)
+        METRICS.register_gauge("book_orders", lambda: len((self.book_service or self.stock_book).orders))
+        METRICS.register_gauge("flow_in_flight", lambda: self.flow.tracker.in_flight)
+        METRICS.register_gauge("flow_delay_ms", lambda: round(self.flow.delay * 1e3, 3))
+        # Position/PnL accounting of the board's responses
+        self.pnl = None
+        if self.config["pnl_fill_model"]:
+            self.pnl = PnLTracker(ENGINE_FILLS if self.matching_engine else self.config["pnl_fill_model"])
+        self.last_pnl_plot = (0.0, 0)  # (time, tracker updates) of the last PnL plot refresh
+        
+        if self.book_service:
+            METRICS.register_gauge("book_service_pending", self.book_service.pending)
+        if self.matching_engine:
+            METRICS.register_gauge("engine_orders", lambda: len(self.matching_engine.orders))
+        if self.pnl:
+            METRICS.register_gauge("pnl", lambda: self.pnl.equity)
+            METRICS.register_gauge("pnl_drawdown", lambda: self.pnl.drawdown)
+        self.metrics_server = MetricsServer(METRICS, self.config["metrics_port"]) if self.config["metrics_port"] else None
+        self.metrics_dumper = None
+        if self.config["metrics_dump_file"]:
+            self.metrics_dumper = MetricsDumper(METRICS, self.config["metrics_dump_file"], self.config["metrics_dump_interval"])
+        self.last_stats = (time.perf_counter(), {})  # for per-second rates in the stats tab
+        
+        METRICS.register_gauge("rss_mb", lambda: round(rss_bytes() / 2**20, 1))
+        self.memory_monitor = None
+        if self.soak:
+            self.memory_monitor = MemoryMonitor(self.config["memory_log_file"], self.config["memory_log_interval"],
+                                                self.config["memory_top_n"])
+            self.memory_monitor.register("rx_queue", self.rx_queue.qsize)
+            self.memory_monitor.register("rx_queue_overflow", lambda: self.rx_queue.dropped + self.rx_queue.spilled)
+            self.memory_monitor.register("book_orders", lambda: len((self.book_service or self.stock_book).orders))
+            self.memory_monitor.register("plot_points", lambda: self.plotter.point_count())
+        
+        # Sampling profiler over the TX, RX and Tk threads
+        self.profiler = SamplingProfiler(self.config["profile_interval"])
+        if self.config["profile_enabled"]:
+            self.profiler.start()
         
         # Create the GUI
         self.create_widgets()
@@ -51,7 +159,7 @@ class ExchangeSimulator:
         self.port_var = tk.StringVar()
         self.port_combo = ttk.Combobox(conn_frame, textvariable=self.port_var)
         self.port_combo.grid(row=0, column=1, padx=5, pady=5)
-        self.refresh_ports()
+        self.root.after_idle(self.refresh_ports)  # port scan imports pyserial; show the window first
         
         ttk.Button(conn_frame, text="Refresh", command=self.refresh_ports).grid(row=0, column=2, padx=5, pady=5)
         ttk.Button(conn_frame, text="Connect", command=self.connect).grid(row=0, column=3, padx=5, pady=5)
@@ -62,28 +170,32 @@ class ExchangeSimulator:
         settings_frame.pack(fill="x", padx=10, pady=5)
         
         ttk.Label(settings_frame, text="Packet Delay (s):").grid(row=0, column=0, padx=5, pady=5)
-        self.delay_var = tk.DoubleVar(value=CONFIG["packet_delay"])
+        self.delay_var = tk.DoubleVar(value=self.config["packet_delay"])
         ttk.Entry(settings_frame, textvariable=self.delay_var, width=10).grid(row=0, column=1, padx=5, pady=5)
         
         ttk.Label(settings_frame, text="Number of Packets:").grid(row=0, column=2, padx=5, pady=5)
-        self.num_packets_var = tk.IntVar(value=CONFIG["num_packets"])
+        self.num_packets_var = tk.IntVar(value=self.config["num_packets"])
         ttk.Entry(settings_frame, textvariable=self.num_packets_var, width=10).grid(row=0, column=3, padx=5, pady=5)
         
         ttk.Label(settings_frame, text="Cancel Probability:").grid(row=0, column=4, padx=5, pady=5)
-        self.cancel_prob_var = tk.DoubleVar(value=CONFIG["cancel_probability"])
+        self.cancel_prob_var = tk.DoubleVar(value=self.config["cancel_probability"])
         ttk.Entry(settings_frame, textvariable=self.cancel_prob_var, width=10).grid(row=0, column=5, padx=5, pady=5)
         
         ttk.Button(settings_frame, text="Save Config", command=self.save_config).grid(row=0, column=6, padx=5, pady=5)
 
         # New row with checkboxes for new options
-        self.buy_orders_only_var = tk.BooleanVar(value=CONFIG.get("buy_orders_only", False))
+        self.buy_orders_only_var = tk.BooleanVar(value=self.config.get("buy_orders_only", False))
         ttk.Checkbutton(settings_frame, text="Buy Orders Only", 
                       variable=self.buy_orders_only_var).grid(row=1, column=0, columnspan=2, padx=5, pady=5, sticky="w")
         
-        self.cancel_highest_price_var = tk.BooleanVar(value=CONFIG.get("cancel_highest_price", False))
+        self.cancel_highest_price_var = tk.BooleanVar(value=self.config.get("cancel_highest_price", False))
         ttk.Checkbutton(settings_frame, text="Cancel Highest Price Order", 
                       variable=self.cancel_highest_price_var).grid(row=1, column=2, columnspan=2, padx=5, pady=5, sticky="w")
         
+        self.flow_control_var = tk.BooleanVar(value=self.config["flow_control"])
+        ttk.Checkbutton(settings_frame, text="Adaptive Flow Control",
+                      variable=self.flow_control_var).grid(row=1, column=4, columnspan=2, padx=5, pady=5, sticky="w")
+        
         # Action buttons
         action_frame = ttk.Frame(self.root)
         action_frame.pack(fill="x", padx=10, pady=5)
@@ -94,6 +206,8 @@ class ExchangeSimulator:
         ttk.Button(action_frame, text="Stop Simulation", command=self.stop_simulation).pack(side="left", padx=5, pady=5)
         ttk.Button(action_frame, text="Clear Plots", command=self.clear_plots).pack(side="left", padx=5, pady=5)
         ttk.Button(action_frame, text="Pause/Resume Order Book", command=self.toggle_orderbook_updates).pack(side="left", padx=5, pady=5)
+        ttk.Button(action_frame, text="Resync Board", command=self.resync_board).pack(side="left", padx=5, pady=5)
+        ttk.Button(action_frame, text="Throughput Ramp", command=self.start_ramp).pack(side="left", padx=5, pady=5)
         
         # Notebook for different views
         self.notebook = ttk.Notebook(self.root)
@@ -105,6 +219,7 @@ class ExchangeSimulator:
         
         self.sent_text = scrolledtext.ScrolledText(sent_tab)
         self.sent_text.pack(fill="both", expand=True)
+        self.sent_log = self.text_log(self.sent_text, "sent")
         
         # Received packets tab
         received_tab = ttk.Frame(self.notebook)
@@ -112,6 +227,7 @@ class ExchangeSimulator:
         
         self.received_text = scrolledtext.ScrolledText(received_tab)
         self.received_text.pack(fill="both", expand=True)
+        self.received_log = self.text_log(self.received_text, "received")
         
         # Order book tab
         orderbook_tab = ttk.Frame(self.notebook)
@@ -125,17 +241,145 @@ class ExchangeSimulator:
         plots_tab = ttk.Frame(self.notebook)
         self.notebook.add(plots_tab, text="Real-time Plots")
         
-        # Initialize the real-time plotter
-        self.plotter = RealTimePlotter(plots_tab, max_points=100)
+        # Initialize the real-time plotter (created when the tab is first selected)
+        history_args = None
+        if self.soak:
+            history_args = (self.config["soak_plot_points"], self.config["soak_overflow"],
+                            os.path.join(self.config["soak_spill_dir"], "plots"))
+        if self.config["plot_process"]:
+            # Rendering never holds up the TX/RX threads: they only write samples to shared memory
+            self.plotter = PlotProcess(max_points=100, symbol_table=self.symbols, history_args=history_args)
+            ttk.Label(plots_tab, text="Plots are drawn by a separate process, in their own window.").pack(
+                anchor="w", padx=5, pady=5)
+            METRICS.register_gauge("plot_samples_dropped", lambda: self.plotter.dropped)
+        else:
+            history = buffer_factory(*history_args) if history_args else None
+            self.plotter = LazyPlotter(plots_tab, self.notebook, max_points=100, symbol_table=self.symbols,
+                                       history=history)
+        
+        # Live statistics tab
+        stats_tab = ttk.Frame(self.notebook)
+        self.notebook.add(stats_tab, text="Stats")
+        
+        self.metrics_enabled_var = tk.BooleanVar(value=METRICS.enabled)
+        ttk.Checkbutton(stats_tab, text="Enable Instrumentation", variable=self.metrics_enabled_var,
+                        command=self.toggle_metrics).pack(anchor="w", padx=5, pady=5)
+        ttk.Button(stats_tab, text="Reset", command=METRICS.reset).pack(anchor="w", padx=5)
+        self.profiler_var = tk.BooleanVar(value=self.profiler.running)
+        ttk.Checkbutton(stats_tab, text="Sampling Profiler", variable=self.profiler_var,
+                        command=self.toggle_profiler).pack(anchor="w", padx=5, pady=5)
+        
+        self.stats_text = scrolledtext.ScrolledText(stats_tab, font=("Courier", 10))
+        self.stats_text.pack(fill="both", expand=True)
         
         # Status bar
         self.status_var = tk.StringVar(value="Ready")
         status_bar = ttk.Label(self.root, textvariable=self.status_var, relief="sunken", anchor="w")
         status_bar.pack(side="bottom", fill="x")
         
+        if self.book_journal:
+            self.status_var.set(f"Recovered {len(self.stock_book.orders)} orders "
+                                f"({self.book_journal.replayed} journal records replayed)")
+        
         # Set up periodic UI updates
         self.root.after(100, self.update_ui)
     
+    def resync_board(self):
+        """Re-send the host book as ADD orders, e.g. after the board was reset."""
+        if not self.serial_port or not self.serial_port.is_open:
+            self.status_var.set("Please connect to a serial port first")
+            return
+        
+        if self.book_service:
+            self.status_var.set("Resync needs the full book in this process (set book_workers = 0)")
+            return
+        
+        packets = book_to_packets(self.stock_book)
+        try:
+            for packet_data in packets:
+                binary_packet = create_packet(packet_data, self.symbols.symbol(packet_data['stock_id']))
+                self.serial_port.write(binary_packet)
+                self.flow.on_sent(binary_packet, time.perf_counter())
+                if self.capture:
+                    self.capture.record_tx(binary_packet)
+            self.status_var.set(f"Resent {len(packets)} resting orders to the board")
+        except Exception as e:
+            self.status_var.set(f"Error resyncing board: {str(e)}")
+    
+    def start_ramp(self):
+        """Step the send rate up until the board saturates (runs unattended in the background)."""
+        if not self.serial_port or not self.serial_port.is_open:
+            self.status_var.set("Please connect to a serial port first")
+            return
+        if self.ramp is not None or (self.tx_thread and self.tx_thread.is_alive()):
+            self.status_var.set("Stop the simulation (or wait for the running ramp) first")
+            return
+        
+        # The ramp reads the responses itself
+        self.running = False
+        if self.rx_thread:
+            self.rx_thread.join(timeout=1)
+            self.rx_thread = None
+        
+        def on_step(step):
+            self.status_var.set(f"Ramp: {step['sent_rate']:.1f} frames/s -> {step['response_rate']:.1f} responses/s, "
+                                f"loss {step['loss'] * 100:.1f}%, p99 {step['p99_ms']:.1f} ms")
+        
+        self.ramp = ThroughputRamp(self.serial_port, self.symbols,
+                                   start_rate=self.config["ramp_start_rate"],
+                                   max_rate=self.config["ramp_max_rate"],
+                                   step_factor=self.config["ramp_step_factor"],
+                                   step_seconds=self.config["ramp_step_seconds"],
+                                   loss_threshold=self.config["ramp_loss_threshold"],
+                                   latency_factor=self.config["ramp_latency_factor"],
+                                   on_step=on_step, capture=self.capture,
+                                   reserved_ids=list((self.book_service or self.stock_book).orders))
+        ramp_thread = threading.Thread(target=self.run_ramp, name="ramp")
+        ramp_thread.daemon = True
+        ramp_thread.start()
+        self.status_var.set("Throughput ramp started")
+    
+    def run_ramp(self):
+        """Run the ramp, save its curve, then hand the port back to the receiver thread."""
+        ramp = self.ramp
+        try:
+            steps = ramp.run()
+            if self.config["ramp_output_file"]:
+                save_curve(steps, self.config["ramp_output_file"])
+            if ramp.knee is not None:
+                status = (f"Ramp knee: {ramp.knee['response_rate']:.1f} responses/s at "
+                          f"{ramp.knee['sent_rate']:.1f} frames/s (p99 {ramp.knee['p99_ms']:.1f} ms)")
+            else:
+                status = "Ramp saturated at its first step; lower ramp_start_rate"
+            if self.config["ramp_output_file"]:
+                status += f", curve saved to {self.config['ramp_output_file']}"
+            self.status_var.set(status)
+        except Exception as e:
+            self.status_var.set(f"Ramp error: {str(e)}")
+        finally:
+            self.ramp = None
+            if not ramp.stopped and self.serial_port and self.serial_port.is_open:
+                self.running = True
+                self.rx_thread = threading.Thread(target=self.receive_packets, name="rx")
+                self.rx_thread.daemon = True
+                self.rx_thread.start()
+    
+    def text_log(self, widget, name):
+        """
+        Wrap a packet log widget, bounded in soak mode.
+        
+        Parameters:
+        - widget: Text widget of the log
+        - name: Log name (spill file name in soak mode)
+        
+        Returns:
+        - TextLog
+        """
+        if not self.soak:
+            return TextLog(widget)
+        return TextLog(widget, self.config["soak_text_lines"], self.config["soak_overflow"],
+                       os.path.join(self.config["soak_spill_dir"], f"{name}.log"))
+    
     def toggle_orderbook_updates(self):
         """Toggle the order book updates on/off."""
         self.orderbook_updating = not self.orderbook_updating
@@ -144,44 +388,77 @@ class ExchangeSimulator:
         else:
             self.status_var.set("Order book updates paused - You can now scroll freely")
     
+    def toggle_metrics(self):
+        """Turn hot-path instrumentation on or off."""
+        METRICS.set_enabled(self.metrics_enabled_var.get())
+        self.last_stats = (time.perf_counter(), dict(METRICS.counters))
+    
+    def toggle_profiler(self):
+        """Apply the Sampling Profiler checkbox."""
+        self.set_profiling(self.profiler_var.get())
+    
+    def set_profiling(self, enabled):
+        """
+        Start the sampling profiler, or stop it and export what it sampled.
+        
+        Parameters:
+        - enabled: True to start a fresh profile, False to stop and export
+        """
+        self.profiler_var.set(enabled)
+        if enabled == self.profiler.running:
+            return
+        if enabled:
+            self.profiler.reset()
+            self.profiler.start()
+            self.status_var.set(f"Profiling every {self.profiler.interval * 1e3:.1f} ms")
+            return
+        self.profiler.stop()
+        try:
+            collapsed_file, speedscope_file = self.profiler.export(self.config["profile_output"])
+            self.status_var.set(f"Profile of {self.profiler.samples} samples saved to "
+                                f"{collapsed_file} and {speedscope_file}")
+        except Exception as e:
+            self.status_var.set(f"Error saving profile: {str(e)}")
+    
+    def signal_toggle_profiler(self, signum, frame):
+        """SIGUSR1 handler: flip the profiler from outside the GUI (kill -USR1 <pid>)."""
+        # Signal handlers run between bytecodes of the main thread; let Tk do the rest
+        self.root.after(0, self.set_profiling, not self.profiler.running)
+    
     def clear_plots(self):
         """Clear all plots and reinitialize the plotter."""
-        plots_tab = self.notebook.winfo_children()[3]  # Get the plots tab
-        
-        # First clear existing plots in the current plotter if it exists
-        if hasattr(self, 'plotter'):
-            self.plotter.clear_plots()
-        
-        # Then recreate the plotter
-        for widget in plots_tab.winfo_children():
-            widget.destroy()
-        self.plotter = RealTimePlotter(plots_tab, max_points=100)
+        self.plotter.clear_plots()
         self.status_var.set("Plots cleared")
     
     def save_config(self):
-        # Update CONFIG with current values
-        CONFIG["packet_delay"] = self.delay_var.get()
-        CONFIG["num_packets"] = self.num_packets_var.get()
-        CONFIG["cancel_probability"] = self.cancel_prob_var.get()
-        CONFIG["buy_orders_only"] = self.buy_orders_only_var.get()
-        CONFIG["cancel_highest_price"] = self.cancel_highest_price_var.get()
+        # Update the config with current values
+        self.config["packet_delay"] = self.delay_var.get()
+        self.config["num_packets"] = self.num_packets_var.get()
+        self.config["cancel_probability"] = self.cancel_prob_var.get()
+        self.config["buy_orders_only"] = self.buy_orders_only_var.get()
+        self.config["cancel_highest_price"] = self.cancel_highest_price_var.get()
+        self.config["flow_control"] = self.flow_control_var.get()
         
         # Save the updated configuration
-        save_config(CONFIG)
+        save_config(self.config, self.config_file)
         self.status_var.set("Configuration saved")
     
     def refresh_ports(self):
+        import serial.tools.list_ports
+        
         ports = [p.device for p in serial.tools.list_ports.comports()]
         self.port_combo['values'] = ports
         if ports:
             self.port_var.set(ports[0])
     
     def connect(self):
+        import serial
+        
         port = self.port_var.get()
         try:
             self.serial_port = serial.Serial(
                 port=port,
-                baudrate=CONFIG["baud_rate"],
+                baudrate=self.config["baud_rate"],
                 bytesize=serial.EIGHTBITS,
                 parity=serial.PARITY_NONE,
                 stopbits=serial.STOPBITS_ONE,
@@ -189,9 +466,13 @@ class ExchangeSimulator:
             )
             self.status_var.set(f"Connected to {port}")
             
+            if self.config["capture_file"]:
+                self.capture = WireCapture(self.config["capture_file"])
+            self.flow.reset()
+            
             # Start the receiver thread
             self.running = True
-            self.rx_thread = threading.Thread(target=self.receive_packets)
+            self.rx_thread = threading.Thread(target=self.receive_packets, name="rx")
             self.rx_thread.daemon = True
             self.rx_thread.start()
             
@@ -200,6 +481,8 @@ class ExchangeSimulator:
     
     def disconnect(self):
         self.running = False
+        if self.ramp:
+            self.ramp.stop()
         if self.tx_thread:
             self.tx_thread.join(timeout=1)
             self.tx_thread = None
@@ -211,6 +494,38 @@ class ExchangeSimulator:
         if self.serial_port and self.serial_port.is_open:
             self.serial_port.close()
             self.status_var.set("Disconnected")
+        
+        if self.capture:
+            self.capture.close()
+            self.capture = None
+        
+        if self.book_journal:
+            self.book_journal.flush()
+    
+    def on_close(self):
+        """Stop the threads and worker processes, then close the window."""
+        self.disconnect()
+        self.set_profiling(False)
+        if self.memory_monitor:
+            self.memory_monitor.close()
+            self.memory_monitor.log()  # closing snapshot, to compare with the first
+        if self.metrics_dumper:
+            self.metrics_dumper.close()
+            self.metrics_dumper.dump()  # final snapshot of the session
+        if self.metrics_server:
+            self.metrics_server.close()
+        if self.soak:
+            self.rx_queue.close()
+        if self.config["plot_process"]:
+            self.plotter.close()
+        if self.book_journal:
+            self.book_journal.close()
+        if self.book_service:
+            self.book_service.close()
+        if self.top_of_book:
+            self.stock_book.attach_top_of_book(None)
+            self.top_of_book.close()
+        self.root.destroy()
     
     def generate_csv(self):
         filename = filedialog.asksaveasfilename(
@@ -224,15 +539,15 @@ class ExchangeSimulator:
             num_packets = self.num_packets_var.get()
             self.status_var.set(f"Generating {num_packets} packets...")
             
-            # Update CONFIG with current settings
-            CONFIG["cancel_probability"] = self.cancel_prob_var.get()
-            CONFIG["buy_orders_only"] = self.buy_orders_only_var.get()
-            CONFIG["cancel_highest_price"] = self.cancel_highest_price_var.get()
+            # Update the config with current settings
+            self.config["cancel_probability"] = self.cancel_prob_var.get()
+            self.config["buy_orders_only"] = self.buy_orders_only_var.get()
+            self.config["cancel_highest_price"] = self.cancel_highest_price_var.get()
             
-            packets = generate_market_data(num_packets, CONFIG)
+            packets = generate_market_data(num_packets, self.config, self.symbols)
             
             with open(filename, 'w', newline='') as csvfile:
-                fieldnames = ['type', 'stock_id', 'order_id', 'is_buy', 'price', 'quantity']
+                fieldnames = ['type', 'stock_id', 'order_id', 'is_buy', 'price', 'quantity', 'new_order_id']
                 writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
                 writer.writeheader()
                 
@@ -252,33 +567,25 @@ class ExchangeSimulator:
             return
         
         try:
-            packets = []
-            with open(filename, 'r', newline='') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    # Handle potential empty or missing values
-                    try:
-                        packet = {
-                            'type': row['type'],
-                            'stock_id': int(row.get('stock_id', 0)),
-                            'order_id': int(row.get('order_id', 0)),
-                            'is_buy': str(row.get('is_buy', '')).lower() == 'true',
-                            'price': float(row['price']) if row.get('price', '') != '' else None,
-                            'quantity': int(row['quantity']) if row.get('quantity', '') != '' else None
-                        }
-                        packets.append(packet)
-                    except (ValueError, KeyError) as e:
-                        self.status_var.set(f"Warning: Could not parse row in CSV: {str(e)}")
-                        continue
+            errors = []
+            session = load_session_csv(filename, on_error=errors.append)
             
-            # Clear the queue and add the new packets
-            while not self.packet_queue.empty():
-                self.packet_queue.get()
+            # Move the order IDs into the board's 8-bit space if the file reuses live ones
+            session, remapped = remap_session_ids(session)
             
-            for packet in packets:
-                self.packet_queue.put(packet)
+            # Encode the session once (or load its frames from the cache directory)
+            frame_cache = load_frame_cache(filename, session, self.symbols, self.config["frame_cache_dir"])
             
-            self.status_var.set(f"Loaded {len(packets)} packets from {filename}")
+            # Replace whatever was left of the previous session
+            self.session, self.frame_cache, self.next_row = session, frame_cache, 0
+            
+            status = f"Loaded {len(session)} packets from {filename}"
+            if any(remapped.values()):
+                status += (f" (order IDs remapped: {remapped['evicted']} evicted, "
+                           f"{remapped['reused']} reused, {remapped['dropped']} unknown orders dropped)")
+            if errors:
+                status += f" (skipped {len(errors)} unparsable rows, first: {errors[0]})"
+            self.status_var.set(status)
             
         except Exception as e:
             self.status_var.set(f"Error loading CSV: {str(e)}")
@@ -288,27 +595,32 @@ class ExchangeSimulator:
             self.status_var.set("Please connect to a serial port first")
             return
         
-        if self.packet_queue.empty():
+        if not self.rows_pending():
             # No packets loaded, generate them on the fly
             num_packets = self.num_packets_var.get()
-            CONFIG["cancel_probability"] = self.cancel_prob_var.get()
-            CONFIG["buy_orders_only"] = self.buy_orders_only_var.get()
-            CONFIG["cancel_highest_price"] = self.cancel_highest_price_var.get()
-            packets = generate_market_data(num_packets, CONFIG)
+            self.config["cancel_probability"] = self.cancel_prob_var.get()
+            self.config["buy_orders_only"] = self.buy_orders_only_var.get()
+            self.config["cancel_highest_price"] = self.cancel_highest_price_var.get()
+            packets = generate_market_data(num_packets, self.config, self.symbols)
             
-            for packet in packets:
-                self.packet_queue.put(packet)
+            self.session, self.frame_cache, self.next_row = SessionColumns.from_rows(packets), None, 0
             
             self.status_var.set(f"Generated {num_packets} packets for simulation")
         
         # Start the transmitter thread
+        self.flow_active = self.flow_control_var.get()
+        self.flow.initial_delay = self.delay_var.get()
         self.running = True
-        self.tx_thread = threading.Thread(target=self.send_packets)
+        self.tx_thread = threading.Thread(target=self.send_packets, name="tx")
         self.tx_thread.daemon = True
         self.tx_thread.start()
         
         self.status_var.set("Simulation started")
     
+    def rows_pending(self):
+        """Number of session rows not sent yet."""
+        return len(self.session) - self.next_row if self.session is not None else 0
+    
     def stop_simulation(self):
         self.running = False
         self.status_var.set("Simulation stopped")
@@ -323,100 +635,241 @@ class ExchangeSimulator:
         Returns:
         - The highest price or None if no orders exist
         """
-        # Get all orders for this stock
-        buy_orders = self.stock_book.buy_orders.get(stock_id, [])
-        
-        # Return the highest price if buy orders exist
-        if buy_orders:
-            # Buy orders are sorted by price descending, so the first one has the highest price
-            return buy_orders[0]["price"]
-        
-        return None
+        best_buy = (self.book_service or self.stock_book).get_highest_buy(stock_id)
+        return best_buy["price"] if best_buy else None
     
     def send_packets(self):
         delay = self.delay_var.get()
-        self.sent_text.insert(tk.END, "Starting packet transmission\n")
+        self.sent_log.write("Starting packet transmission\n")
         
-        while self.running and not self.packet_queue.empty():
-            packet_data = self.packet_queue.get()
-            
-            if packet_data['type'] == 'ADD':
-                binary_packet = create_add_order_packet(
-                    packet_data['stock_id'], 
-                    packet_data['order_id'], 
-                    packet_data['price'], 
-                    packet_data['quantity'], 
-                    packet_data['is_buy']
-                )
-            else:  # CANCEL
-                binary_packet = create_cancel_order_packet(
-                    packet_data['stock_id'], 
-                    packet_data['order_id'], 
-                    packet_data['quantity'] if packet_data['quantity'] is not None else 0
-                )
+        session = self.session
+        frame_cache = self.frame_cache
+        
+        while self.running and self.session is session and self.next_row < len(session):
+            index = self.next_row
+            self.next_row += 1
+            packet_data = session.row(index)
             
-            # Send the packet
             try:
-                self.serial_port.write(binary_packet)
-                
-                # Update the packet queue display
-                packet_str = f"\n[{datetime.now().strftime('%H:%M:%S.%f')[:-3]}] "
-                packet_str += f"Sent {packet_data['type']} - Stock: {packet_data['stock_id']}, "
-                packet_str += f"Order: {packet_data['order_id']}"
+                rows = [packet_data]
+                if self.matching_engine is not None:
+                    start = METRICS.start()
+                    rows = self.match_row(packet_data)
+                    METRICS.stop("match", start)
+                    # Fills go to the board before the rows that caused them
+                    self.send_match_feedback()
                 
-                if packet_data['type'] == 'ADD':
-                    packet_str += f", {'Buy' if packet_data['is_buy'] else 'Sell'}"
-                    if packet_data['price'] is not None:
-                        packet_str += f", Price: {packet_data['price']:.2f}"
-                    if packet_data['quantity'] is not None:
-                        packet_str += f", Qty: {packet_data['quantity']}"
+                for row in rows:
+                    start = METRICS.start()
+                    if row is packet_data and frame_cache is not None:
+                        # Pre-encoded frame, only the tracking number and timestamp are patched
+                        binary_packet = frame_cache.frame(index)
+                    else:
+                        binary_packet = create_packet(row, self.symbols.symbol(row['stock_id']))
+                    METRICS.stop("encode", start)
+                    if not self.transmit(row, binary_packet):
+                        if row is packet_data and self.matching_engine is None:
+                            self.next_row = index  # not sent: resend it when the simulation restarts
+                        break
                 
-                packet_str += "\n"
-                
-                self.sent_text.insert(tk.END, packet_str)
-                self.sent_text.see(tk.END)
-                
-                # Update the stock book (for order book display)
-                if packet_data['type'] == 'ADD':
-                    self.stock_book.add_order(
-                        packet_data['order_id'],
-                        packet_data['stock_id'],
-                        packet_data['is_buy'],
-                        packet_data['price'],
-                        packet_data['quantity']
-                    )
-                    
-                    # Get the highest price in order book for this stock after adding
-                    highest_price = self.get_highest_price_for_stock(packet_data['stock_id'])
-                    
-                    # Update the plotter with the highest price in the order book
-                    if highest_price is not None:
-                        self.plotter.add_highest_order_price(
-                            packet_data['stock_id'],
-                            highest_price
-                        )
-                        
-                else:  # CANCEL
-                    self.stock_book.remove_order(packet_data['order_id'])
-                    
-                    # Get the highest price in order book for this stock after cancellation
-                    highest_price = self.get_highest_price_for_stock(packet_data['stock_id'])
-                    
-                    # Update the plotter with the highest price in the order book
-                    if highest_price is not None:
-                        self.plotter.add_highest_order_price(
-                            packet_data['stock_id'],
-                            highest_price
-                        )
-                
-                # Sleep to control packet rate
-                time.sleep(delay)
+                # Sleep to control packet rate (flow control paces each write instead)
+                if not self.flow_active:
+                    time.sleep(delay)
                 
             except Exception as e:
                 self.status_var.set(f"Error sending packet: {str(e)}")
-                break
+                return
         
         self.status_var.set("Transmission complete")
+        
+        # FPGA responses keep trading against the engine after the last row; their
+        # fills go to the board until the next session takes over or TX is stopped
+        while self.matching_engine is not None and self.running and self.session is session:
+            try:
+                self.send_match_feedback()
+            except Exception as e:
+                self.status_var.set(f"Error sending fills: {str(e)}")
+                return
+            time.sleep(0.01)
+    
+    def transmit(self, packet_data, binary_packet):
+        """
+        Write one frame to the board and apply its row to the host book.
+        
+        Parameters:
+        - packet_data: Session row dictionary the frame encodes
+        - binary_packet: Encoded frame
+        
+        Returns:
+        - False if TX was stopped while waiting for flow control (nothing sent)
+        """
+        if self.flow_active:
+            start = METRICS.start()
+            sent = self.flow.wait(lambda: self.running)
+            METRICS.stop("flow_wait", start)
+            if not sent:
+                return False
+        start = METRICS.start()
+        self.serial_port.write(binary_packet)
+        self.flow.on_sent(binary_packet, time.perf_counter())
+        if self.capture:
+            self.capture.record_tx(binary_packet)
+        METRICS.stop("write", start)
+        METRICS.count("tx_messages")
+        METRICS.count("tx_bytes", len(binary_packet))
+        
+        # Update the packet queue display
+        start = METRICS.start()
+        packet_str = f"\n[{datetime.now().strftime('%H:%M:%S.%f')[:-3]}] "
+        packet_str += f"Sent {packet_data['type']} - Stock: {packet_data['stock_id']}, "
+        packet_str += f"Order: {packet_data['order_id']}"
+        
+        if packet_data['type'] == 'ADD':
+            packet_str += f", {'Buy' if packet_data['is_buy'] else 'Sell'}"
+            if packet_data['price'] is not None:
+                packet_str += f", Price: {packet_data['price']:.2f}"
+            if packet_data['quantity'] is not None:
+                packet_str += f", Qty: {packet_data['quantity']}"
+        elif packet_data['type'] == 'EXECUTE':
+            packet_str += f", Qty: {packet_data['quantity']}"
+        elif packet_data['type'] == 'REPLACE':
+            packet_str += f" -> {packet_data['new_order_id']}, Price: {packet_data['price']:.2f}, "
+            packet_str += f"Qty: {packet_data['quantity']}"
+        
+        packet_str += "\n"
+        
+        self.sent_log.write(packet_str)
+        METRICS.stop("log_format", start)
+        
+        # Update the stock book (for order book display)
+        start = METRICS.start()
+        packet_type = packet_data['type']
+        if packet_type == 'ADD':
+            self.book_writer.add_order(
+                packet_data['order_id'],
+                packet_data['stock_id'],
+                packet_data['is_buy'],
+                packet_data['price'],
+                packet_data['quantity']
+            )
+        elif packet_type == 'EXECUTE':
+            self.book_writer.execute_order(packet_data['order_id'], packet_data['quantity'] or 0)
+        elif packet_type == 'REPLACE':
+            self.book_writer.replace_order(
+                packet_data['order_id'],
+                packet_data['new_order_id'],
+                packet_data['price'],
+                packet_data['quantity']
+            )
+        else:  # CANCEL or DELETE; the board deletes the whole order on CANCEL
+            self.book_writer.remove_order(packet_data['order_id'])
+        if self.book_journal:
+            # Hand every row's records to the OS, so a crash loses at most the row in flight
+            self.book_journal.flush()
+        
+        # Get the highest price in order book for this stock after the change
+        highest_price = self.get_highest_price_for_stock(packet_data['stock_id'])
+        if self.pnl is not None:
+            self.pnl.mark_from_book(packet_data['stock_id'], self.book_service or self.stock_book)
+        METRICS.stop("book_update", start)
+        
+        # Update the plotter with the highest price in the order book
+        start = METRICS.start()
+        if highest_price is not None:
+            self.plotter.add_highest_order_price(
+                packet_data['stock_id'],
+                highest_price
+            )
+        METRICS.stop("plot_update", start)
+        return True
+    
+    def match_row(self, packet_data):
+        """
+        Run a session row through the matching engine.
+        
+        Fills against resting orders are queued as EXECUTE rows for
+        send_match_feedback(); only what is left of the order goes out.
+        
+        Parameters:
+        - packet_data: Session row dictionary
+        
+        Returns:
+        - List of rows to send to the board for this row (possibly empty)
+        """
+        packet_type = packet_data['type']
+        with self.match_lock:
+            if packet_type == 'ADD':
+                fills, remaining = self.matching_engine.submit(
+                    packet_data['order_id'], packet_data['stock_id'], packet_data['is_buy'],
+                    packet_data['price'], packet_data['quantity'])
+                self.queue_fills(fills)
+                if not fills:
+                    return [packet_data]
+                return [dict(packet_data, quantity=remaining)] if remaining else []
+            if packet_type == 'EXECUTE':
+                # An order the engine no longer holds traded in full and never reached the board
+                if self.matching_engine.reduce(packet_data['order_id'], packet_data['quantity'] or 0) is None:
+                    return []
+                return [packet_data]
+            if packet_type == 'REPLACE':
+                result = self.matching_engine.replace(packet_data['order_id'], packet_data['new_order_id'],
+                                                      packet_data['price'], packet_data['quantity'])
+                if result is None:
+                    return []
+                # The replacement may trade, so the board gets a cancel and the resting remainder
+                fills, remaining = result
+                self.queue_fills(fills)
+                rows = [dict(packet_data, type='CANCEL', price=None, quantity=None)]
+                if remaining:
+                    rows.append({
+                        'type': 'ADD',
+                        'stock_id': packet_data['stock_id'],
+                        'order_id': packet_data['new_order_id'],
+                        'is_buy': packet_data['is_buy'],
+                        'price': packet_data['price'],
+                        'quantity': remaining
+                    })
+                return rows
+            if not self.matching_engine.cancel(packet_data['order_id']):
+                return []
+            return [packet_data]
+    
+    def queue_fills(self, fills):
+        """Queue EXECUTE rows for fills so the board's book follows the engine's."""
+        if fills:
+            self.match_feedback.extend(fill_to_execute_row(fill) for fill in fills)
+            METRICS.count("fills", len(fills))
+    
+    def match_response(self, response):
+        """
+        Trade an FPGA buy/sell decision against the book (immediate-or-cancel).
+        
+        Parameters:
+        - response: Parsed FPGA response dictionary
+        """
+        quantity = int(response['quantity'])
+        if quantity <= 0:
+            return
+        with self.match_lock:
+            fills, _ = self.matching_engine.submit(None, response['stock_id'], response['is_buy'],
+                                                   response['price'], quantity, rest=False)
+            self.queue_fills(fills)
+        METRICS.count("fpga_fills", len(fills))
+        if self.pnl is not None:
+            # The engine's fills are the strategy's fills
+            book = self.book_service or self.stock_book
+            self.pnl.responses += 1
+            for fill in fills:
+                self.pnl.on_fill(fill['stock_id'], fill['is_buy'], fill['price'], fill['quantity'],
+                                 mark_price(book, fill['stock_id']))
+    
+    def send_match_feedback(self):
+        """Send queued fill executions (TX thread only)."""
+        while self.match_feedback:
+            row = self.match_feedback.popleft()
+            if not self.transmit(row, create_packet(row)):
+                self.match_feedback.appendleft(row)
+                return
     
     def receive_packets(self):
         if not self.serial_port:
@@ -429,28 +882,34 @@ class ExchangeSimulator:
                 # Read data from serial port
                 if self.serial_port.in_waiting:
                     data = self.serial_port.read(self.serial_port.in_waiting)
+                    read_time = time.perf_counter()
+                    if self.capture:
+                        self.capture.record_rx(data)
+                    METRICS.count("rx_bytes", len(data))
 
                     # Print the raw data in hex format
                     hex_data = ' '.join([f"{b:02x}" for b in data])
-                    self.received_text.insert(tk.END, f"\n[{datetime.now().strftime('%H:%M:%S.%f')[:-3]}] RAW HEX: {hex_data}\n")
-                    self.received_text.see(tk.END)
+                    self.received_log.write(f"\n[{datetime.now().strftime('%H:%M:%S.%f')[:-3]}] RAW HEX: {hex_data}\n")
 
                     buffer.extend(data)
                     
-                    # Process complete packets
-                    while len(buffer) >= 1:  # At least 1 byte for length
-                        packet_length = buffer[0]
-                        
-                        if len(buffer) < packet_length:
-                            break  # Wait for more data
-                        
-                        # Extract the packet
-                        packet = buffer[:packet_length]
-                        buffer = buffer[packet_length:]
-                        
-                        # Process the packet
+                    # Process complete packets; incomplete ones wait for more data
+                    packets, dropped = split_response_packets(buffer)
+                    if dropped:
+                        METRICS.count("rx_decode_errors", dropped)
+                    for packet in packets:
+                        start = METRICS.start()
                         parsed_packet = parse_fpga_response_packet(packet)
-                        if parsed_packet:
+                        METRICS.stop("rx_decode", start)
+                        if not parsed_packet:
+                            METRICS.count("rx_decode_errors")
+                        else:
+                            METRICS.count("rx_messages")
+                            self.flow.on_packet(parsed_packet, read_time)
+                            if self.matching_engine is not None:
+                                self.match_response(parsed_packet)
+                            elif self.pnl is not None:
+                                self.pnl.on_response(parsed_packet, self.book_service or self.stock_book)
                             self.rx_queue.put({
                                 'timestamp': datetime.now(),
                                 'length': parsed_packet['length'],
@@ -478,8 +937,7 @@ class ExchangeSimulator:
                 packet_str += f"Qty: {packet['quantity']} "
                 packet_str += f"Price: {packet['price']:.2f},\n"
                 
-                self.received_text.insert(tk.END, packet_str)
-                self.received_text.see(tk.END)
+                self.received_log.write(packet_str)
                 
                 # Update the real-time plot with the new received data point
                 self.plotter.add_data_point(
@@ -495,22 +953,110 @@ class ExchangeSimulator:
         if self.orderbook_updating:
             self.update_orderbook_display()
         
+        self.update_stats_display()
+        self.update_pnl_plot()
+        
         # Schedule the next update
         self.root.after(100, self.update_ui)
     
+    def update_pnl_plot(self):
+        """Redraw the PnL plot (at most once per second, only when something changed)."""
+        if self.pnl is None:
+            return
+        now = time.perf_counter()
+        last_time, last_updates = self.last_pnl_plot
+        if now - last_time < 1.0 or self.pnl.updates == last_updates:
+            return
+        self.last_pnl_plot = (now, self.pnl.updates)
+        self.plotter.plot_pnl(self.pnl.series)
+    
+    def update_stats_display(self):
+        """Refresh the stats tab (at most once per second, only while it is visible)."""
+        now = time.perf_counter()
+        last_time, last_counters = self.last_stats
+        if now - last_time < 1.0 or self.notebook.tab(self.notebook.select(), "text") != "Stats":
+            return
+        
+        snapshot = METRICS.snapshot()
+        counters = snapshot['counters']
+        elapsed = now - last_time
+        self.last_stats = (now, counters)
+        
+        def rate(name):
+            return (counters.get(name, 0) - last_counters.get(name, 0)) / elapsed
+        
+        lines = [f"Instrumentation: {'on' if snapshot['enabled'] else 'off'}", ""]
+        lines.append(f"TX: {rate('tx_messages'):10.1f} msgs/s {rate('tx_bytes'):12.1f} bytes/s")
+        lines.append(f"RX: {rate('rx_messages'):10.1f} msgs/s {rate('rx_bytes'):12.1f} bytes/s")
+        lines.append(f"RX decode errors: {counters.get('rx_decode_errors', 0)}")
+        if self.matching_engine is not None:
+            lines.append(f"Fills: {counters.get('fills', 0)} ({counters.get('fpga_fills', 0)} against FPGA responses)")
+        if self.pnl is not None:
+            lines.extend(self.pnl.summary_lines())
+        if self.flow_active:
+            lines.extend(self.flow.summary_lines())
+        if self.profiler.samples:
+            lines.extend(self.profiler.summary_lines())
+        for name, value in sorted(snapshot['gauges'].items()):
+            lines.append(f"{name}: {value}")
+        
+        lines.append("")
+        lines.append(f"{'Stage':14}{'Count':>10}{'Mean us':>10}{'p50 us':>10}{'p99 us':>10}{'Max us':>10}")
+        for stage, summary in sorted(snapshot['stages'].items()):
+            lines.append(f"{stage:14}{summary['count']:>10}{summary['mean_ns'] / 1e3:>10.1f}"
+                         f"{summary['p50_ns'] / 1e3:>10.1f}{summary['p99_ns'] / 1e3:>10.1f}"
+                         f"{summary['max_ns'] / 1e3:>10.1f}")
+        
+        self.stats_text.delete(1.0, tk.END)
+        self.stats_text.insert(tk.END, "\n".join(lines) + "\n")
+    
     def update_orderbook_display(self):
         # Clear the order book display
         self.orderbook_text.delete(1.0, tk.END)
         
+        if self.book_service:
+            self.insert_top_of_book_rows()
+            return
+        
         # Create a fixed-width format for consistent column sizing
         column_width = 30
+        stocks_per_band = 4
+        
+        # Only stocks with resting orders are shown, side by side in bands of
+        # stocks_per_band columns so large universes stay readable
+        stock_ids = self.stock_book.get_all_stocks()
+        if not stock_ids:
+            stock_ids = list(range(min(self.config["num_stocks"], stocks_per_band)))
         
+        for band_start in range(0, len(stock_ids), stocks_per_band):
+            self.insert_orderbook_band(stock_ids[band_start:band_start + stocks_per_band], column_width)
+    
+    def insert_top_of_book_rows(self):
+        """Render best bid/ask per stock as published by the book service workers."""
+        self.orderbook_text.insert(tk.END, f"{'Stock':30}{'Orders':>8}{'Bid Qty':>10}{'Bid':>10}"
+                                           f"{'Ask':>10}{'Ask Qty':>10}\n")
+        for stock_id in self.book_service.get_all_stocks():
+            bid, bid_qty, ask, ask_qty, count = self.book_service.top_of_book(stock_id)
+            name = f"{stock_id} {self.symbols.name(stock_id)}"
+            bid_str = f"{bid:.2f}" if bid_qty else "-"
+            ask_str = f"{ask:.2f}" if ask_qty else "-"
+            self.orderbook_text.insert(tk.END, f"{name:30}{count:>8}{bid_qty:>10}{bid_str:>10}"
+                                               f"{ask_str:>10}{ask_qty:>10}\n")
+    
+    def insert_orderbook_band(self, stock_ids, column_width):
+        """
+        Render the books of a group of stocks side by side.
+        
+        Parameters:
+        - stock_ids: Stock identifiers to show in this band
+        - column_width: Width of each stock's column in characters
+        """
         # Create headers for all stocks side by side
         header_row = ""
         separator_row = ""
         
-        for stock_id in range(CONFIG["num_stocks"]):
-            header = f"Stock {stock_id} Order Book"
+        for stock_id in stock_ids:
+            header = f"Stock {stock_id} {self.symbols.name(stock_id)} Order Book"
             # Pad the header to the column width
             header_row += header.ljust(column_width)
             separator_row += "-" * column_width
@@ -519,50 +1065,40 @@ class ExchangeSimulator:
         self.orderbook_text.insert(tk.END, header_row + "\n")
         self.orderbook_text.insert(tk.END, separator_row + "\n\n")
         
-        # Determine the maximum number of sell orders across all stocks
-        max_sell_orders = 0
-        max_buy_orders = 0
-        for stock_id in range(CONFIG["num_stocks"]):
-            sell_orders = self.stock_book.sell_orders.get(stock_id, [])
-            buy_orders = self.stock_book.buy_orders.get(stock_id, [])
-            max_sell_orders = max(max_sell_orders, len(sell_orders))
-            max_buy_orders = max(max_buy_orders, len(buy_orders))
+        # The book keeps both sides sorted
+        books = [self.stock_book.get_all_orders_for_stock(stock_id) for stock_id in stock_ids]
+        sell_books = [book['sell'] for book in books]
+        buy_books = [book['buy'] for book in books]
         
-        # Display sell orders (highest to lowest for each stock, side by side)
+        # Display sell orders (lowest first for each stock, side by side)
         self.orderbook_text.insert(tk.END, "SELL ORDERS:\n")
-        
-        # For each row of sell orders across all stocks
-        for i in range(max_sell_orders):
-            row = ""
-            for stock_id in range(CONFIG["num_stocks"]):
-                sell_orders = sorted(self.stock_book.sell_orders.get(stock_id, []), 
-                                   key=lambda x: x["price"])
-                
-                if i < len(sell_orders):
-                    order = sell_orders[i]
-                    cell = f"  #{order['order_id']}: {order['quantity']} @ ${order['price']:.2f}"
-                else:
-                    cell = "  "
-                    
-                row += cell.ljust(column_width)
-                
-            self.orderbook_text.insert(tk.END, row + "\n")
+        self.insert_orderbook_rows(sell_books, column_width)
         
         # Add a separator between sell and buy orders
         self.orderbook_text.insert(tk.END, "\n")
         
         # Display buy orders (highest to lowest for each stock, side by side)
         self.orderbook_text.insert(tk.END, "BUY ORDERS:\n")
+        self.insert_orderbook_rows(buy_books, column_width)
         
-        # For each row of buy orders across all stocks
-        for i in range(max_buy_orders):
+        self.orderbook_text.insert(tk.END, "\n")
+    
+    def insert_orderbook_rows(self, books, column_width):
+        """
+        Render one side of several books as aligned rows.
+        
+        Parameters:
+        - books: List of sorted order lists, one per column
+        - column_width: Width of each column in characters
+        """
+        max_orders = max((len(orders) for orders in books), default=0)
+        
+        # For each row of orders across all stocks
+        for i in range(max_orders):
             row = ""
-            for stock_id in range(CONFIG["num_stocks"]):
-                buy_orders = sorted(self.stock_book.buy_orders.get(stock_id, []), 
-                                  key=lambda x: x["price"], reverse=True)
-                
-                if i < len(buy_orders):
-                    order = buy_orders[i]
+            for orders in books:
+                if i < len(orders):
+                    order = orders[i]
                     cell = f"  #{order['order_id']}: {order['quantity']} @ ${order['price']:.2f}"
                 else:
                     cell = "  "
@@ -571,8 +1107,38 @@ class ExchangeSimulator:
                 
             self.orderbook_text.insert(tk.END, row + "\n")
 
-# Main entry point
-if __name__ == "__main__":
+def main():
+    """
+    Command line entry point: start the simulator GUI.
+    """
+    import argparse
+    import signal
+    
+    parser = argparse.ArgumentParser(description="HFT exchange simulator for the FPGA order book")
+    parser.add_argument("--config", default="config.ini",
+                        help="Configuration file (created with the defaults if missing)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Start the sampling profiler with the simulator (send SIGUSR1 to toggle it while running)")
+    parser.add_argument("--profile-output", help="Profile file prefix (overrides profile_output)")
+    args = parser.parse_args()
+    
+    config_file = args.config
+    create_default_config(config_file)
+    config = load_config(config_file)
+    if args.profile:
+        config["profile_enabled"] = True
+    if args.profile_output:
+        config["profile_output"] = args.profile_output
+    
+    # Stock universe (dense stock IDs -> symbol, tick size, baseline price)
+    symbols = load_symbol_table(config)
+    
     root = tk.Tk()
-    app = ExchangeSimulator(root)
-    root.mainloop()
\ No newline at end of file
+    app = ExchangeSimulator(root, config, symbols, config_file)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
+    if hasattr(signal, "SIGUSR1"):  # not on Windows
+        signal.signal(signal.SIGUSR1, app.signal_toggle_profiler)
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
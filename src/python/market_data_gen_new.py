@@ -1,55 +1,57 @@
 import random
-import csv
+import heapq
 import math
 from collections import deque
 
-def generate_realistic_market_data(number_of_stocks=4, rows_per_stock=1250):
+from order_ids import OrderIdAllocator
+from session_columns import load_session_csv
+from symbol_table import SymbolTable
+
+def generate_realistic_market_data(number_of_stocks=4, rows_per_stock=1250, symbol_table=None,
+                                   execute_probability=0.0, replace_probability=0.0):
     """
     Generate realistic market data for HFT simulation with more microstructure.
     
     Parameters:
     - number_of_stocks: Number of different stock IDs to generate
     - rows_per_stock: Number of ADD orders per stock
+    - symbol_table: Optional SymbolTable providing baseline prices and tick
+      sizes (defaults to SymbolTable.default(number_of_stocks))
+    - execute_probability: Per-row probability of executing part (or all)
+      of the highest resting order instead of adding or cancelling
+    - replace_probability: Per-row probability of replacing a resting order
+      with a new ID, a price near the path and a new quantity
+    
+    Order IDs come from an OrderIdAllocator over the board's 8-bit ID
+    space; when every ID is live, a row that would add or replace an order
+    cancels the oldest resting order (of any stock) instead.
     
     Returns:
     - List of dictionaries representing market data rows
     """
+    if symbol_table is None:
+        symbol_table = SymbolTable.default(number_of_stocks)
+    elif len(symbol_table) < number_of_stocks:
+        raise ValueError(f"Symbol table has {len(symbol_table)} stocks, {number_of_stocks} requested")
+    
     data = []
-    order_books = {}  # To track active orders per stock
-    order_prices = {}  # To track prices of orders for each stock
-    last_best_prices = {}  # To track the best (lowest) price for each stock for buy orders
-    has_order = {}  # To track if each stock has at least one order
-    
-    # Set different baseline prices for each stock
-    baseline_prices = {
-        0: 100,
-        1: 50,
-        2: 200,
-        3: 80
-    }
-    
-    # Initialize order tracking
-    for i in range(number_of_stocks):
-        order_books[i] = set()
-        order_prices[i] = {}  # order_id -> price
-        last_best_prices[i] = baseline_prices[i]
-        has_order[i] = False
-    
-    global_order_id = 1
-    
-    # Pre-generate price paths with realistic microstructure
-    price_paths = {}
-    tick_sizes = {
-        0: 0.01,  # 1 cent tick for stock 0
-        1: 0.01,  # 1 cent tick for stock 1
-        2: 0.01,  # 1 cent tick for stock 2
-        3: 0.01   # 1 cent tick for stock 3
-    }
+    # Per-stock state is kept in lists indexed by the dense stock ID
+    order_prices = [{} for _ in range(number_of_stocks)]  # order_id -> price
+    order_quantities = [{} for _ in range(number_of_stocks)]  # order_id -> resting quantity
+    best_heaps = [[] for _ in range(number_of_stocks)]  # (price, order_id) min-heap
+    highest_heaps = [[] for _ in range(number_of_stocks)]  # (-price, order_id) max-heap
+    # Live order IDs per stock, kept as a list plus index so REPLACE can pick
+    # and remove one in O(1)
+    live_orders = [[] for _ in range(number_of_stocks)]
+    live_orders_pos = [{} for _ in range(number_of_stocks)]
+    
+    order_ids = OrderIdAllocator()
     
     # Generate synthetic price paths with realistic microstructure
+    price_paths = []
     for stock_id in range(number_of_stocks):
-        base_price = baseline_prices[stock_id]
-        tick = tick_sizes[stock_id]
+        base_price = symbol_table.baseline_price(stock_id)
+        tick = symbol_table.tick_size(stock_id)
         
         # Parameters for price path
         volatility = 0.003 * base_price  # Increased volatility for more price variation
@@ -85,16 +87,49 @@ def generate_realistic_market_data(number_of_stocks=4, rows_per_stock=1250):
             # Store in path
             price_path.append(round(current_price, 2))
         
-        price_paths[stock_id] = price_path
+        price_paths.append(price_path)
+    
+    # Heaps use lazy deletion: entries whose order is no longer live are
+    # discarded when they reach the top. IDs are reused, so an entry is only
+    # live while its ID still rests at the entry's price (sign is -1 for the
+    # negated max-heap).
+    def peek_live(heap, prices, sign=1):
+        while heap and prices.get(heap[0][1]) != sign * heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+    
+    def mark_live(stock_id, order_id):
+        live_orders_pos[stock_id][order_id] = len(live_orders[stock_id])
+        live_orders[stock_id].append(order_id)
+    
+    def mark_dead(stock_id, order_id):
+        pos = live_orders_pos[stock_id].pop(order_id)
+        last = live_orders[stock_id].pop()
+        if last != order_id:
+            live_orders[stock_id][pos] = last
+            live_orders_pos[stock_id][last] = pos
     
     # Function to get the best (lowest) price for buy orders in the order book
     def get_best_price(stock_id):
-        if not order_prices[stock_id]:
-            return None
-        return min(order_prices[stock_id].values())
+        top = peek_live(best_heaps[stock_id], order_prices[stock_id])
+        return top[0] if top is not None else None
+    
+    def evict_oldest():
+        order_id, evicted_stock, _ = order_ids.evict()
+        del order_prices[evicted_stock][order_id]
+        del order_quantities[evicted_stock][order_id]
+        mark_dead(evicted_stock, order_id)
+        data.append({
+            "type": "CANCEL",
+            "stock_id": evicted_stock,
+            "order_id": order_id,
+            "is_buy": True,
+            "price": None,
+            "quantity": None
+        })
     
     # Use the generated price paths to create a mix of orders
-    path_indices = {stock_id: 0 for stock_id in range(number_of_stocks)}
+    path_indices = [0] * number_of_stocks
     
     for i in range(number_of_stocks * rows_per_stock):
         stock_id = i % number_of_stocks
@@ -111,8 +146,74 @@ def generate_realistic_market_data(number_of_stocks=4, rows_per_stock=1250):
         # Decide whether to add or cancel based on current best price
         current_best = get_best_price(stock_id)
         
+        # Executions and replaces are only drawn when enabled, so the
+        # add/cancel mix keeps its random sequence by default
+        flow = None
+        if current_best is not None and (execute_probability or replace_probability):
+            draw = random.random()
+            if draw < execute_probability:
+                flow = "EXECUTE"
+            elif draw < execute_probability + replace_probability:
+                flow = "REPLACE"
+        
+        if flow == "EXECUTE":
+            # Sellers trade against the highest resting buy
+            _, order_id = peek_live(highest_heaps[stock_id], order_prices[stock_id], -1)
+            resting = order_quantities[stock_id][order_id]
+            executed = random.randint(1, resting)
+            data.append({
+                "type": "EXECUTE",
+                "stock_id": stock_id,
+                "order_id": order_id,
+                "is_buy": True,
+                "price": order_prices[stock_id][order_id],
+                "quantity": executed
+            })
+            if executed == resting:
+                del order_prices[stock_id][order_id]
+                del order_quantities[stock_id][order_id]
+                mark_dead(stock_id, order_id)
+                order_ids.release(order_id)
+            else:
+                order_quantities[stock_id][order_id] = resting - executed
+        
+        elif flow == "REPLACE" and order_ids.full:
+            evict_oldest()
+        
+        elif flow == "REPLACE":
+            order_id = random.choice(live_orders[stock_id])
+            new_price = max(round(target_price + random.uniform(-0.02, 0.02) * target_price, 2), 0.01)
+            new_quantity = int(10 + random.random() * 490)
+            new_order_id = order_ids.allocate(stock_id, True)
+            
+            # The old ID drops out of the heaps lazily
+            del order_prices[stock_id][order_id]
+            del order_quantities[stock_id][order_id]
+            mark_dead(stock_id, order_id)
+            order_ids.release(order_id)
+            order_prices[stock_id][new_order_id] = new_price
+            order_quantities[stock_id][new_order_id] = new_quantity
+            mark_live(stock_id, new_order_id)
+            heapq.heappush(best_heaps[stock_id], (new_price, new_order_id))
+            heapq.heappush(highest_heaps[stock_id], (-new_price, new_order_id))
+            
+            data.append({
+                "type": "REPLACE",
+                "stock_id": stock_id,
+                "order_id": order_id,
+                "new_order_id": new_order_id,
+                "is_buy": True,
+                "price": new_price,
+                "quantity": new_quantity
+            })
+        
         # Add order logic
-        if current_best is None or random.random() < 0.7:  # Higher chance to add orders
+        elif current_best is None or random.random() < 0.7:  # Higher chance to add orders
+            if order_ids.full:
+                # Every ID is live: cancel the oldest order rather than reuse one
+                evict_oldest()
+                continue
+            
             # Generate a price near the target but with more variation
             # Use a wider range for price variation to create more diverse prices
             price_variation = random.uniform(-0.1, 0.1) * target_price
@@ -130,10 +231,12 @@ def generate_realistic_market_data(number_of_stocks=4, rows_per_stock=1250):
             base_quantity = int(10 + random.random() * 490)  # Between 10 and 500
             
             # Add the ADD order
-            new_order_id = global_order_id
-            global_order_id += 1
-            order_books[stock_id].add(new_order_id)
+            new_order_id = order_ids.allocate(stock_id, True)
             order_prices[stock_id][new_order_id] = new_price
+            order_quantities[stock_id][new_order_id] = base_quantity
+            mark_live(stock_id, new_order_id)
+            heapq.heappush(best_heaps[stock_id], (new_price, new_order_id))
+            heapq.heappush(highest_heaps[stock_id], (-new_price, new_order_id))
             
             data.append({
                 "type": "ADD",
@@ -144,31 +247,24 @@ def generate_realistic_market_data(number_of_stocks=4, rows_per_stock=1250):
                 "quantity": base_quantity
             })
             
-            # Mark that this stock has at least one order now
-            has_order[stock_id] = True
-            
         # Cancel order logic - always cancel the highest price
-        elif has_order[stock_id] and len(order_books[stock_id]) > 0:
-            # Find the order with the highest price to cancel
-            highest_price = max(order_prices[stock_id].values())
-            # Find all orders with this price
-            highest_price_orders = [oid for oid, price in order_prices[stock_id].items() 
-                               if price == highest_price]
-            
-            # Select one of these orders to cancel
-            if highest_price_orders:
-                order_to_cancel = random.choice(highest_price_orders)
-                order_books[stock_id].remove(order_to_cancel)
-                del order_prices[stock_id][order_to_cancel]
-                
-                data.append({
-                    "type": "CANCEL",
-                    "stock_id": stock_id,
-                    "order_id": order_to_cancel,
-                    "is_buy": True,
-                    "price": None,
-                    "quantity": None
-                })
+        else:
+            # Ties on the highest price are broken by the oldest order ID
+            _, order_to_cancel = peek_live(highest_heaps[stock_id], order_prices[stock_id], -1)
+            heapq.heappop(highest_heaps[stock_id])
+            del order_prices[stock_id][order_to_cancel]
+            del order_quantities[stock_id][order_to_cancel]
+            mark_dead(stock_id, order_to_cancel)
+            order_ids.release(order_to_cancel)
+            
+            data.append({
+                "type": "CANCEL",
+                "stock_id": stock_id,
+                "order_id": order_to_cancel,
+                "is_buy": True,
+                "price": None,
+                "quantity": None
+            })
     
     return data
 
@@ -177,16 +273,21 @@ def save_to_csv(data, filename):
     Save the generated market data to a CSV file.
     
     Parameters:
-    - data: List of dictionaries with market data
+    - data: Iterable of dictionaries with market data (streamed, so a
+      generator of rows is written without being held in memory)
     - filename: Output CSV filename
     """
-    fields = ["type", "stock_id", "order_id", "is_buy", "price", "quantity"]
+    import csv
+
+    fields = ["type", "stock_id", "order_id", "is_buy", "price", "quantity", "new_order_id"]
     
+    count = 0
     with open(filename, 'w', newline='') as csvfile:
         writer = csv.DictWriter(csvfile, fieldnames=fields)
         writer.writeheader()
         
         for row in data:
+            count += 1
             # Convert None values to empty strings and booleans to 'true'/'false'
             formatted_row = {}
             for field in fields:
@@ -200,29 +301,49 @@ def save_to_csv(data, filename):
             
             writer.writerow(formatted_row)
     
-    print(f"Saved {len(data)} rows to {filename}")
+    print(f"Saved {count} rows to {filename}")
+
+def load_from_csv(filename, on_error=None):
+    """
+    Load market data rows from a CSV file written by save_to_csv.
+    
+    Parameters:
+    - filename: Input CSV filename
+    - on_error: Optional callable invoked with the exception for rows that
+      cannot be parsed (such rows are skipped)
+    
+    Returns:
+    - List of dictionaries with market data
+    """
+    return list(load_session_csv(filename, on_error))
 
 def main():
     """
     Main function to generate and save market data.
     """
     print("Generating enhanced realistic market data...")
-    market_data = generate_realistic_market_data(number_of_stocks=4, rows_per_stock=1250)
+    symbol_table = SymbolTable.default(4)
+    market_data = generate_realistic_market_data(number_of_stocks=len(symbol_table), rows_per_stock=1250,
+                                                 symbol_table=symbol_table)
     
     # Analyze the data
     add_orders = [row for row in market_data if row["type"] == "ADD"]
-    cancel_orders = [row for row in market_data if row["type"] == "CANCEL"]
+    type_counts = {}
+    for row in market_data:
+        type_counts[row["type"]] = type_counts.get(row["type"], 0) + 1
     
     print(f"Generated {len(market_data)} total rows:")
-    print(f"- ADD orders: {len(add_orders)}")
-    print(f"- CANCEL orders: {len(cancel_orders)}")
+    for row_type, count in type_counts.items():
+        print(f"- {row_type} orders: {count}")
     
     # Print price ranges for each stock
-    for stock_id in range(4):
-        stock_data = [row for row in add_orders if row["stock_id"] == stock_id]
-        prices = [row["price"] for row in stock_data]
-        if prices:
-            print(f"Stock {stock_id} price range: {min(prices):.2f} to {max(prices):.2f}")
+    price_ranges = {}
+    for row in add_orders:
+        low, high = price_ranges.get(row["stock_id"], (row["price"], row["price"]))
+        price_ranges[row["stock_id"]] = (min(low, row["price"]), max(high, row["price"]))
+    for stock_id in sorted(price_ranges):
+        low, high = price_ranges[stock_id]
+        print(f"Stock {stock_id} ({symbol_table.name(stock_id)}) price range: {low:.2f} to {high:.2f}")
     
     # Save to CSV
     save_to_csv(market_data, "book_data_rand.csv")
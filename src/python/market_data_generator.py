@@ -1,21 +1,99 @@
 import random
 
-def generate_market_data(num_packets, config):
+from order_ids import OrderIdAllocator
+
+def generate_market_data(num_packets, config, symbol_table=None):
     """
-    Generate a series of market data packets (ADD and CANCEL orders).
+    Generate a series of market data packets.
+    
+    Rows are ADD and CANCEL orders, plus EXECUTE and REPLACE rows against
+    resting orders when config sets execute_probability or
+    replace_probability (each a per-row probability).
+    
+    Order IDs come from an OrderIdAllocator over the board's 8-bit ID
+    space, so an ID is only reused once its order has left the book. When
+    every ID is live, a row that would add an order cancels the oldest
+    resting order instead.
     
     Parameters:
     - num_packets: Number of packets to generate
     - config: Configuration dictionary with settings like prices and quantities
+    - symbol_table: Optional SymbolTable; when given, prices are drawn around
+      each stock's baseline and snapped to its tick size
     
     Returns:
     - List of dictionaries representing the generated packets
     """
     packets = []
+    stock_id_start = config.get("stock_id_start", 0)
+    num_stocks = config["num_stocks"]
+    
     # Initialize active orders with stock_ids starting from 0 instead of 1
-    active_orders = {stock_id: [] for stock_id in range(config.get("stock_id_start", 0), 
-                                                       config.get("stock_id_start", 0) + config["num_stocks"])}
-    next_order_id = 1
+    active_orders = {stock_id: [] for stock_id in range(stock_id_start, stock_id_start + num_stocks)}
+    
+    # Stocks that currently have active orders, kept as a list plus index so
+    # picking and removing one stays O(1) with thousands of stocks
+    stocks_with_orders = []
+    stocks_with_orders_pos = {}
+    
+    def mark_active(stock_id):
+        if stock_id not in stocks_with_orders_pos:
+            stocks_with_orders_pos[stock_id] = len(stocks_with_orders)
+            stocks_with_orders.append(stock_id)
+    
+    def mark_inactive(stock_id):
+        pos = stocks_with_orders_pos.pop(stock_id)
+        last = stocks_with_orders.pop()
+        if last != stock_id:
+            stocks_with_orders[pos] = last
+            stocks_with_orders_pos[last] = pos
+    
+    def draw_price(stock_id):
+        if symbol_table is None or stock_id not in symbol_table:
+            return round(random.uniform(config["price_min"], config["price_max"]), 2)
+        baseline = symbol_table.baseline_price(stock_id)
+        tick = symbol_table.tick_size(stock_id)
+        price = random.uniform(baseline * 0.9, baseline * 1.1)
+        return round(max(round(price / tick) * tick, tick), 2)
+    
+    def requote_price(stock_id, price):
+        # A replace moves the order a few ticks from where it rested
+        if symbol_table is None or stock_id not in symbol_table:
+            tick = 0.01
+        else:
+            tick = symbol_table.tick_size(stock_id)
+        return round(max(price + random.randint(-5, 5) * tick, tick), 2)
+    
+    def best_order(orders):
+        # Executions trade against the highest buy or the lowest sell
+        buy_orders = [o for o in orders if o['is_buy']]
+        sell_orders = [o for o in orders if not o['is_buy']]
+        if buy_orders and (not sell_orders or random.random() < 0.5):
+            return max(buy_orders, key=lambda x: x['price'])
+        return min(sell_orders, key=lambda x: x['price'])
+    
+    order_ids = OrderIdAllocator()
+    orders_by_id = {}  # order_id -> (stock_id, order, True if the order is in active_orders)
+    
+    def release(order):
+        order_ids.release(order['order_id'])
+        del orders_by_id[order['order_id']]
+    
+    def evict_oldest():
+        order_id, stock_id, _ = order_ids.evict()
+        stock_id, order, tracked = orders_by_id.pop(order_id)
+        if tracked:
+            active_orders[stock_id].remove(order)
+            if not active_orders[stock_id]:
+                mark_inactive(stock_id)
+        packets.append({
+            'type': 'CANCEL',
+            'stock_id': stock_id,
+            'order_id': order_id,
+            'is_buy': order['is_buy'],
+            'price': order['price'],
+            'quantity': order['quantity']
+        })
     
     # Check for buy_orders_only flag in config
     buy_orders_only = config.get("buy_orders_only", False)
@@ -23,49 +101,67 @@ def generate_market_data(num_packets, config):
     # Check for cancel_highest_price flag in config
     cancel_highest_price = config.get("cancel_highest_price", False)
     
+    execute_probability = config.get("execute_probability", 0.0)
+    replace_probability = config.get("replace_probability", 0.0)
+    
     for _ in range(num_packets):
-        # Decide whether to add or cancel an order
-        if (random.random() < config["cancel_probability"] and 
-            any(len(orders) > 0 for orders in active_orders.values())):
-            # Find a stock with active orders to cancel
-            valid_stocks = [stock_id for stock_id, orders in active_orders.items() if orders]
-            if not valid_stocks:
-                # No valid stocks to cancel orders from, create a new order instead
-                stock_id = random.randint(config.get("stock_id_start", 0), 
-                                         config.get("stock_id_start", 0) + config["num_stocks"] - 1)
-                
-                # Set is_buy based on buy_orders_only flag
-                is_buy = True if buy_orders_only else random.random() < 0.5
-                
-                price = round(random.uniform(config["price_min"], config["price_max"]), 2)
-                quantity = random.randint(config["quantity_min"], config["quantity_max"])
-                
-                # Create add packet
-                packets.append({
-                    'type': 'ADD',
-                    'stock_id': stock_id,
-                    'order_id': next_order_id,
-                    'is_buy': is_buy,
-                    'price': price,
-                    'quantity': quantity
-                })
-                
-                # Add to active orders if we haven't reached the limit
-                if len(active_orders[stock_id]) < config["order_book_depth"]:
-                    active_orders[stock_id].append({
-                        'order_id': next_order_id,
-                        'is_buy': is_buy,
-                        'price': price,
-                        'quantity': quantity
-                    })
-                
-                next_order_id += 1
-                if next_order_id > 200:
-                    next_order_id = 1  # Reset order ID to stay within 8-bit range
-                
-                continue
+        # Executions and replaces are drawn first (and only when enabled, so
+        # add/cancel-only sessions keep their random sequence)
+        flow = None
+        if (execute_probability or replace_probability) and stocks_with_orders:
+            draw = random.random()
+            if draw < execute_probability:
+                flow = 'EXECUTE'
+            elif draw < execute_probability + replace_probability:
+                flow = 'REPLACE'
+        
+        if flow == 'EXECUTE':
+            stock_id = random.choice(stocks_with_orders)
+            order = best_order(active_orders[stock_id])
+            executed = random.randint(1, order['quantity'])
+            packets.append({
+                'type': 'EXECUTE',
+                'stock_id': stock_id,
+                'order_id': order['order_id'],
+                'is_buy': order['is_buy'],
+                'price': order['price'],
+                'quantity': executed
+            })
+            
+            # Partial executions leave the rest of the order resting
+            order['quantity'] -= executed
+            if not order['quantity']:
+                release(order)
+                active_orders[stock_id].remove(order)
+                if not active_orders[stock_id]:
+                    mark_inactive(stock_id)
+        elif flow == 'REPLACE' and order_ids.full:
+            evict_oldest()
+        elif flow == 'REPLACE':
+            stock_id = random.choice(stocks_with_orders)
+            order = random.choice(active_orders[stock_id])
+            price = requote_price(stock_id, order['price'])
+            quantity = random.randint(config["quantity_min"], config["quantity_max"])
+            new_order_id = order_ids.allocate(stock_id, order['is_buy'])
+            packets.append({
+                'type': 'REPLACE',
+                'stock_id': stock_id,
+                'order_id': order['order_id'],
+                'new_order_id': new_order_id,
+                'is_buy': order['is_buy'],
+                'price': price,
+                'quantity': quantity
+            })
             
-            stock_id = random.choice(valid_stocks)
+            # The replacement takes the original's place in active orders
+            release(order)
+            order['order_id'] = new_order_id
+            order['price'] = price
+            order['quantity'] = quantity
+            orders_by_id[new_order_id] = (stock_id, order, True)
+        # Decide whether to add or cancel an order
+        elif random.random() < config["cancel_probability"] and stocks_with_orders:
+            stock_id = random.choice(stocks_with_orders)
             
             # Choose an order to cancel
             orders = active_orders[stock_id]
@@ -102,7 +198,10 @@ def generate_market_data(num_packets, config):
                         order = sell_orders[0] if sell_orders else buy_orders[0]
             
             # Remove the order from active orders
+            release(order)
             active_orders[stock_id].remove(order)
+            if not active_orders[stock_id]:
+                mark_inactive(stock_id)
             
             # Create cancel packet
             packets.append({
@@ -113,39 +212,44 @@ def generate_market_data(num_packets, config):
                 'price': order['price'],
                 'quantity': order['quantity']
             })
+        elif order_ids.full:
+            # Every ID is live: cancel the oldest order rather than reuse one
+            evict_oldest()
         else:
             # Create a new order
-            stock_id = random.randint(config.get("stock_id_start", 0), 
-                                     config.get("stock_id_start", 0) + config["num_stocks"] - 1)
+            stock_id = random.randint(stock_id_start, stock_id_start + num_stocks - 1)
             
             # Set is_buy based on buy_orders_only flag
             is_buy = True if buy_orders_only else random.random() < 0.5
             
-            price = round(random.uniform(config["price_min"], config["price_max"]), 2)
+            price = draw_price(stock_id)
             quantity = random.randint(config["quantity_min"], config["quantity_max"])
+            order_id = order_ids.allocate(stock_id, is_buy)
             
             # Create add packet
             packets.append({
                 'type': 'ADD',
                 'stock_id': stock_id,
-                'order_id': next_order_id,
+                'order_id': order_id,
                 'is_buy': is_buy,
                 'price': price,
                 'quantity': quantity
             })
             
-            # Add to active orders if we haven't reached the limit
-            if len(active_orders[stock_id]) < config["order_book_depth"]:
-                active_orders[stock_id].append({
-                    'order_id': next_order_id,
-                    'is_buy': is_buy,
-                    'price': price,
-                    'quantity': quantity
-                })
-            
-            next_order_id += 1
-            if next_order_id > 200:
-                next_order_id = 1  # Reset order ID to stay within 8-bit range
+            order = {
+                'order_id': order_id,
+                'is_buy': is_buy,
+                'price': price,
+                'quantity': quantity
+            }
+            
+            # Add to active orders if we haven't reached the limit; orders
+            # beyond it still hold their ID until they are evicted
+            tracked = len(active_orders[stock_id]) < config["order_book_depth"]
+            if tracked:
+                active_orders[stock_id].append(order)
+                mark_active(stock_id)
+            orders_by_id[order_id] = (stock_id, order, tracked)
     
     return packets
 
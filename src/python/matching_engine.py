@@ -0,0 +1,261 @@
+import heapq
+from collections import deque
+
+PRICE_SCALE = 10000  # prices are matched as integer ITCH price units (4 decimals)
+
+# Resting order record, shared by the order index and its price level queue
+ORDER_ID = 0
+STOCK_ID = 1
+IS_BUY = 2
+PRICE_KEY = 3
+REMAINING = 4
+
+class MatchingEngine:
+    """
+    Price-time priority matching engine.
+
+    Each stock side keeps a heap of price levels (negated for bids) and a
+    FIFO deque of resting orders per level, so matching touches only the
+    levels it trades through and resting an order is O(log levels).
+    Cancels only zero the order's record; dead records are skipped and
+    dropped when they reach the front of their level.
+    """
+
+    def __init__(self):
+        """Initialize an empty engine."""
+        self.orders = {}  # order_id -> [order_id, stock_id, is_buy, price_key, remaining]
+        self.levels = {}  # (stock_id, is_buy) -> {price_key: deque of order records}
+        self.heaps = {}  # (stock_id, is_buy) -> heap of price keys (negated for bids)
+        self.fill_count = 0
+        self.filled_quantity = 0
+
+    def submit(self, order_id, stock_id, is_buy, price, quantity, rest=True):
+        """
+        Match an incoming order and rest whatever is left.
+
+        Parameters:
+        - order_id: Identifier of the incoming order (None for orders that never rest)
+        - stock_id: Identifier for the stock
+        - is_buy: True for buy order, False for sell order
+        - price: Limit price (None for a market order)
+        - quantity: Order quantity
+        - rest: Rest the unfilled quantity on the book (False for immediate-or-cancel)
+
+        Returns:
+        - Tuple (fills, remaining quantity). Each fill is a dictionary with
+          stock_id, resting_order_id, order_id (the incoming one), is_buy
+          (the incoming side), price (the resting level's) and quantity
+        """
+        if order_id is not None and order_id in self.orders:
+            self.cancel(order_id)  # a reused ID replaces the order it named
+        limit = None if price is None else round(price * PRICE_SCALE)
+        fills = []
+
+        opposite = (stock_id, not is_buy)
+        heap = self.heaps.get(opposite)
+        if heap:
+            levels = self.levels[opposite]
+            orders = self.orders
+            while quantity > 0 and heap:
+                level_key = heap[0] if is_buy else -heap[0]
+                if limit is not None and (level_key > limit if is_buy else level_key < limit):
+                    break
+                level = levels[level_key]
+                level_price = level_key / PRICE_SCALE
+                while level and quantity > 0:
+                    resting = level[0]
+                    available = resting[REMAINING]
+                    if available <= 0:
+                        level.popleft()  # cancelled while queued
+                        continue
+                    traded = available if available < quantity else quantity
+                    resting[REMAINING] = available - traded
+                    quantity -= traded
+                    fills.append({
+                        'stock_id': stock_id,
+                        'resting_order_id': resting[ORDER_ID],
+                        'order_id': order_id,
+                        'is_buy': is_buy,
+                        'price': level_price,
+                        'quantity': traded
+                    })
+                    if traded == available:
+                        level.popleft()
+                        if orders.get(resting[ORDER_ID]) is resting:
+                            del orders[resting[ORDER_ID]]
+                while level and level[0][REMAINING] <= 0:
+                    level.popleft()
+                if not level:
+                    del levels[level_key]
+                    heapq.heappop(heap)
+
+        if fills:
+            self.fill_count += len(fills)
+            self.filled_quantity += sum(fill['quantity'] for fill in fills)
+        if rest and quantity > 0 and limit is not None and order_id is not None:
+            self._rest(order_id, stock_id, is_buy, limit, quantity)
+        return fills, quantity
+
+    def rest(self, order_id, stock_id, is_buy, price, quantity):
+        """
+        Put an order on the book without matching it, e.g. to seed the
+        engine from a recovered book.
+
+        Parameters:
+        - order_id: Identifier of the order
+        - stock_id: Identifier for the stock
+        - is_buy: True for buy order, False for sell order
+        - price: Limit price
+        - quantity: Order quantity
+        """
+        if order_id in self.orders:
+            self.cancel(order_id)
+        self._rest(order_id, stock_id, is_buy, round(price * PRICE_SCALE), quantity)
+
+    def _rest(self, order_id, stock_id, is_buy, price_key, quantity):
+        side = (stock_id, is_buy)
+        levels = self.levels.get(side)
+        if levels is None:
+            levels = self.levels[side] = {}
+            self.heaps[side] = []
+        level = levels.get(price_key)
+        if level is None:
+            level = levels[price_key] = deque()
+            heapq.heappush(self.heaps[side], -price_key if is_buy else price_key)
+        record = [order_id, stock_id, is_buy, price_key, quantity]
+        level.append(record)
+        self.orders[order_id] = record
+
+    def cancel(self, order_id):
+        """
+        Remove a resting order.
+
+        Parameters:
+        - order_id: Identifier of the order to remove
+
+        Returns:
+        - True if the order was resting, False otherwise
+        """
+        record = self.orders.pop(order_id, None)
+        if record is None:
+            return False
+        record[REMAINING] = 0
+        self._drop_dead(record)
+        return True
+
+    def reduce(self, order_id, quantity):
+        """
+        Take quantity off a resting order without changing its priority.
+
+        Parameters:
+        - order_id: Identifier of the order
+        - quantity: Shares to take off
+
+        Returns:
+        - Remaining quantity (0 once removed), or None if the order is not resting
+        """
+        record = self.orders.get(order_id)
+        if record is None:
+            return None
+        record[REMAINING] -= quantity
+        if record[REMAINING] <= 0:
+            del self.orders[order_id]
+            record[REMAINING] = 0
+            self._drop_dead(record)
+            return 0
+        return record[REMAINING]
+
+    def replace(self, order_id, new_order_id, price, quantity):
+        """
+        Cancel a resting order and submit its replacement on the same stock and side.
+
+        The replacement loses time priority and may trade if it crosses.
+
+        Returns:
+        - Tuple (fills, remaining quantity) as for submit(), or None if the
+          original order is not resting
+        """
+        record = self.orders.get(order_id)
+        if record is None:
+            return None
+        self.cancel(order_id)
+        return self.submit(new_order_id, record[STOCK_ID], record[IS_BUY], price, quantity)
+
+    def _drop_dead(self, record):
+        # Keep the best level free of dead records so best_bid/best_ask stay O(1)
+        side = (record[STOCK_ID], record[IS_BUY])
+        levels = self.levels[side]
+        level = levels.get(record[PRICE_KEY])
+        while level and level[0][REMAINING] <= 0:
+            level.popleft()
+        if level is not None and not level:
+            del levels[record[PRICE_KEY]]
+            heap = self.heaps[side]
+            top = -heap[0] if record[IS_BUY] else heap[0]
+            if top == record[PRICE_KEY]:
+                heapq.heappop(heap)
+            else:
+                # Not the best level: rebuild the heap without it
+                heap.remove(-record[PRICE_KEY] if record[IS_BUY] else record[PRICE_KEY])
+                heapq.heapify(heap)
+
+    def best_bid(self, stock_id):
+        """
+        Get the best bid price.
+
+        Returns:
+        - Price, or None if there are no resting buy orders
+        """
+        heap = self.heaps.get((stock_id, True))
+        return -heap[0] / PRICE_SCALE if heap else None
+
+    def best_ask(self, stock_id):
+        """
+        Get the best ask price.
+
+        Returns:
+        - Price, or None if there are no resting sell orders
+        """
+        heap = self.heaps.get((stock_id, False))
+        return heap[0] / PRICE_SCALE if heap else None
+
+    def depth(self, stock_id, is_buy, levels=5):
+        """
+        Aggregate the best price levels of one side.
+
+        Parameters:
+        - stock_id: Identifier for the stock
+        - is_buy: Side to aggregate
+        - levels: Number of levels
+
+        Returns:
+        - List of (price, total quantity, order count), best first
+        """
+        side = (stock_id, is_buy)
+        book = self.levels.get(side, {})
+        keys = heapq.nsmallest(levels, self.heaps.get(side, []))
+        result = []
+        for key in keys:
+            price_key = -key if is_buy else key
+            live = [record[REMAINING] for record in book[price_key] if record[REMAINING] > 0]
+            result.append((price_key / PRICE_SCALE, sum(live), len(live)))
+        return result
+
+def fill_to_execute_row(fill):
+    """
+    Turn a fill into the EXECUTE row that tells the board about it.
+
+    Parameters:
+    - fill: Fill dictionary returned by MatchingEngine.submit()
+
+    Returns:
+    - Session row dictionary executing the resting order
+    """
+    return {
+        'type': 'EXECUTE',
+        'stock_id': fill['stock_id'],
+        'order_id': fill['resting_order_id'],
+        'is_buy': not fill['is_buy'],
+        'price': fill['price'],
+        'quantity': fill['quantity']
+    }
@@ -0,0 +1,300 @@
+import threading
+import time
+
+NUM_BUCKETS = 40  # log2 ns buckets: 1 ns .. ~550 s
+
+class Histogram:
+    """
+    Latency histogram with power-of-two nanosecond buckets.
+
+    Recording is a bit_length() and a list increment, cheap enough for the
+    TX/RX hot paths.
+    """
+
+    def __init__(self):
+        """Initialize an empty histogram."""
+        self.buckets = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, duration_ns):
+        """
+        Record one duration.
+
+        Parameters:
+        - duration_ns: Duration in nanoseconds
+        """
+        self.buckets[min(duration_ns.bit_length(), NUM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def percentile(self, fraction):
+        """
+        Estimate a percentile (upper bound of the bucket that contains it).
+
+        Parameters:
+        - fraction: Percentile as a fraction (0.99 for p99)
+
+        Returns:
+        - Duration in nanoseconds
+        """
+        if not self.count:
+            return 0
+        target = fraction * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= target:
+                return min(1 << index, self.max_ns) if index else 0
+        return self.max_ns
+
+    def summary(self):
+        """
+        Get a summary of the histogram.
+
+        Returns:
+        - Dictionary with count, mean, p50, p99 and max in nanoseconds
+        """
+        return {
+            'count': self.count,
+            'mean_ns': self.total_ns / self.count if self.count else 0,
+            'p50_ns': self.percentile(0.5),
+            'p99_ns': self.percentile(0.99),
+            'max_ns': self.max_ns,
+        }
+
+class Metrics:
+    """
+    Runtime-toggleable counters, gauges and per-stage timing histograms.
+
+    Typical use on a hot path:
+
+        start = metrics.start()
+        ... work ...
+        metrics.stop('encode', start)
+
+    When disabled, start() returns 0 and stop()/count() return immediately.
+    Counters and histograms are updated without locks; a lost update under
+    contention only skews statistics slightly, which is acceptable here.
+    """
+
+    def __init__(self, enabled=False):
+        """
+        Initialize the registry.
+
+        Parameters:
+        - enabled: Whether recording starts enabled
+        """
+        self.enabled = enabled
+        self.counters = {}  # name -> int
+        self.histograms = {}  # stage name -> Histogram
+        self.gauges = {}  # name -> callable returning a number
+        self.started_at = time.time()
+
+    def set_enabled(self, enabled):
+        """Turn recording on or off at runtime."""
+        self.enabled = enabled
+
+    def start(self):
+        """
+        Get a start timestamp for a timed stage.
+
+        Returns:
+        - perf_counter_ns() when enabled, 0 otherwise
+        """
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def stop(self, stage, start):
+        """
+        Record the duration of a stage started with start().
+
+        Parameters:
+        - stage: Stage name
+        - start: Value returned by start()
+        """
+        if not start:
+            return
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = Histogram()
+        histogram.record(time.perf_counter_ns() - start)
+
+    def count(self, name, amount=1):
+        """
+        Increment a counter.
+
+        Parameters:
+        - name: Counter name
+        - amount: Increment
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def register_gauge(self, name, func):
+        """
+        Register a gauge sampled at export time.
+
+        Parameters:
+        - name: Gauge name
+        - func: Callable returning the current value
+        """
+        self.gauges[name] = func
+
+    def reset(self):
+        """Clear all counters and histograms."""
+        self.counters = {}
+        self.histograms = {}
+        self.started_at = time.time()
+
+    def snapshot(self):
+        """
+        Take a JSON-serializable snapshot of all metrics.
+
+        Returns:
+        - Dictionary with counters, gauges and stage summaries
+        """
+        gauges = {}
+        for name, func in list(self.gauges.items()):
+            try:
+                gauges[name] = func()
+            except Exception:
+                gauges[name] = None
+        return {
+            'timestamp': time.time(),
+            'uptime_s': time.time() - self.started_at,
+            'enabled': self.enabled,
+            'counters': dict(self.counters),
+            'gauges': gauges,
+            'stages': {name: histogram.summary() for name, histogram in list(self.histograms.items())},
+        }
+
+    def to_prometheus(self, prefix='hft_sim'):
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Parameters:
+        - prefix: Metric name prefix
+
+        Returns:
+        - String in Prometheus text format
+        """
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        for name, value in sorted(self.snapshot()['gauges'].items()):
+            if value is None:
+                continue
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        metric = f"{prefix}_stage_duration_seconds"
+        if self.histograms:
+            lines.append(f"# TYPE {metric} histogram")
+        for stage, histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for index, bucket in enumerate(histogram.buckets):
+                cumulative += bucket
+                if bucket or index == NUM_BUCKETS - 1:
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="{(1 << index) / 1e9:.9g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {histogram.total_ns / 1e9:.9f}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+class MetricsServer:
+    """
+    Local HTTP endpoint serving /metrics (Prometheus text) and /metrics.json.
+    """
+
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        """
+        Start serving in a daemon thread.
+
+        Parameters:
+        - metrics: Metrics registry to export
+        - port: TCP port to listen on
+        - host: Interface to bind (localhost by default)
+        """
+        # Imported here: http.server dominates this module's import time
+        import json
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics.json'):
+                    body = json.dumps(registry.snapshot()).encode()
+                    content_type = 'application/json'
+                elif self.path.startswith('/metrics'):
+                    body = registry.to_prometheus().encode()
+                    content_type = 'text/plain; version=0.0.4'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # keep the console quiet
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-http")
+        self.thread.daemon = True
+        self.thread.start()
+
+    @property
+    def port(self):
+        """Port the server is bound to (useful when started with port 0)."""
+        return self.server.server_address[1]
+
+    def close(self):
+        """Stop the server."""
+        self.server.shutdown()
+        self.server.server_close()
+
+class MetricsDumper:
+    """
+    Periodically appends metrics snapshots as JSON lines to a file.
+    """
+
+    def __init__(self, metrics, filename, interval=5.0):
+        """
+        Start dumping in a daemon thread.
+
+        Parameters:
+        - metrics: Metrics registry to dump
+        - filename: Output file (JSON lines, appended)
+        - interval: Seconds between dumps
+        """
+        self.metrics = metrics
+        self.filename = filename
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-dump")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        """Append one snapshot to the output file."""
+        import json
+
+        with open(self.filename, 'a') as f:
+            f.write(json.dumps(self.metrics.snapshot()) + "\n")
+
+    def close(self):
+        """Stop dumping."""
+        self.stopped.set()
+
+# Process-wide registry used by the simulator
+METRICS = Metrics()
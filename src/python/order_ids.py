@@ -0,0 +1,247 @@
+from collections import OrderedDict, deque
+
+from session_columns import SessionColumns, TYPE_CODES
+
+MIN_ORDER_ID = 1
+MAX_ORDER_ID = 255  # `ORDER_INDEX 7 in constants.v -> 8-bit order IDs on the board
+
+class OrderIdAllocator:
+    """
+    Hands out the board's order IDs so that no two resting orders share one.
+
+    Free IDs sit in a FIFO queue, so an ID that was just released is reused
+    last, and live IDs are kept in allocation order with their stock and
+    side. Allocating, releasing and finding the oldest live order are all
+    O(1). When every ID is live, allocate() returns None: the caller either
+    holds the order back or calls evict() to cancel the oldest one.
+    """
+
+    def __init__(self, min_id=MIN_ORDER_ID, max_id=MAX_ORDER_ID):
+        """
+        Initialize an allocator with every ID free.
+
+        Parameters:
+        - min_id: Lowest ID handed out
+        - max_id: Highest ID handed out
+        """
+        self.capacity = max_id - min_id + 1
+        self.free = deque(range(min_id, max_id + 1))
+        self.live = OrderedDict()  # order_id -> (stock_id, is_buy), oldest first
+        self.live_by_side = {}  # (stock_id, is_buy) -> set of live order IDs
+        self.evictions = 0
+        self.refusals = 0  # allocate() calls that found no free ID
+
+    def __len__(self):
+        return len(self.live)
+
+    def __contains__(self, order_id):
+        return order_id in self.live
+
+    @property
+    def full(self):
+        """True when every ID is live."""
+        return not self.free
+
+    def allocate(self, stock_id, is_buy):
+        """
+        Take a free ID for a new order.
+
+        Parameters:
+        - stock_id: Identifier for the stock
+        - is_buy: True for buy order, False for sell order
+
+        Returns:
+        - Order ID, or None when every ID is live
+        """
+        if not self.free:
+            self.refusals += 1
+            return None
+        order_id = self.free.popleft()
+        self.live[order_id] = (stock_id, is_buy)
+        side = self.live_by_side.get((stock_id, is_buy))
+        if side is None:
+            side = self.live_by_side[(stock_id, is_buy)] = set()
+        side.add(order_id)
+        return order_id
+
+    def release(self, order_id):
+        """
+        Return the ID of an order that left the book.
+
+        Parameters:
+        - order_id: ID to release
+
+        Returns:
+        - True if the ID was live, False otherwise
+        """
+        owner = self.live.pop(order_id, None)
+        if owner is None:
+            return False
+        self.live_by_side[owner].discard(order_id)
+        self.free.append(order_id)
+        return True
+
+    def oldest(self):
+        """
+        Get the order that has been live the longest.
+
+        Returns:
+        - Tuple (order_id, stock_id, is_buy), or None if nothing is live
+        """
+        if not self.live:
+            return None
+        order_id = next(iter(self.live))
+        stock_id, is_buy = self.live[order_id]
+        return order_id, stock_id, is_buy
+
+    def evict(self):
+        """
+        Release the oldest live ID; the caller cancels its order.
+
+        Returns:
+        - Tuple (order_id, stock_id, is_buy) of the evicted order, or None
+          if nothing is live
+        """
+        oldest = self.oldest()
+        if oldest is not None:
+            self.release(oldest[0])
+            self.evictions += 1
+        return oldest
+
+    def live_ids(self, stock_id, is_buy):
+        """
+        Get the live IDs of one stock side.
+
+        Returns:
+        - Set of order IDs (do not modify)
+        """
+        return self.live_by_side.get((stock_id, is_buy), set())
+
+def session_ids_valid(session, min_id=MIN_ORDER_ID, max_id=MAX_ORDER_ID):
+    """
+    Check that a session only uses in-range IDs and never reuses a live one.
+
+    Parameters:
+    - session: SessionColumns
+    - min_id, max_id: Range of IDs the board accepts
+
+    Returns:
+    - True if the session can be sent as it is
+    """
+    types = session.types
+    order_ids = session.order_ids
+    quantities = session.quantities
+    new_order_ids = session.new_order_ids
+    add, replace, execute = TYPE_CODES['ADD'], TYPE_CODES['REPLACE'], TYPE_CODES['EXECUTE']
+    live = {}  # order_id -> remaining quantity
+    for index in range(len(types)):
+        code = types[index]
+        order_id = order_ids[index]
+        if code == add:
+            if order_id in live or not min_id <= order_id <= max_id:
+                return False
+            live[order_id] = quantities[index]
+            continue
+        remaining = live.get(order_id)
+        if remaining is None:
+            return False  # the board could apply it to an unrelated order
+        if code == execute:
+            remaining -= max(quantities[index], 0)
+            if remaining > 0:
+                live[order_id] = remaining
+                continue
+        del live[order_id]
+        if code == replace:
+            new_order_id = new_order_ids[index]
+            if new_order_id in live or not min_id <= new_order_id <= max_id:
+                return False
+            live[new_order_id] = quantities[index]
+    return True
+
+def remap_session_ids(session, allocator=None):
+    """
+    Rewrite a session's order IDs into the board's ID space.
+
+    IDs are handed out by an OrderIdAllocator as orders are added and
+    released as they leave the book, so the result never has two live
+    orders under one ID whatever IDs the source used. When the space runs
+    out, the oldest live order is cancelled first. An ADD reusing a live
+    source ID cancels the order that held it, and rows naming no live
+    order are dropped.
+
+    Parameters:
+    - session: SessionColumns
+    - allocator: OrderIdAllocator to use (a fresh full-range one by default)
+
+    Returns:
+    - Tuple (SessionColumns, dictionary of evicted, reused and dropped row
+      counts); the input session itself when session_ids_valid() holds
+    """
+    stats = {'evicted': 0, 'reused': 0, 'dropped': 0}
+    if allocator is None:
+        if session_ids_valid(session):
+            return session, stats
+        allocator = OrderIdAllocator()
+
+    result = SessionColumns()
+    append = result.append
+    board_ids = {}  # source order_id -> board order_id
+    source_ids = {}  # board order_id -> [source order_id, price, remaining quantity]
+
+    def cancel(board_id, stock_id, is_buy):
+        _, price, remaining = source_ids.pop(board_id)
+        append({'type': 'CANCEL', 'stock_id': stock_id, 'order_id': board_id, 'is_buy': is_buy,
+                'price': price, 'quantity': remaining})
+
+    def add(source_id, stock_id, is_buy, price, quantity):
+        previous = board_ids.pop(source_id, None)
+        if previous is not None:
+            previous_stock, previous_side = allocator.live[previous]
+            allocator.release(previous)
+            cancel(previous, previous_stock, previous_side)
+            stats['reused'] += 1
+        board_id = allocator.allocate(stock_id, is_buy)
+        if board_id is None:
+            evicted, evicted_stock, evicted_side = allocator.evict()
+            del board_ids[source_ids[evicted][0]]
+            cancel(evicted, evicted_stock, evicted_side)
+            stats['evicted'] += 1
+            board_id = allocator.allocate(stock_id, is_buy)
+        board_ids[source_id] = board_id
+        source_ids[board_id] = [source_id, price, quantity]
+        return board_id
+
+    for row in session:
+        row_type = row['type']
+        if row_type == 'ADD':
+            row['order_id'] = add(row['order_id'], row['stock_id'], row['is_buy'], row['price'], row['quantity'])
+            append(row)
+            continue
+
+        board_id = board_ids.get(row['order_id'])
+        if board_id is None:
+            stats['dropped'] += 1
+            continue
+        row['order_id'] = board_id
+        record = source_ids[board_id]
+        if row_type == 'EXECUTE':
+            record[2] = (record[2] or 0) - (row['quantity'] or 0)
+            append(row)
+            if record[2] > 0:
+                continue
+        elif row_type == 'REPLACE':
+            # Both IDs are on the wire at once, so take the new one first
+            owner = allocator.live[board_id]
+            row['new_order_id'] = add(row['new_order_id'], owner[0], owner[1], row['price'], row['quantity'])
+            if source_ids.get(board_id) is not record:
+                # Cancelled to make room for (or by) its own replacement: send that as an ADD
+                row.update(type='ADD', order_id=row.pop('new_order_id'))
+                append(row)
+                continue
+            append(row)
+        else:
+            append(row)
+        del board_ids[record[0]]
+        del source_ids[board_id]
+        allocator.release(board_id)
+    return result, stats
@@ -1,11 +1,18 @@
 import random
-from datetime import datetime
+
+from itch_clock import nanoseconds_since_midnight
+from itch_codec import BOARD, board_price
+from symbol_table import format_symbol, default_symbol
 
 # Message types
 MSG_ADD_ORDER = 0x82
 MSG_CANCEL_ORDER = 0xA1
+MSG_EXECUTE_ORDER = BOARD.codec('E').type_byte
+MSG_EXECUTE_WITH_PRICE = BOARD.codec('C').type_byte
+MSG_DELETE_ORDER = BOARD.codec('D').type_byte
+MSG_REPLACE_ORDER = BOARD.codec('U').type_byte
 
-def create_add_order_packet(stock_id, order_id, price, quantity, is_buy):
+def create_add_order_packet(stock_id, order_id, price, quantity, is_buy, symbol=None):
     """
     Create an ADD_ORDER packet according to the specification.
     
@@ -15,6 +22,7 @@ def create_add_order_packet(stock_id, order_id, price, quantity, is_buy):
     - price: Order price (0-255.xx)
     - quantity: Order quantity (1-255)
     - is_buy: True for buy, False for sell
+    - symbol: Optional stock symbol (defaults to STOCKnn)
     
     Returns:
     - Bytearray containing the formatted packet
@@ -40,10 +48,7 @@ def create_add_order_packet(stock_id, order_id, price, quantity, is_buy):
     packet.extend(random.randint(0, 65535).to_bytes(2, byteorder='little'))
     
     # Timestamp (6 bytes) - Nanoseconds since midnight
-    now = datetime.now()
-    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    nanoseconds = int((now - midnight).total_seconds() * 1_000_000_000)
-    packet.extend(nanoseconds.to_bytes(6, byteorder='little'))
+    packet.extend(nanoseconds_since_midnight().to_bytes(6, byteorder='little'))
     
     # Order Reference Number (8 bytes)
     packet.extend(order_id.to_bytes(8, byteorder='little'))
@@ -55,10 +60,7 @@ def create_add_order_packet(stock_id, order_id, price, quantity, is_buy):
     packet.extend(quantity.to_bytes(4, byteorder='little'))
     
     # Stock (8 bytes) - Stock symbol padded with spaces
-    stock_symbol = f"STOCK{stock_id:02d}"
-    stock_bytes = stock_symbol.encode('ascii')
-    stock_bytes = stock_bytes + b' ' * (8 - len(stock_bytes))
-    packet.extend(stock_bytes)
+    packet.extend(format_symbol(symbol) if symbol is not None else default_symbol(stock_id))
     
     # Price (4 bytes) - Only using last 2 bytes as specified
     packet.extend(bytes([price_frac,price_int , 6, 6]))
@@ -94,10 +96,7 @@ def create_cancel_order_packet(stock_id, order_id, quantity):
     packet.extend(random.randint(0, 65535).to_bytes(2, byteorder='little'))
     
     # Timestamp (6 bytes) - Nanoseconds since midnight
-    now = datetime.now()
-    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    nanoseconds = int((now - midnight).total_seconds() * 1_000_000_000)
-    packet.extend(nanoseconds.to_bytes(6, byteorder='little'))
+    packet.extend(nanoseconds_since_midnight().to_bytes(6, byteorder='little'))
     
     # Order Reference Number (8 bytes)
     packet.extend(order_id.to_bytes(8, byteorder='little'))
@@ -106,6 +105,103 @@ def create_cancel_order_packet(stock_id, order_id, quantity):
     packet.extend(quantity.to_bytes(4, byteorder='little'))
     
     return packet
+
+def create_execute_order_packet(stock_id, order_id, quantity):
+    """
+    Create an EXECUTE_ORDER packet (ITCH 'E', board opcode 0x2A).
+    
+    The board frame has the same layout as CANCEL_ORDER; the match number is
+    not sent because parser_top stops consuming after the executed shares.
+    
+    Parameters:
+    - stock_id: Stock identifier (1-255)
+    - order_id: Order reference number (1-255)
+    - quantity: Executed quantity (1-255)
+    
+    Returns:
+    - Bytes containing the formatted packet
+    """
+    return BOARD.encode('E', stock_id, random.randint(0, 65535), nanoseconds_since_midnight(),
+                        order_id, quantity)
+
+def create_execute_with_price_packet(stock_id, order_id, quantity, price, match_number=0, printable=True):
+    """
+    Create an EXECUTE_WITH_PRICE packet (ITCH 'C', board opcode 0xC2).
+    
+    Parameters:
+    - stock_id: Stock identifier (1-255)
+    - order_id: Order reference number (1-255)
+    - quantity: Executed quantity (1-255)
+    - price: Execution price (0-255.xx)
+    - match_number: Match number of the execution
+    - printable: Whether the execution is printable
+    
+    Returns:
+    - Bytes containing the formatted packet
+    """
+    return BOARD.encode('C', stock_id, random.randint(0, 65535), nanoseconds_since_midnight(),
+                        order_id, quantity, match_number, b'Y' if printable else b'N', board_price(price))
+
+def create_delete_order_packet(stock_id, order_id):
+    """
+    Create a DELETE_ORDER packet (ITCH 'D', board opcode 0x22).
+    
+    Parameters:
+    - stock_id: Stock identifier (1-255)
+    - order_id: Order reference number (1-255)
+    
+    Returns:
+    - Bytes containing the formatted packet
+    """
+    return BOARD.encode('D', stock_id, random.randint(0, 65535), nanoseconds_since_midnight(), order_id)
+
+def create_replace_order_packet(stock_id, order_id, new_order_id, price, quantity):
+    """
+    Create a REPLACE_ORDER packet (ITCH 'U', board opcode 0xAA).
+    
+    Parameters:
+    - stock_id: Stock identifier (1-255)
+    - order_id: Reference number of the order being replaced (1-255)
+    - new_order_id: Reference number of the replacement order (1-255)
+    - price: New price (0-255.xx)
+    - quantity: New quantity (1-255)
+    
+    Returns:
+    - Bytes containing the formatted packet
+    """
+    return BOARD.encode('U', stock_id, random.randint(0, 65535), nanoseconds_since_midnight(),
+                        order_id, new_order_id, quantity, board_price(price))
+
+def create_packet(packet_data, symbol=None):
+    """
+    Encode a market data row (as produced by the generators / CSV loader).
+    
+    Parameters:
+    - packet_data: Dictionary with 'type' (ADD, CANCEL, EXECUTE, DELETE or
+      REPLACE) and the fields that message type needs
+    - symbol: Optional stock symbol for ADD orders
+    
+    Returns:
+    - Bytes/bytearray containing the formatted packet
+    """
+    packet_type = packet_data['type']
+    quantity = packet_data.get('quantity')
+    quantity = quantity if quantity is not None else 0
+    
+    if packet_type == 'ADD':
+        return create_add_order_packet(packet_data['stock_id'], packet_data['order_id'],
+                                       packet_data['price'], quantity, packet_data['is_buy'], symbol)
+    if packet_type == 'CANCEL':
+        return create_cancel_order_packet(packet_data['stock_id'], packet_data['order_id'], quantity)
+    if packet_type == 'EXECUTE':
+        return create_execute_order_packet(packet_data['stock_id'], packet_data['order_id'], quantity)
+    if packet_type == 'DELETE':
+        return create_delete_order_packet(packet_data['stock_id'], packet_data['order_id'])
+    if packet_type == 'REPLACE':
+        return create_replace_order_packet(packet_data['stock_id'], packet_data['order_id'],
+                                           packet_data['new_order_id'], packet_data['price'], quantity)
+    raise ValueError(f"Unsupported packet type {packet_type!r}")
+
 '''
 def parse_fpga_response_packet(packet):
     """
@@ -239,6 +335,37 @@ def parse_fpga_response_packet(packet):
         print(f"Error parsing FPGA packet: {str(e)}")
         return None
 
+def split_response_packets(buffer):
+    """
+    Remove every complete FPGA response packet from a receive buffer.
+    
+    Packets are length prefixed; a zero length byte can never complete a
+    packet, so it is dropped to resynchronise. An incomplete packet is left
+    in the buffer for the next read.
+    
+    Parameters:
+    - buffer: bytearray of received bytes, consumed in place
+    
+    Returns:
+    - Tuple (list of packet bytearrays, number of zero length bytes dropped)
+    """
+    packets = []
+    dropped = 0
+    offset = 0
+    end = len(buffer)
+    while offset < end:
+        packet_length = buffer[offset]
+        if packet_length == 0:
+            offset += 1
+            dropped += 1
+            continue
+        if end - offset < packet_length:
+            break  # Wait for more data
+        packets.append(buffer[offset:offset + packet_length])
+        offset += packet_length
+    del buffer[:offset]
+    return packets, dropped
+
 def packet_to_hex_string(packet):
     """
     Convert a packet to a readable hex string.
@@ -0,0 +1,178 @@
+import struct
+import threading
+import time
+from collections import deque
+
+from book_service import ShmRing
+
+# Sample ring records: op, stock_id, time.time(), three values (40 bytes)
+SAMPLE = struct.Struct('<BxxxIdddd')
+
+SAMPLE_RECEIVED = 1  # price, quantity
+SAMPLE_HIGHEST = 2  # highest order price
+SAMPLE_PNL = 3  # mark-to-market PnL, realized PnL, drawdown
+SAMPLE_CLEAR = 4
+
+PNL_POINTS = 10000  # PnL points kept by the plot process
+
+def _plot_main(ring_name, max_points, symbol_table, history_args, redraw_interval, poll_interval):
+    # Runs in the plot process: drain the ring into a RealTimePlotter in a window
+    # of its own, redrawing the stocks that changed at most every redraw_interval
+    import tkinter as tk
+    from real_time_plotter import RealTimePlotter
+    from soak import buffer_factory
+
+    ring = ShmRing(name=ring_name, record=SAMPLE)
+    root = tk.Tk()
+    root.title("HFT Exchange Simulator - Real-time Plots")
+    root.geometry("1000x700")
+    history = buffer_factory(*history_args) if history_args else None
+    plotter = RealTimePlotter(root, max_points=max_points, symbol_table=symbol_table, history=history)
+    pnl = {name: deque(maxlen=PNL_POINTS) for name in ('time', 'pnl', 'realized', 'drawdown')}
+    state = {'dirty': set(), 'pnl_dirty': False, 'drawn': 0.0}
+
+    def poll():
+        if ring.stop_requested():
+            root.destroy()
+            return
+        samples = ring.peek_batch()
+        dirty = state['dirty']
+        for op, stock_id, timestamp, first, second, third in samples:
+            if op == SAMPLE_RECEIVED:
+                plotter.add_data_point(stock_id, first, int(second), timestamp=timestamp, redraw=False)
+                dirty.add(stock_id)
+            elif op == SAMPLE_HIGHEST:
+                plotter.add_highest_order_price(stock_id, first, timestamp=timestamp, redraw=False)
+                dirty.add(stock_id)
+            elif op == SAMPLE_PNL:
+                for name, value in zip(('time', 'pnl', 'realized', 'drawdown'), (timestamp, first, second, third)):
+                    pnl[name].append(value)
+                state['pnl_dirty'] = True
+            elif op == SAMPLE_CLEAR:
+                plotter.clear_plots()
+                dirty.clear()
+                for points in pnl.values():
+                    points.clear()
+        ring.consume(len(samples))
+        now = time.perf_counter()
+        if now - state['drawn'] >= redraw_interval and (dirty or state['pnl_dirty']):
+            state['drawn'] = now
+            for stock_id in dirty:
+                if stock_id in plotter.initialized_stocks:
+                    plotter.update_plot(stock_id)
+            dirty.clear()
+            if state['pnl_dirty']:
+                plotter.plot_pnl(pnl)
+                state['pnl_dirty'] = False
+        # Keep draining while samples arrive, poll slowly when idle
+        root.after(1 if samples else poll_interval, poll)
+
+    root.after(0, poll)
+    try:
+        root.mainloop()
+    finally:
+        ring.close()
+
+class PlotProcess:
+    """
+    Real-time plots rendered by a separate process.
+
+    Stands in for LazyPlotter: the simulator threads only pack samples into
+    a shared-memory ring (ShmRing with SAMPLE records), and a plot process
+    with its own Tk window and matplotlib drains the ring and redraws the
+    stocks that changed a few times per second. A slow redraw therefore
+    never holds up the TX or RX threads, and matplotlib is only touched
+    from the plot process's main thread.
+
+    The ring is single-producer, so pushes from the TX and UI threads take
+    a lock that is never held across anything but a record write. When the
+    plot process falls behind and the ring is full, samples are dropped
+    (and counted) rather than waited for.
+    """
+
+    def __init__(self, max_points=100, symbol_table=None, capacity=65536, history_args=None,
+                 redraw_interval=0.25, poll_interval=20):
+        """
+        Start the plot process.
+
+        Parameters:
+        - max_points: Passed on to RealTimePlotter
+        - symbol_table: Passed on to RealTimePlotter (pickled to the plot process)
+        - capacity: Sample slots in the ring
+        - history_args: Arguments of soak.buffer_factory for bounded plot series
+          (None keeps every point)
+        - redraw_interval: Seconds between redraws of a changing stock
+        - poll_interval: Milliseconds between ring polls while idle
+        """
+        self.ring = ShmRing(capacity, record=SAMPLE)
+        self.lock = threading.Lock()
+        self.dropped = 0  # samples lost to a full ring
+        self.last_pnl_time = None  # time of the last PnL point pushed
+
+        import multiprocessing
+
+        context = multiprocessing.get_context('spawn')
+        self.process = context.Process(target=_plot_main,
+                                       args=(self.ring.name, max_points, symbol_table, history_args,
+                                             redraw_interval, poll_interval),
+                                       name="plotter")
+        self.process.daemon = True
+        self.process.start()
+
+    def _push(self, op, stock_id=0, timestamp=0.0, first=0.0, second=0.0, third=0.0):
+        with self.lock:
+            if not self.ring.push(op, stock_id, timestamp, first, second, third):
+                self.dropped += 1
+
+    def add_data_point(self, stock_id, price, quantity):
+        """Add a received data point (see RealTimePlotter.add_data_point)."""
+        self._push(SAMPLE_RECEIVED, stock_id, time.time(), price, quantity)
+
+    def add_highest_order_price(self, stock_id, highest_price):
+        """Add a highest order price point (see RealTimePlotter.add_highest_order_price)."""
+        self._push(SAMPLE_HIGHEST, stock_id, time.time(), highest_price)
+
+    def plot_pnl(self, series):
+        """
+        Send the PnL points added since the last call.
+
+        Parameters:
+        - series: PnLTracker.series (deques of time, pnl, realized and drawdown)
+        """
+        times = series['time']
+        new = 0
+        while new < len(times) and (self.last_pnl_time is None or times[-1 - new] > self.last_pnl_time):
+            new += 1
+        if not new:
+            return
+        for index in range(len(times) - new, len(times)):
+            self._push(SAMPLE_PNL, 0, times[index], series['pnl'][index], series['realized'][index],
+                       series['drawdown'][index])
+        self.last_pnl_time = times[-1]
+
+    def clear_plots(self):
+        """Drop all plotted data."""
+        self.last_pnl_time = None
+        self._push(SAMPLE_CLEAR)
+
+    def point_count(self):
+        """
+        Count the samples not drawn yet (the points themselves live in the plot process).
+
+        Returns:
+        - Samples waiting in the ring
+        """
+        return self.ring.pending()
+
+    @property
+    def alive(self):
+        """Whether the plot window is still open."""
+        return self.process.is_alive()
+
+    def close(self):
+        """Close the plot window and free the ring."""
+        self.ring.request_stop()
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.ring.close(unlink=True)
@@ -0,0 +1,230 @@
+import threading
+import time
+from collections import deque
+
+FILL_MODELS = ('immediate', 'touch')
+ENGINE_FILLS = 'engine'  # fills come from the matching engine through on_fill()
+
+class PnLTracker:
+    """
+    Streaming position and PnL accountant for the board's trading decisions.
+
+    Each FPGA response is treated as an order. The fill model decides how
+    much of it trades and at what price (the matching engine can report
+    its fills directly instead). Positions are marked to market at the
+    host book's mid price.
+
+    Every fill and every mark change adjusts the running totals by its own
+    delta, so updates cost O(1) however many stocks are held. Totals are
+    appended to bounded time series for the plotter and the capture
+    analyzer. Updates may come from the RX and TX threads, so they take a
+    lock.
+    """
+
+    def __init__(self, fill_model='immediate', max_points=10000):
+        """
+        Initialize a flat account.
+
+        Parameters:
+        - fill_model: 'immediate' fills every response in full at its own
+          price; 'touch' fills only responses that cross the book's best
+          opposite price, at that price, up to its quantity; ENGINE_FILLS
+          when the matching engine reports the fills
+        - max_points: Length of the kept time series
+        """
+        if fill_model not in FILL_MODELS and fill_model != ENGINE_FILLS:
+            raise ValueError(f"Unknown fill model {fill_model!r} (expected one of {', '.join(FILL_MODELS)})")
+        self.fill_model = fill_model
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.positions = {}  # stock_id -> [position, average cost, realized PnL, mark price]
+        self.realized = 0.0
+        self.equity = 0.0  # realized + unrealized PnL over all stocks
+        self.peak = 0.0
+        self.drawdown = 0.0
+        self.max_drawdown = 0.0
+        self.responses = 0
+        self.fills = 0
+        self.volume = 0
+        self.updates = 0  # number of recorded PnL changes
+        self.series = {
+            'time': deque(maxlen=max_points),
+            'pnl': deque(maxlen=max_points),
+            'realized': deque(maxlen=max_points),
+            'drawdown': deque(maxlen=max_points)
+        }
+
+    def on_response(self, response, book):
+        """
+        Apply the fill model to one FPGA response.
+
+        Parameters:
+        - response: Parsed response dictionary (stock_id, is_buy, quantity, price)
+        - book: StockBook (or BookService) supplying best prices
+
+        Returns:
+        - Filled quantity
+        """
+        quantity = int(response['quantity'])
+        self.responses += 1
+        if quantity <= 0:
+            return 0
+        stock_id = response['stock_id']
+        price = response['price']
+        if self.fill_model == 'touch':
+            best = book.get_lowest_sell(stock_id) if response['is_buy'] else book.get_highest_buy(stock_id)
+            if best is None:
+                return 0
+            if price < best['price'] if response['is_buy'] else price > best['price']:
+                return 0
+            price = best['price']
+            quantity = min(quantity, best['quantity'])
+        self.on_fill(stock_id, response['is_buy'], price, quantity, mark_price(book, stock_id))
+        return quantity
+
+    def on_fill(self, stock_id, is_buy, price, quantity, mark=None):
+        """
+        Book a fill of the strategy's order.
+
+        Parameters:
+        - stock_id: Identifier for the stock
+        - is_buy: True if the strategy bought
+        - price: Fill price
+        - quantity: Filled quantity
+        - mark: Current mark price (defaults to the last mark, or the fill price)
+        """
+        signed = quantity if is_buy else -quantity
+        with self.lock:
+            state = self.positions.get(stock_id)
+            if state is None:
+                state = self.positions[stock_id] = [0, 0.0, 0.0, price]
+            position, average, realized, old_mark = state
+            new_mark = mark if mark is not None else old_mark
+
+            # Realize against the average cost when the fill reduces the position
+            closing = 0
+            if position and (position > 0) != (signed > 0):
+                closing = min(abs(position), quantity)
+                pnl = closing * (price - average) * (1 if position > 0 else -1)
+                state[2] = realized + pnl
+                self.realized += pnl
+            new_position = position + signed
+            if new_position == 0:
+                state[1] = 0.0
+            elif position == 0 or (position > 0) != (new_position > 0):
+                state[1] = price  # opened or flipped: the remainder was bought at this price
+            elif closing == 0:
+                state[1] = (average * abs(position) + price * quantity) / abs(new_position)
+            state[0] = new_position
+            state[3] = new_mark
+
+            # Equity = realized + position * (mark - average); apply this stock's change
+            self.equity += (state[2] + new_position * (new_mark - state[1])) - \
+                (realized + position * (old_mark - average))
+            self.fills += 1
+            self.volume += quantity
+            self._record()
+
+    def mark(self, stock_id, price):
+        """
+        Re-mark a stock's position.
+
+        Parameters:
+        - stock_id: Identifier for the stock
+        - price: New mark price (None leaves the mark unchanged)
+        """
+        if price is None or stock_id not in self.positions:
+            return
+        with self.lock:
+            state = self.positions[stock_id]
+            if price == state[3]:
+                return
+            self.equity += state[0] * (price - state[3])
+            state[3] = price
+            if state[0]:
+                self._record()
+
+    def mark_from_book(self, stock_id, book):
+        """Re-mark a stock at the book's mid price (no-op for stocks never traded)."""
+        if stock_id in self.positions:
+            self.mark(stock_id, mark_price(book, stock_id))
+
+    def _record(self):
+        if self.equity > self.peak:
+            self.peak = self.equity
+        self.drawdown = self.peak - self.equity
+        if self.drawdown > self.max_drawdown:
+            self.max_drawdown = self.drawdown
+        self.updates += 1
+        series = self.series
+        series['time'].append(time.perf_counter() - self.start_time)
+        series['pnl'].append(self.equity)
+        series['realized'].append(self.realized)
+        series['drawdown'].append(self.drawdown)
+
+    def snapshot(self):
+        """
+        Get the account state.
+
+        Returns:
+        - Dictionary with totals and a per-stock breakdown
+        """
+        with self.lock:
+            stocks = {stock_id: {
+                'position': position,
+                'average_price': average,
+                'realized': realized,
+                'unrealized': position * (mark - average),
+                'mark': mark
+            } for stock_id, (position, average, realized, mark) in self.positions.items()}
+            return {
+                'fill_model': self.fill_model,
+                'responses': self.responses,
+                'fills': self.fills,
+                'volume': self.volume,
+                'pnl': self.equity,
+                'realized': self.realized,
+                'unrealized': self.equity - self.realized,
+                'drawdown': self.drawdown,
+                'max_drawdown': self.max_drawdown,
+                'stocks': stocks
+            }
+
+    def summary_lines(self):
+        """
+        Format the account state for the stats tab and command line tools.
+
+        Returns:
+        - List of strings
+        """
+        snapshot = self.snapshot()
+        lines = [f"PnL ({snapshot['fill_model']} fills): {snapshot['pnl']:.2f} "
+                 f"(realized {snapshot['realized']:.2f}, unrealized {snapshot['unrealized']:.2f})",
+                 f"  drawdown {snapshot['drawdown']:.2f}, max drawdown {snapshot['max_drawdown']:.2f}, "
+                 f"{snapshot['fills']} fills / {snapshot['responses']} responses, volume {snapshot['volume']}"]
+        for stock_id, stock in sorted(snapshot['stocks'].items()):
+            lines.append(f"  Stock {stock_id}: position {stock['position']:+d} @ {stock['average_price']:.2f}, "
+                         f"mark {stock['mark']:.2f}, PnL {stock['realized'] + stock['unrealized']:.2f}")
+        return lines
+
+def mark_price(book, stock_id):
+    """
+    Get the price a position is marked at: the mid when both sides are
+    quoted, otherwise the one quoted side.
+
+    Parameters:
+    - book: StockBook (or BookService)
+    - stock_id: Identifier for the stock
+
+    Returns:
+    - Mark price, or None if the book is empty
+    """
+    best_buy = book.get_highest_buy(stock_id)
+    best_sell = book.get_lowest_sell(stock_id)
+    if best_buy and best_sell:
+        return (best_buy['price'] + best_sell['price']) / 2
+    if best_buy:
+        return best_buy['price']
+    if best_sell:
+        return best_sell['price']
+    return None
@@ -0,0 +1,237 @@
+import json
+import os
+import sys
+import threading
+import time
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler over every thread of the process.
+
+    A daemon thread wakes every interval seconds, walks the stack of each
+    other thread (sys._current_frames()) and counts the stack. Stacks are
+    kept as tuples of code objects and only turned into names on export,
+    so a sample costs a dictionary lookup per thread plus the frame walk.
+    Blocked threads are sampled too (a TX thread waiting in time.sleep or
+    a serial write shows up there), which is what tells stalls apart from
+    busy loops.
+
+    Aggregated stacks are exported as collapsed stacks (flamegraph.pl,
+    speedscope, inferno) or as a speedscope JSON file with one profile per
+    thread.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        """
+        Initialize a stopped profiler.
+
+        Parameters:
+        - interval: Seconds between samples
+        - max_depth: Most frames kept per stack (innermost first)
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = threading.Event()
+        self.reset()
+
+    def reset(self):
+        """Drop all samples taken so far."""
+        with self.lock:
+            self.stacks = {}  # (thread name, code objects root first) -> samples
+            self.samples = 0  # sampling ticks
+            self.elapsed = 0.0  # seconds covered by the ticks
+
+    @property
+    def running(self):
+        """Whether the sampler thread is running."""
+        return self.thread is not None
+
+    def start(self):
+        """Start sampling (no-op when already running)."""
+        if self.thread is not None:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name="profiler")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling; the samples are kept until reset()."""
+        if self.thread is None:
+            return
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        max_depth = self.max_depth
+        names = {}
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            now = time.perf_counter()
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            with self.lock:
+                stacks = self.stacks
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    codes = []
+                    while frame is not None and len(codes) < max_depth:
+                        codes.append(frame.f_code)
+                        frame = frame.f_back
+                    codes.reverse()
+                    key = (names.get(ident, str(ident)), tuple(codes))
+                    stacks[key] = stacks.get(key, 0) + 1
+                self.samples += 1
+                self.elapsed += now - last
+            last = now
+            del frames
+
+    @staticmethod
+    def _label(code):
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def collapsed(self):
+        """
+        Get the aggregated stacks in collapsed-stack form.
+
+        Returns:
+        - List of "thread;outer;...;inner count" lines, most sampled first
+        """
+        with self.lock:
+            stacks = sorted(self.stacks.items(), key=lambda item: -item[1])
+        labels = {}
+        lines = []
+        for (thread_name, codes), count in stacks:
+            frames = [thread_name]
+            for code in codes:
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = self._label(code).replace(";", ":")
+                frames.append(label)
+            lines.append(f"{';'.join(frames)} {count}")
+        return lines
+
+    def export_collapsed(self, filename):
+        """
+        Write the aggregated stacks as a collapsed-stack file.
+
+        Parameters:
+        - filename: Output file
+        """
+        with open(filename, 'w') as f:
+            for line in self.collapsed():
+                f.write(line + "\n")
+
+    def export_speedscope(self, filename, name="HFT simulator"):
+        """
+        Write the aggregated stacks as a speedscope file, one profile per thread.
+
+        Parameters:
+        - filename: Output file (open it at https://www.speedscope.app)
+        - name: Profile name shown by speedscope
+        """
+        with self.lock:
+            stacks = list(self.stacks.items())
+            period = self.elapsed / self.samples if self.samples else self.interval
+        frame_index = {}
+        frames = []
+        profiles = {}  # thread name -> (samples, weights)
+        for (thread_name, codes), count in stacks:
+            indices = []
+            for code in codes:
+                index = frame_index.get(code)
+                if index is None:
+                    index = frame_index[code] = len(frames)
+                    frames.append({'name': code.co_name, 'file': code.co_filename, 'line': code.co_firstlineno})
+                indices.append(index)
+            samples, weights = profiles.setdefault(thread_name, ([], []))
+            samples.append(indices)
+            weights.append(count * period)
+        document = {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'HFTonFPGA profiler',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': thread_name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': sum(weights),
+                'samples': samples,
+                'weights': weights,
+            } for thread_name, (samples, weights) in sorted(profiles.items())],
+        }
+        with open(filename, 'w') as f:
+            json.dump(document, f)
+
+    def export(self, prefix):
+        """
+        Write both formats next to each other.
+
+        Parameters:
+        - prefix: Output path without extension
+
+        Returns:
+        - Tuple (collapsed file, speedscope file)
+        """
+        collapsed_file = prefix + ".collapsed"
+        speedscope_file = prefix + ".speedscope.json"
+        self.export_collapsed(collapsed_file)
+        self.export_speedscope(speedscope_file)
+        return collapsed_file, speedscope_file
+
+    def top_functions(self, count=5):
+        """
+        Find the functions each thread spends most of its samples in.
+
+        Parameters:
+        - count: Functions to report per thread
+
+        Returns:
+        - Dictionary mapping thread name to (samples, [(label, inclusive samples)])
+        """
+        with self.lock:
+            stacks = list(self.stacks.items())
+        threads = {}
+        for (thread_name, codes), samples in stacks:
+            entry = threads.setdefault(thread_name, [0, {}, set()])
+            entry[0] += samples
+            inclusive = entry[1]
+            for code in set(codes):
+                inclusive[code] = inclusive.get(code, 0) + samples
+            if codes:
+                entry[2].add(codes[-1])
+        top = {}
+        for thread_name, (total, inclusive, leaves) in threads.items():
+            ranked = sorted(inclusive.items(), key=lambda item: -item[1])
+            # Frames under every sample that never run themselves (thread bootstrap,
+            # mainloop) only wrap the interesting ones
+            ranked = [(self._label(code), samples) for code, samples in ranked
+                      if samples < total or code in leaves]
+            top[thread_name] = (total, ranked[:count])
+        return top
+
+    def summary_lines(self, count=5):
+        """
+        Format the busiest functions per thread for the stats tab.
+
+        Parameters:
+        - count: Functions to report per thread
+
+        Returns:
+        - List of strings
+        """
+        lines = [f"Profiler: {'sampling' if self.running else 'stopped'}, {self.samples} samples "
+                 f"every {self.interval * 1e3:.1f} ms"]
+        for thread_name, (total, functions) in sorted(self.top_functions(count).items()):
+            lines.append(f"  {thread_name} ({total} samples)")
+            for label, samples in functions:
+                lines.append(f"    {samples / total:6.1%}  {label}")
+        return lines
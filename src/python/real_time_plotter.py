@@ -1,29 +1,35 @@
 import tkinter as tk
 from tkinter import ttk
-import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
-import matplotlib.animation as animation
 from collections import deque
 import time
 
 class RealTimePlotter:
-    def __init__(self, parent, max_points=100):
+    def __init__(self, parent, max_points=100, symbol_table=None, max_stocks=16, history=None):
         """
         Initialize the real-time plotter.
         
         Parameters:
         - parent: Tkinter parent widget
         - max_points: Maximum number of points to show in the plots
+        - symbol_table: Optional SymbolTable used to label plots with symbols
+        - max_stocks: Maximum number of stocks that get plot tabs (None for no limit);
+          data for further stocks is ignored to keep the Tk notebook usable
+        - history: Callable taking a series name and returning the buffer its
+          points are appended to (default: unbounded lists)
         """
         self.parent = parent
         self.max_points = max_points
+        self.symbol_table = symbol_table
+        self.max_stocks = max_stocks
+        self.history = history or (lambda name: [])
         
         # Data structures for received data
-        self.stock_data = {}  # stock_id -> {'time': list, 'price': list, 'quantity': list}
+        self.stock_data = {}  # stock_id -> points (time, price, quantity)
         
         # Data structures for highest value in order book per stock
-        self.highest_order_data = {}  # stock_id -> {'time': list, 'price': list}
+        self.highest_order_data = {}  # stock_id -> points (time, price)
         
         self.figures = {}  # stock_id -> {'price': Figure, 'quantity': Figure}
         self.canvases = {}  # stock_id -> {'price': FigureCanvasTkAgg, 'quantity': FigureCanvasTkAgg}
@@ -37,6 +43,37 @@ class RealTimePlotter:
         
         # Tabs for each stock and plot type
         self.tabs = {}  # stock_id -> {'price': Frame, 'quantity': Frame}
+        
+        self.pnl_figure = None  # PnL tab, created on the first plot_pnl() call
+        self.pnl_canvas = None
+    
+    def stock_label(self, stock_id):
+        """
+        Get the label used in tab names and plot titles for a stock.
+        
+        Parameters:
+        - stock_id: Stock identifier
+        
+        Returns:
+        - Label string
+        """
+        if self.symbol_table is not None and stock_id in self.symbol_table:
+            return f"Stock {stock_id} ({self.symbol_table.name(stock_id)})"
+        return f"Stock {stock_id}"
+    
+    def accepts_stock(self, stock_id):
+        """
+        Check whether a stock is (or can still be) plotted.
+        
+        Parameters:
+        - stock_id: Stock identifier
+        
+        Returns:
+        - True if the stock has plots or there is room for a new one
+        """
+        if stock_id in self.initialized_stocks:
+            return True
+        return self.max_stocks is None or len(self.initialized_stocks) < self.max_stocks
     
     def initialize_stock(self, stock_id):
         """
@@ -55,16 +92,8 @@ class RealTimePlotter:
         self.initialized_stocks.add(stock_id)
         
         # Create data structures for both received and highest order data
-        self.stock_data[stock_id] = {
-            'time': [],
-            'price': [],
-            'quantity': []
-        }
-        
-        self.highest_order_data[stock_id] = {
-            'time': [],
-            'price': []
-        }
+        self.stock_data[stock_id] = self.history(f"received_{stock_id}")
+        self.highest_order_data[stock_id] = self.history(f"highest_{stock_id}")
         
         # Initialize dictionaries for this stock
         if stock_id not in self.tabs:
@@ -77,7 +106,7 @@ class RealTimePlotter:
         # Create price tab and plot
         if 'price' not in self.tabs[stock_id]:
             self.tabs[stock_id]['price'] = ttk.Frame(self.notebook)
-            self.notebook.add(self.tabs[stock_id]['price'], text=f"Stock {stock_id} - Price")
+            self.notebook.add(self.tabs[stock_id]['price'], text=f"{self.stock_label(stock_id)} - Price")
             
             # Create price figure
             price_fig = Figure(figsize=(10, 6), dpi=100)
@@ -85,7 +114,7 @@ class RealTimePlotter:
             
             # Price plot
             price_ax = price_fig.add_subplot(111)  # Single plot takes up entire figure
-            price_ax.set_title(f"Stock {stock_id} - Price")
+            price_ax.set_title(f"{self.stock_label(stock_id)} - Price")
             price_ax.set_xlabel("Time (s)")
             price_ax.set_ylabel("Price")
             
@@ -105,7 +134,7 @@ class RealTimePlotter:
         # Create quantity tab and plot
         if 'quantity' not in self.tabs[stock_id]:
             self.tabs[stock_id]['quantity'] = ttk.Frame(self.notebook)
-            self.notebook.add(self.tabs[stock_id]['quantity'], text=f"Stock {stock_id} - Quantity")
+            self.notebook.add(self.tabs[stock_id]['quantity'], text=f"{self.stock_label(stock_id)} - Quantity")
             
             # Create quantity figure
             qty_fig = Figure(figsize=(10, 6), dpi=100)
@@ -113,7 +142,7 @@ class RealTimePlotter:
             
             # Quantity plot
             qty_ax = qty_fig.add_subplot(111)  # Single plot takes up entire figure
-            qty_ax.set_title(f"Stock {stock_id} - Quantity")
+            qty_ax.set_title(f"{self.stock_label(stock_id)} - Quantity")
             qty_ax.set_xlabel("Time (s)")
             qty_ax.set_ylabel("Quantity")
             
@@ -129,7 +158,7 @@ class RealTimePlotter:
             qty_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
             self.canvases[stock_id]['quantity'] = qty_canvas
     
-    def add_data_point(self, stock_id, price, quantity):
+    def add_data_point(self, stock_id, price, quantity, timestamp=None, redraw=True):
         """
         Add a new received data point for a stock.
         
@@ -137,10 +166,17 @@ class RealTimePlotter:
         - stock_id: Stock identifier
         - price: Latest price
         - quantity: Latest quantity
+        - timestamp: time.time() the point was received at (defaults to now)
+        - redraw: Redraw the stock's plots (False when adding points in bulk)
         """
+        if not self.accepts_stock(stock_id):
+            return
+        if timestamp is None:
+            timestamp = time.time()
+        
         # Initialize time tracking if this is the first data point
         if not self.plotting_active:
-            self.start_time = time.time()
+            self.start_time = timestamp
             self.plotting_active = True
         
         # Initialize stock if needed
@@ -148,24 +184,25 @@ class RealTimePlotter:
             self.initialize_stock(stock_id)
         
         # Add data points for received data
-        current_time = time.time() - self.start_time
-        self.stock_data[stock_id]['time'].append(current_time)
-        self.stock_data[stock_id]['price'].append(price)
-        self.stock_data[stock_id]['quantity'].append(quantity)
+        current_time = timestamp - self.start_time
+        self.stock_data[stock_id].append((current_time, price, quantity))
         
         # Update plots
-        self.update_plot(stock_id)
+        if redraw:
+            self.update_plot(stock_id)
     
-    def add_highest_order_price(self, stock_id, highest_price):
+    def add_highest_order_price(self, stock_id, highest_price, timestamp=None, redraw=True):
         """
         Add a new highest order price data point for a stock.
         
         Parameters:
         - stock_id: Stock identifier
         - highest_price: Highest price in the order book for this stock
+        - timestamp: time.time() of the book change (defaults to now)
+        - redraw: Redraw the stock's plots (False when adding points in bulk)
         """
         # Only add data points if plotting has been activated (received data has arrived)
-        if not self.plotting_active:
+        if not self.plotting_active or not self.accepts_stock(stock_id):
             return
         
         # Initialize stock if needed
@@ -173,12 +210,12 @@ class RealTimePlotter:
             self.initialize_stock(stock_id)
         
         # Add data points for highest order price
-        current_time = time.time() - self.start_time
-        self.highest_order_data[stock_id]['time'].append(current_time)
-        self.highest_order_data[stock_id]['price'].append(highest_price)
+        current_time = (time.time() if timestamp is None else timestamp) - self.start_time
+        self.highest_order_data[stock_id].append((current_time, highest_price))
         
         # Update plots
-        self.update_plot(stock_id)
+        if redraw:
+            self.update_plot(stock_id)
     
     def update_plot(self, stock_id):
         """
@@ -192,13 +229,15 @@ class RealTimePlotter:
             self.initialize_stock(stock_id)
         
         # Get received data
-        rec_times = list(self.stock_data[stock_id]['time'])
-        rec_prices = list(self.stock_data[stock_id]['price'])
-        rec_quantities = list(self.stock_data[stock_id]['quantity'])
+        received = list(self.stock_data[stock_id])
+        rec_times = [point[0] for point in received]
+        rec_prices = [point[1] for point in received]
+        rec_quantities = [point[2] for point in received]
         
         # Get highest order data
-        highest_times = list(self.highest_order_data.get(stock_id, {'time': []})['time'])
-        highest_prices = list(self.highest_order_data.get(stock_id, {'price': []})['price'])
+        highest = list(self.highest_order_data.get(stock_id, []))
+        highest_times = [point[0] for point in highest]
+        highest_prices = [point[1] for point in highest]
         
         if not rec_times and not highest_times:
             return
@@ -207,7 +246,7 @@ class RealTimePlotter:
         price_fig = self.figures[stock_id]['price']
         price_ax = price_fig.axes[0]
         price_ax.clear()
-        price_ax.set_title(f"Stock {stock_id} - Price")
+        price_ax.set_title(f"{self.stock_label(stock_id)} - Price")
         price_ax.set_xlabel("Time (s)")
         price_ax.set_ylabel("Price")
         
@@ -234,7 +273,7 @@ class RealTimePlotter:
         qty_fig = self.figures[stock_id]['quantity']
         qty_ax = qty_fig.axes[0]
         qty_ax.clear()
-        qty_ax.set_title(f"Stock {stock_id} - Quantity")
+        qty_ax.set_title(f"{self.stock_label(stock_id)} - Quantity")
         qty_ax.set_xlabel("Time (s)")
         qty_ax.set_ylabel("Quantity")
         
@@ -254,6 +293,34 @@ class RealTimePlotter:
         qty_fig.tight_layout()
         self.canvases[stock_id]['quantity'].draw()
     
+    def plot_pnl(self, series):
+        """
+        Plot the strategy's PnL and drawdown.
+        
+        Parameters:
+        - series: PnLTracker.series (deques of time, pnl, realized and drawdown)
+        """
+        if self.pnl_figure is None:
+            pnl_tab = ttk.Frame(self.notebook)
+            self.notebook.add(pnl_tab, text="PnL")
+            self.pnl_figure = Figure(figsize=(10, 6), dpi=100)
+            self.pnl_figure.add_subplot(111)
+            self.pnl_canvas = FigureCanvasTkAgg(self.pnl_figure, master=pnl_tab)
+            self.pnl_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        
+        times = list(series['time'])
+        ax = self.pnl_figure.axes[0]
+        ax.clear()
+        ax.set_title("Strategy PnL")
+        ax.set_xlabel("Time (s)")
+        ax.set_ylabel("PnL")
+        ax.plot(times, list(series['pnl']), 'b-', label='Mark-to-market')
+        ax.plot(times, list(series['realized']), 'g--', label='Realized')
+        ax.plot(times, [-d for d in series['drawdown']], 'r-', label='Drawdown')
+        ax.legend()
+        self.pnl_figure.tight_layout()
+        self.pnl_canvas.draw()
+    
     def update_all_plots(self):
         """Update all plots."""
         all_stock_ids = self.initialized_stocks
@@ -273,7 +340,7 @@ class RealTimePlotter:
                 if stock_id in self.figures and plot_type in self.figures[stock_id]:
                     ax = self.figures[stock_id][plot_type].axes[0]
                     ax.clear()
-                    ax.set_title(f"Stock {stock_id} - {plot_type.capitalize()}")
+                    ax.set_title(f"{self.stock_label(stock_id)} - {plot_type.capitalize()}")
                     ax.set_xlabel("Time (s)")
                     ax.set_ylabel(plot_type.capitalize())
                     
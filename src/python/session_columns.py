@@ -0,0 +1,264 @@
+import math
+from array import array
+from itertools import repeat
+
+# Row types in the order of their column codes
+TYPE_NAMES = ['ADD', 'CANCEL', 'EXECUTE', 'DELETE', 'REPLACE']
+TYPE_CODES = {name: code for code, name in enumerate(TYPE_NAMES)}
+TYPE_ADD = TYPE_CODES['ADD']
+TYPE_REPLACE = TYPE_CODES['REPLACE']
+
+MAX_STOCK_ID = 0xFFFF  # 2-byte stock locate
+MAX_QUANTITY = 0xFFFFFFFF  # 4-byte shares
+NO_QUANTITY = -1  # stored for an empty quantity cell
+
+class SessionColumns:
+    """
+    A market data session stored as typed columns.
+
+    Each field is an array, so a multi-million-row session costs a few
+    bytes per row instead of a dict per row. Missing prices are stored as
+    NaN and missing quantities as -1; row() turns both back into None.
+    new_order_ids is only meaningful for REPLACE rows (0 elsewhere).
+    """
+
+    def __init__(self):
+        """Initialize an empty session."""
+        self.types = array('B')
+        self.stock_ids = array('q')
+        self.order_ids = array('Q')
+        self.is_buy = array('B')
+        self.prices = array('d')
+        self.quantities = array('q')
+        self.new_order_ids = array('Q')
+
+    def __len__(self):
+        return len(self.types)
+
+    def __iter__(self):
+        for index in range(len(self.types)):
+            yield self.row(index)
+
+    def row(self, index):
+        """
+        Get one row in the dictionary form used by the generators.
+
+        Parameters:
+        - index: Row index
+
+        Returns:
+        - Dictionary with type, stock_id, order_id, is_buy, price and quantity,
+          plus new_order_id for REPLACE rows
+        """
+        price = self.prices[index]
+        quantity = self.quantities[index]
+        code = self.types[index]
+        row = {
+            'type': TYPE_NAMES[code],
+            'stock_id': self.stock_ids[index],
+            'order_id': self.order_ids[index],
+            'is_buy': bool(self.is_buy[index]),
+            'price': None if price != price else price,
+            'quantity': None if quantity == NO_QUANTITY else quantity
+        }
+        if code == TYPE_REPLACE:
+            row['new_order_id'] = self.new_order_ids[index]
+        return row
+
+    def append(self, row):
+        """
+        Append a row dictionary.
+
+        Parameters:
+        - row: Dictionary with type, stock_id, order_id, is_buy, price and quantity
+          (and new_order_id for REPLACE rows)
+        """
+        price = row.get('price')
+        quantity = row.get('quantity')
+        self.types.append(TYPE_CODES[row['type']])
+        self.stock_ids.append(row['stock_id'])
+        self.order_ids.append(row['order_id'])
+        self.is_buy.append(1 if row.get('is_buy') else 0)
+        self.prices.append(math.nan if price is None else price)
+        self.quantities.append(NO_QUANTITY if quantity is None else quantity)
+        self.new_order_ids.append(row.get('new_order_id') or 0)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build a session from row dictionaries.
+
+        Parameters:
+        - rows: Iterable of row dictionaries
+
+        Returns:
+        - SessionColumns
+        """
+        session = cls()
+        for row in rows:
+            session.append(row)
+        return session
+
+    def type_counts(self):
+        """
+        Count rows per type.
+
+        Returns:
+        - Dictionary of type name -> row count
+        """
+        return {name: self.types.count(code) for code, name in enumerate(TYPE_NAMES)}
+
+def _optional_floats(values):
+    if '' in values:
+        return array('d', [float(v) if v else math.nan for v in values])
+    return array('d', map(float, values))
+
+def _optional_ints(values):
+    if '' in values:
+        return array('q', [int(v) if v else NO_QUANTITY for v in values])
+    return array('q', map(int, values))
+
+def _validate(session):
+    # Bulk range checks over whole columns; raising here sends the load down
+    # the per-row path, which reports the offending rows
+    if not len(session):
+        return
+    if min(session.stock_ids) < 0 or max(session.stock_ids) > MAX_STOCK_ID:
+        raise ValueError("stock_id out of range")
+    if min(session.quantities) < NO_QUANTITY or max(session.quantities) > MAX_QUANTITY:
+        raise ValueError("quantity out of range")
+    total = sum(session.prices)  # NaN when any price is missing
+    if total == total and NO_QUANTITY not in session.quantities:
+        if min(session.prices) < 0:
+            raise ValueError("negative price")
+        return
+    for code, price, quantity in zip(session.types, session.prices, session.quantities):
+        if price < 0:
+            raise ValueError("negative price")
+        if code == TYPE_ADD and (price != price or quantity == NO_QUANTITY):
+            raise ValueError("ADD row without price or quantity")
+
+def _parse_columns(columns, index, count):
+    def column(name):
+        position = index.get(name)
+        return columns[position] if position is not None and count else None
+
+    session = SessionColumns()
+    try:
+        session.types = array('B', map(TYPE_CODES.__getitem__, column('type') or ()))
+    except KeyError as e:
+        raise ValueError(f"Unknown row type {e}")
+
+    stock_ids = column('stock_id')
+    session.stock_ids = array('q', map(int, stock_ids)) if stock_ids else array('q', [0]) * count
+    order_ids = column('order_id')
+    session.order_ids = array('Q', map(int, order_ids)) if order_ids else array('Q', [0]) * count
+    is_buy = column('is_buy')
+    session.is_buy = array('B', [v == 'true' for v in map(str.lower, is_buy)]) if is_buy else array('B', [0]) * count
+    prices = column('price')
+    session.prices = _optional_floats(prices) if prices else array('d', [math.nan]) * count
+    quantities = column('quantity')
+    session.quantities = _optional_ints(quantities) if quantities else array('q', [NO_QUANTITY]) * count
+    new_order_ids = column('new_order_id')
+    if new_order_ids:
+        session.new_order_ids = array('Q', [int(v) if v else 0 for v in new_order_ids])
+    else:
+        session.new_order_ids = array('Q', [0]) * count
+    _validate(session)
+    return session
+
+def _parse_rows(records, index, width, on_error):
+    session = SessionColumns()
+    single = SessionColumns()
+    for record in records:
+        try:
+            if len(record) != width:
+                raise ValueError(f"Expected {width} fields, got {len(record)}")
+            row = {name: record[position] for name, position in index.items()}
+            if row['type'] not in TYPE_CODES:
+                raise ValueError(f"Unknown row type {row['type']!r}")
+            price = row.get('price', '')
+            quantity = row.get('quantity', '')
+            new_order_id = row.get('new_order_id', '')
+            single.append({
+                'type': row['type'],
+                'stock_id': int(row.get('stock_id', 0)),
+                'order_id': int(row.get('order_id', 0)),
+                'is_buy': row.get('is_buy', '').lower() == 'true',
+                'price': float(price) if price != '' else None,
+                'quantity': int(quantity) if quantity != '' else None,
+                'new_order_id': int(new_order_id) if new_order_id != '' else 0
+            })
+            _validate(single)
+        except (ValueError, OverflowError) as e:
+            if on_error is not None:
+                on_error(e)
+            single = SessionColumns()
+            continue
+        session.types.append(single.types.pop())
+        session.stock_ids.append(single.stock_ids.pop())
+        session.order_ids.append(single.order_ids.pop())
+        session.is_buy.append(single.is_buy.pop())
+        session.prices.append(single.prices.pop())
+        session.quantities.append(single.quantities.pop())
+        session.new_order_ids.append(single.new_order_ids.pop())
+    return session
+
+def load_session_csv(filename, on_error=None):
+    """
+    Load a session CSV (as written by save_to_csv) into typed columns.
+
+    Files without quoting (everything save_to_csv writes) are split into
+    columns with str.split and slicing; others go through the csv module.
+    Every column is then converted with a single map() into an array and
+    validated as a whole. Only when that fails is the file parsed row by
+    row to skip and report the bad rows.
+
+    Parameters:
+    - filename: Input CSV filename
+    - on_error: Optional callable invoked with the exception for rows that
+      cannot be parsed (such rows are skipped)
+
+    Returns:
+    - SessionColumns
+    """
+    # Imported here rather than at module level: csv pulls in re and enum
+    import csv
+    import io
+
+    with open(filename, 'r', newline='') as csvfile:
+        text = csvfile.read()
+
+    if '"' in text:
+        records = [record for record in csv.reader(io.StringIO(text)) if record]
+        header = records.pop(0) if records else None
+    else:
+        records = None
+        lines = text.splitlines()
+        header = lines[0].split(',') if lines else None
+    if header is None:
+        return SessionColumns()
+
+    index = {name: position for position, name in enumerate(header)}
+    if 'type' not in index:
+        raise ValueError(f"{filename} has no 'type' column")
+    width = len(header)
+
+    if records is None:
+        body = lines[1:]
+        if '' in body:
+            body = [line for line in body if line]  # blank lines
+        if set(map(str.count, body, repeat(','))) <= {width - 1}:
+            # Every line has exactly width fields: split them all at once
+            fields = ','.join(body).split(',') if body else []
+            try:
+                return _parse_columns([fields[k::width] for k in range(width)], index, len(body))
+            except (ValueError, OverflowError):
+                pass
+        records = list(csv.reader(body))
+    elif all(len(record) == width for record in records):
+        try:
+            return _parse_columns(list(zip(*records)), index, len(records))
+        except (ValueError, OverflowError):
+            pass
+    return _parse_rows(records, index, width, on_error)
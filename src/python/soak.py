@@ -0,0 +1,351 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+OVERFLOW_POLICIES = ('drop', 'sample', 'spill')
+
+class BoundedBuffer:
+    """
+    Append-only buffer holding at most bound items.
+
+    What happens to the items pushed past the bound is the overflow policy:
+
+    - 'drop': the oldest item is discarded, like deque(maxlen=bound);
+    - 'sample': every other item is discarded and from then on only every
+      second (then fourth, ...) new item is kept, so the buffer keeps a
+      uniformly thinned view of the whole run instead of its tail;
+    - 'spill': the oldest item is appended as a JSON line to spill_file
+      and discarded.
+
+    Appends and pops take a lock: the buffers sit between the TX/RX
+    threads and the Tk main loop.
+    """
+
+    def __init__(self, bound, policy='drop', spill_file=None):
+        """
+        Initialize an empty buffer.
+
+        Parameters:
+        - bound: Most items kept
+        - policy: Overflow policy, one of OVERFLOW_POLICIES
+        - spill_file: File the 'spill' policy appends to
+        """
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}, expected one of {OVERFLOW_POLICIES}")
+        if policy == 'spill' and not spill_file:
+            raise ValueError("The spill policy needs a spill file")
+        self.bound = max(1, bound)
+        self.policy = policy
+        self.spill_file = spill_file
+        self.lock = threading.Lock()
+        self.items = deque()
+        self.stride = 1  # 'sample': one new item kept per stride appends
+        self.skipped = 0  # appends since the last kept one
+        self.dropped = 0  # items discarded by 'drop' or 'sample'
+        self.spilled = 0  # items written to the spill file
+        self.spill = None  # open spill file
+
+    def append(self, item):
+        """
+        Add an item, applying the overflow policy when the buffer is full.
+
+        Parameters:
+        - item: Item to add (JSON-serializable for 'spill'; others are written as strings)
+        """
+        with self.lock:
+            if self.stride > 1:
+                self.skipped += 1
+                if self.skipped < self.stride:
+                    self.dropped += 1
+                    return
+                self.skipped = 0
+            self.items.append(item)
+            if len(self.items) > self.bound:
+                self._overflow()
+
+    def _overflow(self):
+        items = self.items
+        if self.policy == 'drop':
+            items.popleft()
+            self.dropped += 1
+        elif self.policy == 'sample':
+            # Keep the newest item and every other one before it
+            kept = deque(item for index, item in enumerate(items) if (len(items) - 1 - index) % 2 == 0)
+            self.dropped += len(items) - len(kept)
+            self.items = kept
+            self.stride *= 2
+            self.skipped = 0
+        else:
+            if self.spill is None:
+                directory = os.path.dirname(self.spill_file)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self.spill = open(self.spill_file, 'a')
+            # Spill a tenth at a time, so writes are batched
+            lines = [json.dumps(items.popleft(), default=str) for _ in range(max(1, self.bound // 10))
+                     if items]
+            self.spill.write("\n".join(lines) + "\n")
+            self.spilled += len(lines)
+
+    def popleft(self):
+        """
+        Remove and return the oldest item.
+
+        Returns:
+        - The item (IndexError when empty)
+        """
+        with self.lock:
+            return self.items.popleft()
+
+    def clear(self):
+        """Drop all items and start sampling at full resolution again."""
+        with self.lock:
+            self.items = deque()
+            self.stride = 1
+            self.skipped = 0
+
+    def close(self):
+        """Flush and close the spill file."""
+        with self.lock:
+            if self.spill is not None:
+                self.spill.close()
+                self.spill = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.items))
+
+class BoundedQueue(BoundedBuffer):
+    """
+    BoundedBuffer with the queue.Queue methods the UI loop uses.
+
+    Unlike queue.Queue, put() never blocks (the overflow policy makes room)
+    and get() does not wait for an item.
+    """
+
+    def put(self, item):
+        """Add an item (see BoundedBuffer.append)."""
+        self.append(item)
+
+    def get(self):
+        """
+        Remove and return the oldest item.
+
+        Returns:
+        - The item (queue.Empty when empty)
+        """
+        try:
+            return self.popleft()
+        except IndexError:
+            raise queue.Empty
+
+    def empty(self):
+        """True when no item is waiting."""
+        return not self.items
+
+    def qsize(self):
+        """Number of items waiting."""
+        return len(self.items)
+
+def buffer_factory(bound, policy='drop', spill_dir='soak_spill'):
+    """
+    Make a constructor of bounded buffers sharing one configuration.
+
+    Parameters:
+    - bound: Most items per buffer
+    - policy: Overflow policy, one of OVERFLOW_POLICIES
+    - spill_dir: Directory of the spill files, one <name>.jsonl per buffer
+
+    Returns:
+    - Callable taking a buffer name and returning a new BoundedBuffer
+    """
+    def make(name):
+        return BoundedBuffer(bound, policy, os.path.join(spill_dir, f"{name}.jsonl"))
+    return make
+
+class TextLog:
+    """
+    Append-only log in a Tk Text widget, optionally bounded in lines.
+
+    The overflow policies mirror BoundedBuffer: 'drop' deletes the oldest
+    lines, 'sample' deletes every other line and from then on only shows
+    every second (fourth, ...) message, 'spill' moves the oldest lines to
+    spill_file. Lines are trimmed a tenth of the bound at a time so a full
+    log does not pay a delete on every message.
+    """
+
+    def __init__(self, widget, max_lines=None, policy='drop', spill_file=None):
+        """
+        Wrap a Text widget.
+
+        Parameters:
+        - widget: tk.Text (or ScrolledText) to write to
+        - max_lines: Most lines kept (None for no bound)
+        - policy: Overflow policy, one of OVERFLOW_POLICIES
+        - spill_file: File the 'spill' policy appends to
+        """
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}, expected one of {OVERFLOW_POLICIES}")
+        if policy == 'spill' and not spill_file:
+            raise ValueError("The spill policy needs a spill file")
+        self.widget = widget
+        self.max_lines = max_lines
+        self.policy = policy
+        self.spill_file = spill_file
+        self.stride = 1
+        self.skipped = 0
+        self.dropped = 0  # lines deleted by 'drop' or 'sample' (messages skipped by 'sample')
+        self.spilled = 0  # lines written to the spill file
+
+    def write(self, text):
+        """
+        Append text and scroll to it.
+
+        Parameters:
+        - text: Text to append
+        """
+        if self.stride > 1:
+            self.skipped += 1
+            if self.skipped < self.stride:
+                self.dropped += 1
+                return
+            self.skipped = 0
+        widget = self.widget
+        widget.insert('end', text)
+        if self.max_lines:
+            lines = int(widget.index('end-1c').split('.')[0])
+            if lines > self.max_lines:
+                self._trim(lines)
+        widget.see('end')
+
+    def _trim(self, lines):
+        widget = self.widget
+        if self.policy == 'sample':
+            text = widget.get('1.0', 'end-1c').split("\n")
+            kept = text[(len(text) - 1) % 2::2]  # keeps the last line
+            widget.delete('1.0', 'end')
+            widget.insert('end', "\n".join(kept))
+            self.dropped += len(text) - len(kept)
+            self.stride *= 2
+            self.skipped = 0
+            return
+        excess = lines - self.max_lines + self.max_lines // 10
+        end = f"{excess + 1}.0"
+        if self.policy == 'spill':
+            directory = os.path.dirname(self.spill_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.spill_file, 'a') as f:
+                f.write(widget.get('1.0', end))
+            self.spilled += excess
+        else:
+            self.dropped += excess
+        widget.delete('1.0', end)
+
+def rss_bytes():
+    """
+    Get the resident set size of this process.
+
+    Returns:
+    - Bytes, or None when the platform offers no way to read it
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil  # optional, covers Windows and macOS
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+class MemoryMonitor:
+    """
+    Periodically logs the process RSS and its top allocation sites.
+
+    Each snapshot is appended to filename as a JSON line with the RSS, the
+    memory traced by tracemalloc and its top_n allocation sites (file:line),
+    plus the sizes reported by the registered buffer callables. Comparing
+    the first and last lines of a long run shows whether memory stayed
+    flat and, if it did not, which line kept allocating.
+    """
+
+    def __init__(self, filename, interval=60.0, top_n=10):
+        """
+        Start tracing (when top_n > 0) and logging in a daemon thread.
+
+        Parameters:
+        - filename: Output file (JSON lines, appended)
+        - interval: Seconds between snapshots
+        - top_n: Allocation sites per snapshot (0 logs the RSS only, without tracemalloc overhead)
+        """
+        self.filename = filename
+        self.interval = interval
+        self.top_n = top_n
+        self.sizes = {}  # name -> callable returning a size
+        self.last = None  # last snapshot
+        if top_n:
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="memory-monitor")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def register(self, name, func):
+        """
+        Report a buffer size in every snapshot.
+
+        Parameters:
+        - name: Buffer name
+        - func: Callable returning its current size
+        """
+        self.sizes[name] = func
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.log()
+
+    def snapshot(self):
+        """
+        Take one memory snapshot.
+
+        Returns:
+        - Dictionary with timestamp, rss_bytes, traced_bytes, traced_peak_bytes,
+          top (list of {where, size_bytes, count}) and sizes
+        """
+        snapshot = {'timestamp': time.time(), 'rss_bytes': rss_bytes()}
+        if self.top_n:
+            import tracemalloc
+
+            snapshot['traced_bytes'], snapshot['traced_peak_bytes'] = tracemalloc.get_traced_memory()
+            stats = tracemalloc.take_snapshot().statistics('lineno')[:self.top_n]
+            snapshot['top'] = [{'where': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                                'size_bytes': stat.size, 'count': stat.count} for stat in stats]
+        sizes = {}
+        for name, func in list(self.sizes.items()):
+            try:
+                sizes[name] = func()
+            except Exception:
+                sizes[name] = None
+        snapshot['sizes'] = sizes
+        return snapshot
+
+    def log(self):
+        """Append one snapshot to the output file."""
+        self.last = self.snapshot()
+        with open(self.filename, 'a') as f:
+            f.write(json.dumps(self.last) + "\n")
+
+    def close(self):
+        """Stop logging (tracing stays on for whatever else uses it)."""
+        self.stopped.set()
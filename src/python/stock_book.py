@@ -1,3 +1,11 @@
+import struct
+
+# Snapshot layout: header, then one fixed-size record per order in insertion order
+SNAPSHOT_MAGIC = b'HFTBOOK'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<7sHQI')  # magic, version, journal sequence, order count
+SNAPSHOT_ORDER = struct.Struct('<QIBdI')  # order_id, stock_id, is_buy, price, quantity
+
 class StockBook:
     """
     Maintains a record of active orders for multiple stocks.
@@ -12,6 +20,9 @@ class StockBook:
         self.orders = {}  # order_id -> order_details
         self.buy_orders = {}  # stock_id -> list of buy orders
         self.sell_orders = {}  # stock_id -> list of sell orders
+        self.entries = {}  # order_id -> the order's entry in its buy/sell list
+        self.depth_cache = {}  # (stock_id, is_buy) -> aggregated price levels, dropped when the side changes
+        self.top_of_book = None  # optional TopOfBookTable kept up to date on every change
     
     def add_order(self, order_id, stock_id, is_buy, price, quantity):
         """
@@ -36,11 +47,14 @@ class StockBook:
         if stock_id not in orders_list:
             orders_list[stock_id] = []
         
-        orders_list[stock_id].append({
+        entry = {
             "order_id": order_id,
             "price": price,
             "quantity": quantity
-        })
+        }
+        orders_list[stock_id].append(entry)
+        self.entries[order_id] = entry
+        self.depth_cache.pop((stock_id, is_buy), None)
         
         # Sort buy orders by price (descending)
         if is_buy and stock_id in self.buy_orders:
@@ -56,6 +70,9 @@ class StockBook:
                 self.sell_orders[stock_id], 
                 key=lambda x: x["price"]
             )
+        
+        if self.top_of_book is not None:
+            self.publish_top_of_book(stock_id)
     
     def remove_order(self, order_id):
         """
@@ -79,9 +96,85 @@ class StockBook:
             
             # Remove from orders dictionary
             del self.orders[order_id]
+            self.entries.pop(order_id, None)
+            self.depth_cache.pop((stock_id, is_buy), None)
+            
+            if self.top_of_book is not None:
+                self.publish_top_of_book(stock_id)
             return True
         return False
     
+    def reduce_order(self, order_id, quantity):
+        """
+        Take quantity off a resting order, removing it once nothing is left.
+        
+        The order keeps its place in the book; its quantity is updated in
+        place through the entries index without touching the sorted side.
+        
+        Parameters:
+        - order_id: Identifier of the order to reduce
+        - quantity: Shares to take off
+        
+        Returns:
+        - Remaining quantity (0 if the order was removed), or None if the
+          order is not in the book
+        """
+        order = self.orders.get(order_id)
+        if order is None:
+            return None
+        remaining = order["quantity"] - quantity
+        if remaining <= 0:
+            self.remove_order(order_id)
+            return 0
+        order["quantity"] = remaining
+        self.entries[order_id]["quantity"] = remaining
+        self.depth_cache.pop((order["stock_id"], order["is_buy"]), None)
+        if self.top_of_book is not None:
+            self.publish_top_of_book(order["stock_id"])
+        return remaining
+    
+    def execute_order(self, order_id, quantity):
+        """
+        Apply an execution against a resting order (ITCH 'E').
+        
+        Parameters:
+        - order_id: Identifier of the executed order
+        - quantity: Executed shares
+        
+        Returns:
+        - Shares actually executed (capped at the resting quantity, 0 if
+          the order is not in the book)
+        """
+        order = self.orders.get(order_id)
+        if order is None:
+            return 0
+        executed = min(quantity, order["quantity"])
+        self.reduce_order(order_id, quantity)
+        return executed
+    
+    def replace_order(self, order_id, new_order_id, price, quantity):
+        """
+        Replace a resting order with a new one (ITCH 'U').
+        
+        The new order keeps the stock and side of the old one but loses its
+        time priority, as on the exchange.
+        
+        Parameters:
+        - order_id: Identifier of the order being replaced
+        - new_order_id: Identifier of the replacement order
+        - price: New price
+        - quantity: New quantity
+        
+        Returns:
+        - True if the original order was found and replaced, False otherwise
+        """
+        order = self.orders.get(order_id)
+        if order is None:
+            return False
+        self.remove_order(order_id)
+        self.add_order(new_order_id, order["stock_id"], order["is_buy"], price, quantity)
+        return True
+    
     def get_highest_buy(self, stock_id):
         """
         Get the highest buy order for a stock.
@@ -110,6 +203,120 @@ class StockBook:
             return self.sell_orders[stock_id][0]  # Already sorted
         return None
     
+    def get_depth(self, stock_id, is_buy, levels=10):
+        """
+        Get the best price levels of one side, aggregated.
+        
+        The side is aggregated in one pass over its (already sorted) orders
+        and cached until an order on that side changes, so repeated queries
+        between updates only slice the cached list.
+        
+        Parameters:
+        - stock_id: Identifier for the stock
+        - is_buy: True for the bid side, False for the ask side
+        - levels: Number of levels (None for all)
+        
+        Returns:
+        - List of (price, total quantity, order count) tuples, best first
+        """
+        key = (stock_id, is_buy)
+        depth = self.depth_cache.get(key)
+        if depth is None:
+            depth = []
+            price = None
+            quantity = count = 0
+            for order in (self.buy_orders if is_buy else self.sell_orders).get(stock_id, ()):
+                if order["price"] != price:
+                    if count:
+                        depth.append((price, quantity, count))
+                    price = order["price"]
+                    quantity = count = 0
+                quantity += order["quantity"]
+                count += 1
+            if count:
+                depth.append((price, quantity, count))
+            self.depth_cache[key] = depth
+        return depth[:levels] if levels is not None else list(depth)
+    
+    def get_cumulative_depth(self, stock_id, is_buy, levels=10):
+        """
+        Get the quantity available up to and including each of the best levels.
+        
+        Parameters:
+        - stock_id: Identifier for the stock
+        - is_buy: True for the bid side, False for the ask side
+        - levels: Number of levels (None for all)
+        
+        Returns:
+        - List of (price, cumulative quantity) tuples, best first
+        """
+        total = 0
+        cumulative = []
+        for price, quantity, _ in self.get_depth(stock_id, is_buy, levels):
+            total += quantity
+            cumulative.append((price, total))
+        return cumulative
+    
+    def get_spread(self, stock_id):
+        """
+        Get the difference between the best ask and the best bid.
+        
+        Parameters:
+        - stock_id: Identifier for the stock
+        
+        Returns:
+        - Spread, or None unless both sides are quoted
+        """
+        best_buy = self.get_highest_buy(stock_id)
+        best_sell = self.get_lowest_sell(stock_id)
+        if best_buy is None or best_sell is None:
+            return None
+        return best_sell["price"] - best_buy["price"]
+    
+    def get_mid_price(self, stock_id):
+        """
+        Get the midpoint of the best bid and ask.
+        
+        Parameters:
+        - stock_id: Identifier for the stock
+        
+        Returns:
+        - Mid price, or None unless both sides are quoted
+        """
+        best_buy = self.get_highest_buy(stock_id)
+        best_sell = self.get_lowest_sell(stock_id)
+        if best_buy is None or best_sell is None:
+            return None
+        return (best_buy["price"] + best_sell["price"]) / 2
+    
+    def attach_top_of_book(self, table):
+        """
+        Publish best prices into a shared-memory table from now on.
+        
+        Parameters:
+        - table: TopOfBookTable (None detaches)
+        """
+        self.top_of_book = table
+        if table is not None:
+            for stock_id in self.get_all_stocks():
+                self.publish_top_of_book(stock_id)
+    
+    def publish_top_of_book(self, stock_id, table=None):
+        """
+        Write a stock's best bid/ask, quantities and order count to a table.
+        
+        Parameters:
+        - stock_id: Identifier for the stock
+        - table: TopOfBookTable to write to (defaults to the attached one)
+        """
+        table = table if table is not None else self.top_of_book
+        best_buy = self.get_highest_buy(stock_id)
+        best_sell = self.get_lowest_sell(stock_id)
+        table.publish(stock_id,
+                      best_buy["price"] if best_buy else 0.0, best_buy["quantity"] if best_buy else 0,
+                      best_sell["price"] if best_sell else 0.0, best_sell["quantity"] if best_sell else 0,
+                      self.get_order_count(stock_id))
+    
     def get_order_count(self, stock_id):
         """
         Get the total number of orders for a stock.
@@ -147,13 +354,13 @@ class StockBook:
         - stock_id: Identifier for the stock
         
         Returns:
-        - Dictionary with 'buy' and 'sell' keys containing lists of orders
+        - Dictionary with 'buy' (highest price first) and 'sell' (lowest
+          price first) keys containing lists of orders
         """
-        buy = self.buy_orders.get(stock_id, [])
-        sell = self.sell_orders.get(stock_id, [])
+        # Both sides are kept sorted, so copying them is enough
         return {
-            'buy': sorted(buy, key=lambda x: x["price"], reverse=True),
-            'sell': sorted(sell, key=lambda x: x["price"])
+            'buy': list(self.buy_orders.get(stock_id, [])),
+            'sell': list(self.sell_orders.get(stock_id, []))
         }
     
     def get_all_stocks(self):
@@ -163,7 +370,78 @@ class StockBook:
         Returns:
         - List of unique stock IDs
         """
-        stocks = set()
-        for order in self.orders.values():
-            stocks.add(order["stock_id"])
-        return sorted(list(stocks))
\ No newline at end of file
+        # Walk the per-stock sides rather than every resting order
+        stocks = {stock_id for stock_id, orders in self.buy_orders.items() if orders}
+        stocks.update(stock_id for stock_id, orders in self.sell_orders.items() if orders)
+        return sorted(stocks)
+    
+    def to_snapshot(self, sequence=0):
+        """
+        Serialize the full book into a compact versioned binary snapshot.
+        
+        Orders are written in insertion order so that restoring preserves
+        time priority between orders at the same price.
+        
+        Parameters:
+        - sequence: Journal sequence number the snapshot corresponds to
+        
+        Returns:
+        - Bytes containing the snapshot
+        """
+        buffer = bytearray(SNAPSHOT_HEADER.size + SNAPSHOT_ORDER.size * len(self.orders))
+        SNAPSHOT_HEADER.pack_into(buffer, 0, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, sequence, len(self.orders))
+        offset = SNAPSHOT_HEADER.size
+        pack_into = SNAPSHOT_ORDER.pack_into
+        for order_id, order in self.orders.items():
+            pack_into(buffer, offset, order_id, order["stock_id"], order["is_buy"],
+                      order["price"], order["quantity"])
+            offset += SNAPSHOT_ORDER.size
+        return bytes(buffer)
+    
+    @classmethod
+    def from_snapshot(cls, data):
+        """
+        Rebuild a book from a snapshot produced by to_snapshot().
+        
+        Each side is sorted once at the end instead of on every insert.
+        
+        Parameters:
+        - data: Snapshot bytes
+        
+        Returns:
+        - Tuple (StockBook, journal sequence number)
+        """
+        magic, version, sequence, count = SNAPSHOT_HEADER.unpack_from(data, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("Not a stock book snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {version}")
+        expected_size = SNAPSHOT_HEADER.size + count * SNAPSHOT_ORDER.size
+        if len(data) < expected_size:
+            raise ValueError("Truncated stock book snapshot")
+        
+        book = cls()
+        records = SNAPSHOT_ORDER.iter_unpack(data[SNAPSHOT_HEADER.size:expected_size])
+        for order_id, stock_id, is_buy, price, quantity in records:
+            is_buy = bool(is_buy)
+            book.orders[order_id] = {
+                "stock_id": stock_id,
+                "is_buy": is_buy,
+                "price": price,
+                "quantity": quantity
+            }
+            entry = {
+                "order_id": order_id,
+                "price": price,
+                "quantity": quantity
+            }
+            orders_list = book.buy_orders if is_buy else book.sell_orders
+            orders_list.setdefault(stock_id, []).append(entry)
+            book.entries[order_id] = entry
+        
+        # Stable sorts keep insertion order among equal prices, matching add_order
+        for orders in book.buy_orders.values():
+            orders.sort(key=lambda x: x["price"], reverse=True)
+        for orders in book.sell_orders.values():
+            orders.sort(key=lambda x: x["price"])
+        return book, sequence
@@ -0,0 +1,568 @@
+import itertools
+import random
+
+from order_ids import OrderIdAllocator
+
+class ScenarioMarket:
+    """
+    Order state shared by composed stress scenarios.
+
+    Scenarios emit session rows through the market, so that however they
+    are sequenced or interleaved, order IDs come from one OrderIdAllocator
+    (an ID is only reused once its order left the book; when every ID is
+    live the oldest order is cancelled first) and every CANCEL or EXECUTE
+    names an order that is still resting. The market changes when a row is
+    made, so scenarios yield each row as soon as they get it, and add() is
+    itself a generator. Orders are kept as mutable [stock_id, is_buy,
+    price, quantity] records; a scenario holding on to an order compares
+    records by identity to notice that another scenario removed it in the
+    meantime.
+    """
+
+    def __init__(self, symbol_table, seed=None, quantity_min=1, quantity_max=255, allocator=None):
+        """
+        Initialize a market with no resting orders.
+
+        Parameters:
+        - symbol_table: SymbolTable providing baseline prices and tick sizes
+        - seed: Optional random seed shared by the scenarios
+        - quantity_min, quantity_max: Range of order quantities
+        - allocator: OrderIdAllocator to use (a fresh full-range one by default)
+        """
+        self.symbols = symbol_table
+        self.rng = random.Random(seed)
+        self.quantity_min = quantity_min
+        self.quantity_max = quantity_max
+        self.ids = allocator or OrderIdAllocator()
+        self.orders = {}  # order_id -> [stock_id, is_buy, price, quantity]
+        self.stock_orders = {}  # stock_id -> set of order IDs
+        self.prices = {}  # stock_id -> reference price (baseline until a scenario moves it)
+
+    def __len__(self):
+        return len(self.orders)
+
+    def price(self, stock_id):
+        """Get the reference price scenarios quote a stock around."""
+        price = self.prices.get(stock_id)
+        return self.symbols.baseline_price(stock_id) if price is None else price
+
+    def tick(self, stock_id):
+        """Get the tick size of a stock."""
+        return self.symbols.tick_size(stock_id)
+
+    def snap(self, stock_id, price):
+        """Round a price to the stock's tick size (at least one tick)."""
+        tick = self.symbols.tick_size(stock_id)
+        return round(max(round(price / tick) * tick, tick), 2)
+
+    def quantity(self):
+        """Draw an order quantity."""
+        return self.rng.randint(self.quantity_min, self.quantity_max)
+
+    def orders_of(self, stock_id, is_buy=None):
+        """
+        Get the resting orders of a stock.
+
+        Parameters:
+        - stock_id: Identifier for the stock
+        - is_buy: True or False for one side, None for both
+
+        Returns:
+        - List of order IDs
+        """
+        order_ids = self.stock_orders.get(stock_id, ())
+        if is_buy is None:
+            return list(order_ids)
+        orders = self.orders
+        return [order_id for order_id in order_ids if orders[order_id][1] == is_buy]
+
+    def best(self, stock_id, is_buy=True):
+        """
+        Get the order at the best price of one side of a stock.
+
+        Parameters:
+        - stock_id: Identifier for the stock
+        - is_buy: True for the highest buy, False for the lowest sell, None
+          for the highest order of either side (the board's best_price_o)
+
+        Returns:
+        - Order ID, or None if the side is empty
+        """
+        order_ids = self.orders_of(stock_id, is_buy)
+        if not order_ids:
+            return None
+        orders = self.orders
+        if is_buy is False:
+            return min(order_ids, key=lambda order_id: orders[order_id][2])
+        return max(order_ids, key=lambda order_id: orders[order_id][2])
+
+    def add(self, stock_id, is_buy, price, quantity=None):
+        """
+        Add an order (use as order_id, record = yield from market.add(...)).
+
+        Parameters:
+        - stock_id: Identifier for the stock
+        - is_buy: True for buy order, False for sell order
+        - price: Limit price (snapped to the tick size)
+        - quantity: Order quantity (drawn when None)
+
+        Yields:
+        - The CANCEL of the oldest order when every ID is live, then the ADD
+
+        Returns:
+        - Tuple (order_id, order record)
+        """
+        order_id = self.ids.allocate(stock_id, is_buy)
+        while order_id is None:
+            yield self.cancel(self.ids.oldest()[0])
+            order_id = self.ids.allocate(stock_id, is_buy)
+        price = self.snap(stock_id, price)
+        if quantity is None:
+            quantity = self.quantity()
+        record = self.orders[order_id] = [stock_id, is_buy, price, quantity]
+        stock_orders = self.stock_orders.get(stock_id)
+        if stock_orders is None:
+            stock_orders = self.stock_orders[stock_id] = set()
+        stock_orders.add(order_id)
+        yield {'type': 'ADD', 'stock_id': stock_id, 'order_id': order_id, 'is_buy': is_buy,
+               'price': price, 'quantity': quantity}
+        return order_id, record
+
+    def cancel(self, order_id):
+        """
+        Cancel a resting order.
+
+        Parameters:
+        - order_id: ID of the order
+
+        Returns:
+        - CANCEL row
+        """
+        stock_id, is_buy, price, quantity = self.orders.pop(order_id)
+        self.stock_orders[stock_id].discard(order_id)
+        self.ids.release(order_id)
+        return {'type': 'CANCEL', 'stock_id': stock_id, 'order_id': order_id, 'is_buy': is_buy,
+                'price': price, 'quantity': quantity}
+
+    def execute(self, order_id, quantity=None):
+        """
+        Execute part or all of a resting order.
+
+        Parameters:
+        - order_id: ID of the order
+        - quantity: Executed quantity (the whole order when None)
+
+        Returns:
+        - EXECUTE row; the order leaves the book once nothing is left
+        """
+        order = self.orders[order_id]
+        stock_id, is_buy, price, remaining = order
+        if quantity is None or quantity >= remaining:
+            quantity = remaining
+            del self.orders[order_id]
+            self.stock_orders[stock_id].discard(order_id)
+            self.ids.release(order_id)
+        else:
+            order[3] = remaining - quantity
+        return {'type': 'EXECUTE', 'stock_id': stock_id, 'order_id': order_id, 'is_buy': is_buy,
+                'price': price, 'quantity': quantity}
+
+    def live(self, order_id, record):
+        """True if order_id still names the order whose record is given."""
+        return self.orders.get(order_id) is record
+
+def sequence(*scenarios):
+    """
+    Run scenarios one after another.
+
+    Parameters:
+    - scenarios: Row iterables sharing one ScenarioMarket
+
+    Yields:
+    - Session row dictionaries
+    """
+    for scenario in scenarios:
+        yield from scenario
+
+def interleave(market, scenarios, weights=None):
+    """
+    Run scenarios concurrently, drawing each row from a random one.
+
+    Parameters:
+    - market: ScenarioMarket the scenarios share (its random generator is used)
+    - scenarios: List of row iterables
+    - weights: Optional relative rates of the scenarios
+
+    Yields:
+    - Session row dictionaries, until every scenario is exhausted
+    """
+    iterators = [iter(scenario) for scenario in scenarios]
+    weights = list(weights) if weights is not None else [1.0] * len(iterators)
+    rng = market.rng
+    while iterators:
+        index = rng.choices(range(len(iterators)), weights)[0] if len(iterators) > 1 else 0
+        try:
+            yield next(iterators[index])
+        except StopIteration:
+            del iterators[index]
+            del weights[index]
+
+def replay(market, rows):
+    """
+    Layer the rows of a generator, CSV or capture into a composed scenario.
+
+    Source order IDs are mapped to market orders, so the rows can be mixed
+    with other scenarios without clashing IDs. Rows naming an order that is
+    no longer resting (e.g. cancelled by another scenario) are dropped, and
+    a REPLACE is sent as a CANCEL followed by an ADD.
+
+    Parameters:
+    - market: ScenarioMarket
+    - rows: Iterable of session row dictionaries
+
+    Yields:
+    - Session row dictionaries
+    """
+    mapped = {}  # source order_id -> (market order_id, record)
+
+    def resting(source_id):
+        entry = mapped.pop(source_id, None)
+        if entry is not None and market.live(*entry):
+            return entry[0]
+        return None
+
+    def add(source_id, stock_id, is_buy, price, quantity):
+        mapped[source_id] = yield from market.add(stock_id, is_buy, price, quantity)
+
+    for row in rows:
+        row_type = row['type']
+        if row_type == 'ADD':
+            previous = resting(row['order_id'])
+            if previous is not None:
+                yield market.cancel(previous)
+            yield from add(row['order_id'], row['stock_id'], row['is_buy'], row['price'], row['quantity'])
+            continue
+        order_id = resting(row['order_id'])
+        if order_id is None:
+            continue
+        if row_type == 'EXECUTE':
+            yield market.execute(order_id, row['quantity'])
+            if order_id in market.orders:
+                mapped[row['order_id']] = (order_id, market.orders[order_id])
+        elif row_type == 'REPLACE':
+            stock_id, is_buy = market.orders[order_id][:2]
+            yield market.cancel(order_id)
+            yield from add(row['new_order_id'], stock_id, is_buy, row['price'], row['quantity'])
+        else:
+            yield market.cancel(order_id)
+
+def opening_auction(market, stocks=None, orders_per_stock=50, spread_ticks=20, cross_ticks=5, uncross=True):
+    """
+    Opening auction: a burst of crossing orders on every stock, then the uncross.
+
+    Orders are added round-robin across stocks with no cancels in between.
+    Buys are priced from cross_ticks above the open price down to
+    spread_ticks below it, sells from cross_ticks below up to spread_ticks
+    above, so the books cross. The uncross then executes the highest buy
+    against the lowest sell while they cross: every execution removes a
+    best price.
+
+    Parameters:
+    - market: ScenarioMarket
+    - stocks: Stock IDs (all of the symbol table by default)
+    - orders_per_stock: Orders added per stock
+    - spread_ticks, cross_ticks: Price range of the burst around the open price
+    - uncross: Execute the crossed orders after the burst
+
+    Yields:
+    - Session row dictionaries
+    """
+    stocks = list(range(len(market.symbols))) if stocks is None else list(stocks)
+    rng = market.rng
+    for _ in range(orders_per_stock):
+        for stock_id in stocks:
+            is_buy = rng.random() < 0.5
+            ticks = rng.randint(-spread_ticks, cross_ticks)
+            tick = market.tick(stock_id)
+            price = market.price(stock_id) + (ticks if is_buy else -ticks) * tick
+            yield from market.add(stock_id, is_buy, price)
+    if not uncross:
+        return
+    for stock_id in stocks:
+        while True:
+            buy, sell = market.best(stock_id, True), market.best(stock_id, False)
+            if buy is None or sell is None or market.orders[buy][2] < market.orders[sell][2]:
+                break
+            quantity = min(market.orders[buy][3], market.orders[sell][3])
+            market.prices[stock_id] = market.orders[sell][2]
+            yield market.execute(buy, quantity)
+            yield market.execute(sell, quantity)
+
+def quote_stuffing(market, stock_id=0, rows=1000, lifetime=1, offset_ticks=1):
+    """
+    Quote stuffing: rapid add/cancel churn on one stock.
+
+    Orders are added just inside the reference price on alternating sides
+    and cancelled after lifetime further orders, so the stock's book
+    changes on every row while its depth stays small.
+
+    Parameters:
+    - market: ScenarioMarket
+    - stock_id: Stock to stuff
+    - rows: Rows to emit (None for an endless stream)
+    - lifetime: Orders of the scenario resting at once
+    - offset_ticks: Distance of the quotes from the reference price
+
+    Yields:
+    - Session row dictionaries
+    """
+    live = []  # (order_id, record) of the scenario's resting orders, oldest first
+    is_buy = True
+    count = itertools.count() if rows is None else range(rows)
+    for _ in count:
+        while live and not market.live(*live[0]):
+            live.pop(0)
+        if len(live) >= lifetime:
+            order_id, _ = live.pop(0)
+            yield market.cancel(order_id)
+            continue
+        tick = market.tick(stock_id)
+        price = market.price(stock_id) + (-offset_ticks if is_buy else offset_ticks) * tick
+        live.append((yield from market.add(stock_id, is_buy, price)))
+        is_buy = not is_buy
+
+def crash_level(step, rows, drop=0.1, start=0.3, duration=0.2, recovery=0.6):
+    """
+    Flash crash price path as a fraction of the starting price.
+
+    Flat until start, a linear fall by drop over duration (fractions of
+    rows), then a linear recovery of the given share of the fall by the end.
+
+    Parameters:
+    - step: Row index
+    - rows: Length of the path
+    - drop, start, duration, recovery: Shape of the path
+
+    Returns:
+    - Price level (1.0 before the crash)
+    """
+    position = step / rows
+    if position < start:
+        return 1.0
+    end = start + duration
+    if position < end:
+        return 1.0 - drop * (position - start) / duration
+    remaining = 1.0 - end
+    return 1.0 - drop + drop * recovery * (min((position - end) / remaining, 1.0) if remaining > 0 else 1.0)
+
+def flash_crash(market, stocks=None, rows=2000, drop=0.1, start=0.3, duration=0.2, recovery=0.6, depth=20,
+                quote_ticks=5):
+    """
+    Flash crash: the reference price falls steeply and partly recovers.
+
+    Stocks are visited round-robin along crash_level(). Resting buys above
+    the new price are swept (executed in full, best first), the order
+    furthest from the price is cancelled once a stock holds depth orders,
+    and otherwise orders are quoted within quote_ticks of the price, mostly
+    sells while it falls.
+
+    Parameters:
+    - market: ScenarioMarket
+    - stocks: Stock IDs (all of the symbol table by default)
+    - rows: Length of the price path; sweeps may add rows on top
+    - drop, start, duration, recovery: Shape of the path (see crash_level)
+    - depth: Orders kept per stock
+    - quote_ticks: Distance of new quotes from the price
+
+    Yields:
+    - Session row dictionaries
+    """
+    stocks = list(range(len(market.symbols))) if stocks is None else list(stocks)
+    start_prices = {stock_id: market.price(stock_id) for stock_id in stocks}
+    rng = market.rng
+    orders = market.orders
+    for step in range(rows):
+        stock_id = stocks[step % len(stocks)]
+        level = crash_level(step, rows, drop, start, duration, recovery)
+        price = start_prices[stock_id] * level
+        market.prices[stock_id] = price
+        best_buy = market.best(stock_id, True)
+        while best_buy is not None and orders[best_buy][2] > price:
+            yield market.execute(best_buy)
+            best_buy = market.best(stock_id, True)
+        stock_orders = market.orders_of(stock_id)
+        if len(stock_orders) >= depth:
+            furthest = max(stock_orders, key=lambda order_id: abs(orders[order_id][2] - price))
+            yield market.cancel(furthest)
+            continue
+        falling = start <= step / rows < start + duration
+        is_buy = rng.random() < (0.3 if falling else 0.5)
+        ticks = rng.randint(1, quote_ticks) * market.tick(stock_id)
+        yield from market.add(stock_id, is_buy, price - ticks if is_buy else price + ticks)
+
+def one_sided_buildup(market, stock_id=0, is_buy=True, depth=None, order='ascending'):
+    """
+    One-sided build-up: add orders on one side of a stock up to the depth limit.
+
+    The board's books count orders in an 8-bit size_book, so the default
+    depth is every free order ID (255 on an empty market). With 'ascending'
+    prices each order becomes the new best, with 'descending' each one goes
+    to the bottom of the book.
+
+    Parameters:
+    - market: ScenarioMarket
+    - stock_id: Stock to build up
+    - is_buy: Side of the orders
+    - depth: Orders the stock should hold (every free ID by default)
+    - order: 'ascending', 'descending' or 'random' prices
+
+    Yields:
+    - Session row dictionaries
+    """
+    if order not in ('ascending', 'descending', 'random'):
+        raise ValueError(f"Unknown price order {order!r}")
+    if depth is None:
+        depth = len(market.orders_of(stock_id)) + len(market.ids.free)
+    tick = market.tick(stock_id)
+    base = market.price(stock_id) - (depth // 2) * tick
+    for level in itertools.count():
+        if len(market.orders_of(stock_id)) >= depth:
+            return
+        if order == 'ascending':
+            ticks = level
+        elif order == 'descending':
+            ticks = depth - level
+        else:
+            ticks = market.rng.randint(0, depth)
+        yield from market.add(stock_id, is_buy, base + ticks * tick)
+        if level >= 4 * depth:
+            return  # other scenarios keep taking orders away
+
+def cancel_storm(market, stock_id=0, is_buy=True, rows=None, refill=True):
+    """
+    Cancel storm against the best price of one side of a stock.
+
+    Each cancel removes the current best order, the worst case for
+    decrease_order, which rescans the book for the new best price. With
+    refill, every cancel is followed by an ADD at the price of the worst
+    order, so the book keeps its depth and the next cancel rescans as
+    much (prices do not drift, the side just flattens over time).
+
+    Parameters:
+    - market: ScenarioMarket
+    - stock_id: Stock to storm
+    - is_buy: Side to cancel from
+    - rows: Cancels to emit (None: until the side is empty, or endless with refill)
+    - refill: Add an order at the bottom of the side after each cancel
+
+    Yields:
+    - Session row dictionaries
+    """
+    orders = market.orders
+    count = itertools.count() if rows is None else range(rows)
+    for _ in count:
+        best = market.best(stock_id, is_buy)
+        if best is None:
+            return
+        yield market.cancel(best)
+        if refill:
+            side = market.orders_of(stock_id, is_buy)
+            if side:
+                bottom = min if is_buy else max
+                price = bottom(orders[order_id][2] for order_id in side)
+            else:
+                price = market.price(stock_id)
+            yield from market.add(stock_id, is_buy, price)
+
+SCENARIOS = {
+    'opening_auction': opening_auction,
+    'quote_stuffing': quote_stuffing,
+    'flash_crash': flash_crash,
+    'one_sided_buildup': one_sided_buildup,
+    'cancel_storm': cancel_storm,
+}
+
+def parse_scenario(spec):
+    """
+    Parse a command line scenario such as 'cancel_storm:stock_id=1,rows=500'.
+
+    Parameters:
+    - spec: Scenario name, optionally followed by ':' and comma-separated
+      parameter=value pairs (values are Python literals, or strings)
+
+    Returns:
+    - Tuple (scenario function, keyword arguments)
+    """
+    import ast
+
+    name, _, params = spec.partition(':')
+    if name not in SCENARIOS:
+        raise ValueError(f"Unknown scenario {name!r} (choose from {', '.join(SCENARIOS)})")
+    kwargs = {}
+    for param in filter(None, params.split(',')):
+        key, _, value = param.partition('=')
+        try:
+            kwargs[key] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            kwargs[key] = value
+    return SCENARIOS[name], kwargs
+
+def worst_case_program(market, rows=2000):
+    """
+    Tour of the board's worst-case paths, as one composed scenario.
+
+    An opening auction on every stock, then quote stuffing on stock 0
+    during a flash crash of the others, then a build-up of stock 0's buy
+    side to the depth limit and a cancel storm against its best price.
+
+    Parameters:
+    - market: ScenarioMarket
+    - rows: Scale of the stuffing, crash and storm phases
+
+    Yields:
+    - Session row dictionaries
+    """
+    stocks = list(range(len(market.symbols)))
+    return sequence(
+        opening_auction(market, stocks),
+        interleave(market, [quote_stuffing(market, stocks[0], rows),
+                            flash_crash(market, stocks[1:] or stocks, rows)]),
+        one_sided_buildup(market, stocks[0]),
+        cancel_storm(market, stocks[0], rows=rows),
+    )
+
+def main():
+    """
+    Command line entry point: stream a composed stress scenario to a session CSV.
+    """
+    import argparse
+
+    from config_manager import load_config
+    from market_data_gen_new import save_to_csv
+    from symbol_table import load_symbol_table
+
+    parser = argparse.ArgumentParser(description="Write a stress scenario session CSV")
+    parser.add_argument("output", help="Session CSV to write")
+    parser.add_argument("scenarios", nargs="*",
+                        help="Scenarios as name[:param=value,...] (default: the worst-case tour); "
+                             f"names: {', '.join(SCENARIOS)}")
+    parser.add_argument("--interleave", action="store_true", help="Run the scenarios concurrently")
+    parser.add_argument("--rows", type=int, default=2000, help="Scale of the worst-case tour")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--config", default="config.ini", help="Config file for the symbol table and quantities")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    market = ScenarioMarket(load_symbol_table(config), args.seed, config["quantity_min"], config["quantity_max"])
+    if not args.scenarios:
+        rows = worst_case_program(market, args.rows)
+    else:
+        scenarios = []
+        for spec in args.scenarios:
+            scenario, kwargs = parse_scenario(spec)
+            scenarios.append(scenario(market, **kwargs))
+        rows = interleave(market, scenarios) if args.interleave else sequence(*scenarios)
+    save_to_csv(rows, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+# Baselines used by the original 4-stock setup (stock_id -> price)
+DEFAULT_BASELINE_PRICES = [100.0, 50.0, 200.0, 80.0]
+DEFAULT_TICK_SIZE = 0.01
+
+SYMBOL_LENGTH = 8  # ITCH symbols are 8 bytes, space padded
+
+def format_symbol(symbol):
+    """
+    Convert a symbol to its 8-byte ITCH representation.
+
+    Parameters:
+    - symbol: Symbol as str or bytes
+
+    Returns:
+    - 8-byte bytes object, right padded with spaces
+    """
+    if isinstance(symbol, str):
+        symbol = symbol.encode('ascii')
+    symbol = bytes(symbol)
+    if len(symbol) > SYMBOL_LENGTH:
+        raise ValueError(f"Symbol {symbol!r} is longer than {SYMBOL_LENGTH} bytes")
+    return symbol + b' ' * (SYMBOL_LENGTH - len(symbol))
+
+def default_symbol(stock_id):
+    """
+    Get the symbol historically used for a stock ID (STOCK00, STOCK01, ...).
+
+    IDs from 100 on do not fit that pattern in 8 bytes and get S0000100,
+    S0000101, ... instead, as in the synthetic table.
+
+    Parameters:
+    - stock_id: Stock identifier
+
+    Returns:
+    - 8-byte symbol
+    """
+    if stock_id < 100:
+        return format_symbol(f"STOCK{stock_id:02d}")
+    return format_symbol(f"S{stock_id:07d}")
+
+class SymbolTable:
+    """
+    Maps dense stock IDs (0..N-1) to ITCH symbols, tick sizes and baseline prices.
+
+    All per-stock attributes are stored in plain lists indexed by stock ID,
+    so lookups stay O(1) and the table scales to thousands of instruments.
+    """
+
+    def __init__(self):
+        """Initialize an empty symbol table."""
+        self.symbols = []  # stock_id -> 8-byte symbol
+        self.tick_sizes = []  # stock_id -> tick size
+        self.baseline_prices = []  # stock_id -> baseline price
+        self.ids_by_symbol = {}  # 8-byte symbol -> stock_id
+
+    def add(self, symbol, tick_size=DEFAULT_TICK_SIZE, baseline_price=100.0):
+        """
+        Append a new instrument with the next dense stock ID.
+
+        Parameters:
+        - symbol: Symbol as str or bytes (up to 8 characters)
+        - tick_size: Minimum price increment
+        - baseline_price: Reference price used by the generators
+
+        Returns:
+        - The stock ID assigned to the instrument
+        """
+        symbol = format_symbol(symbol)
+        if symbol in self.ids_by_symbol:
+            raise ValueError(f"Duplicate symbol {symbol!r}")
+        if tick_size <= 0:
+            raise ValueError(f"Tick size for {symbol!r} must be positive")
+
+        stock_id = len(self.symbols)
+        self.symbols.append(symbol)
+        self.tick_sizes.append(float(tick_size))
+        self.baseline_prices.append(float(baseline_price))
+        self.ids_by_symbol[symbol] = stock_id
+        return stock_id
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, stock_id):
+        return 0 <= stock_id < len(self.symbols)
+
+    def stock_ids(self):
+        """
+        Get all stock IDs in the table.
+
+        Returns:
+        - range over the dense stock IDs
+        """
+        return range(len(self.symbols))
+
+    def symbol(self, stock_id):
+        """
+        Get the 8-byte ITCH symbol for a stock ID.
+
+        Parameters:
+        - stock_id: Stock identifier
+
+        Returns:
+        - 8-byte symbol (falls back to STOCKnn for unknown IDs)
+        """
+        if 0 <= stock_id < len(self.symbols):
+            return self.symbols[stock_id]
+        return default_symbol(stock_id)
+
+    def name(self, stock_id):
+        """
+        Get the display name (symbol without padding) for a stock ID.
+
+        Parameters:
+        - stock_id: Stock identifier
+
+        Returns:
+        - Symbol as a stripped string
+        """
+        return self.symbol(stock_id).decode('ascii').rstrip()
+
+    def stock_id(self, symbol):
+        """
+        Look up the stock ID for a symbol.
+
+        Parameters:
+        - symbol: Symbol as str or bytes
+
+        Returns:
+        - The stock ID or None if the symbol is unknown
+        """
+        return self.ids_by_symbol.get(format_symbol(symbol))
+
+    def tick_size(self, stock_id):
+        """Get the tick size for a stock ID."""
+        return self.tick_sizes[stock_id]
+
+    def baseline_price(self, stock_id):
+        """Get the baseline price for a stock ID."""
+        return self.baseline_prices[stock_id]
+
+    @classmethod
+    def default(cls, num_stocks=4, price_min=50.0, price_max=200.0):
+        """
+        Build a synthetic table with STOCKnn symbols.
+
+        The first four stocks keep their historical baselines; any further
+        stocks get baselines spread deterministically across the price range.
+
+        Parameters:
+        - num_stocks: Number of instruments
+        - price_min: Lowest baseline price for generated stocks
+        - price_max: Highest baseline price for generated stocks
+
+        Returns:
+        - A populated SymbolTable
+        """
+        table = cls()
+        span = price_max - price_min
+        for stock_id in range(num_stocks):
+            if stock_id < len(DEFAULT_BASELINE_PRICES):
+                baseline = DEFAULT_BASELINE_PRICES[stock_id]
+            else:
+                # Golden-ratio stepping spreads prices evenly without clustering
+                baseline = round(price_min + span * ((stock_id * 0.6180339887) % 1.0), 2)
+            table.add(default_symbol(stock_id), DEFAULT_TICK_SIZE, baseline)
+        return table
+
+    @classmethod
+    def from_file(cls, filename):
+        """
+        Load a symbol table from a CSV file.
+
+        The file needs the columns stock_id, symbol, tick_size and
+        baseline_price. Stock IDs must be dense, i.e. 0..N-1 in any order.
+
+        Parameters:
+        - filename: Path to the CSV file
+
+        Returns:
+        - A populated SymbolTable
+        """
+        import csv
+
+        rows = []
+        with open(filename, 'r', newline='') as csvfile:
+            reader = csv.DictReader(csvfile)
+            for row in reader:
+                rows.append((
+                    int(row['stock_id']),
+                    row['symbol'].strip(),
+                    float(row.get('tick_size') or DEFAULT_TICK_SIZE),
+                    float(row['baseline_price'])
+                ))
+
+        rows.sort(key=lambda r: r[0])
+        table = cls()
+        for expected_id, (stock_id, symbol, tick_size, baseline) in enumerate(rows):
+            if stock_id != expected_id:
+                raise ValueError(f"Stock IDs in {filename} must be dense (missing {expected_id})")
+            table.add(symbol, tick_size, baseline)
+        return table
+
+    def save(self, filename):
+        """
+        Save the symbol table to a CSV file readable by from_file().
+
+        Parameters:
+        - filename: Output CSV filename
+        """
+        import csv
+
+        with open(filename, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['stock_id', 'symbol', 'tick_size', 'baseline_price'])
+            for stock_id in self.stock_ids():
+                writer.writerow([
+                    stock_id,
+                    self.name(stock_id),
+                    self.tick_sizes[stock_id],
+                    self.baseline_prices[stock_id]
+                ])
+
+def load_symbol_table(config):
+    """
+    Build the symbol table described by a configuration dictionary.
+
+    Uses config["symbol_file"] when set, otherwise a default table with
+    config["num_stocks"] instruments.
+
+    Parameters:
+    - config: Configuration dictionary
+
+    Returns:
+    - A populated SymbolTable
+    """
+    symbol_file = config.get("symbol_file", "")
+    if symbol_file:
+        return SymbolTable.from_file(symbol_file)
+    return SymbolTable.default(
+        config.get("num_stocks", 4),
+        config.get("price_min", 50.0),
+        config.get("price_max", 200.0)
+    )
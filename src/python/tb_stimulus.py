@@ -0,0 +1,367 @@
+import heapq
+import os
+import struct
+
+from itch_codec import BOARD, BOARD_BUY, BOARD_SELL, board_price
+from symbol_table import default_symbol, format_symbol
+
+# request values driven by parser_top (`ADD_ORDER etc. in constants.v)
+PARSER_CANCEL_ORDER = 0
+PARSER_ADD_ORDER = 1
+PARSER_EXECUTE_ORDER = 2
+
+NUM_BOOKS = 4  # `NUM_STOCKS in constants.v; stock_identifier is 2 bits
+UART_CLK_FREQ = 100000000  # uart_rx defaults
+UART_BAUD_RATE = 115200
+CHUNK_ROWS = 65536  # rows encoded and written per chunk
+
+# Expected parser output per message, byte aligned so the hex stays readable:
+# request, stock_identifier, order_type_out_add, order_id, quantity, order_to_add
+PARSER_RECORD = struct.Struct('>BBBBBI')
+# Expected order book state after each message: stock, size_book, best_price_o
+BOOK_RECORD = struct.Struct('>BBH')
+
+_ADD = BOARD.codec('A')
+_CANCEL = BOARD.codec('X')
+_EXECUTE = BOARD.codec('E')
+
+def board_rows(rows):
+    """
+    Reduce session rows to the messages parser_top has a tested path for.
+
+    The parser only extracts fields for ADD (0x82), CANCEL (0xA1) and
+    EXECUTE (0x2A); the order book deletes the whole order on CANCEL. A
+    DELETE is therefore sent as a CANCEL and a REPLACE as a CANCEL of the
+    original order followed by an ADD of the new one, which leaves the book
+    in the same state.
+
+    Parameters:
+    - rows: Iterable of session row dictionaries
+
+    Yields:
+    - (type, row, rewritten) tuples with type 'ADD', 'CANCEL' or 'EXECUTE';
+      rewritten is True for messages standing in for a DELETE or REPLACE
+    """
+    for row in rows:
+        row_type = row['type']
+        if row_type == 'ADD' or row_type == 'CANCEL' or row_type == 'EXECUTE':
+            yield row_type, row, False
+        elif row_type == 'DELETE':
+            yield 'CANCEL', row, True
+        elif row_type == 'REPLACE':
+            yield 'CANCEL', row, True
+            yield 'ADD', dict(row, order_id=row['new_order_id']), True
+        else:
+            raise ValueError(f"Unsupported row type {row_type!r}")
+
+def encode_frame(row_type, row, index, symbol=None):
+    """
+    Encode one row as a board frame with a reproducible header.
+
+    The tracking number and timestamp are derived from the message index
+    instead of the clock, so the same session always yields the same files.
+
+    Parameters:
+    - row_type: 'ADD', 'CANCEL' or 'EXECUTE'
+    - row: Session row dictionary
+    - index: Message index in the stimulus
+    - symbol: 8-byte symbol for ADD orders (defaults to STOCKnn)
+
+    Returns:
+    - bytes containing the frame
+    """
+    stock_id = row['stock_id']
+    quantity = row.get('quantity')
+    quantity = quantity if quantity is not None else 0
+    header = (stock_id, (index + 1) & 0xFFFF, index)
+    if row_type == 'ADD':
+        if symbol is None:
+            symbol = default_symbol(stock_id)
+        return _ADD.encode(header + (row['order_id'], BOARD_BUY if row['is_buy'] else BOARD_SELL,
+                                     quantity, symbol, board_price(row['price'])))
+    codec = _CANCEL if row_type == 'CANCEL' else _EXECUTE
+    return codec.encode(header + (row['order_id'], quantity))
+
+def parse_stream(data):
+    """
+    Reference model of parser_top: the outputs it latches for a byte stream.
+
+    Fields are read from the same byte offsets the RTL slices out of its
+    shift register, truncated to the output widths: the low two bits of
+    the stock locate, the low byte of the order reference and shares, and
+    the low 16 bits (8.8 fixed point) of the price.
+
+    Parameters:
+    - data: bytes holding consecutive board frames
+
+    Yields:
+    - (request, stock_identifier, order_type_out_add, order_id, quantity,
+      order_to_add) for each message that raises out_ready
+    """
+    offset = 0
+    end = len(data)
+    while offset < end:
+        length = data[offset]
+        if length == 0:
+            offset += 1  # idle byte
+            continue
+        opcode = data[offset + 1]
+        stock = data[offset + 2] & 0x3
+        order_id = data[offset + 12]
+        if opcode == 0x82 or opcode == 0x86:
+            quantity = data[offset + 21]
+            price = data[offset + 33] | data[offset + 34] << 8
+            yield (PARSER_ADD_ORDER, stock, 1 if data[offset + 20] == 0x41 else 0, order_id, quantity,
+                   quantity << 24 | order_id << 16 | price)
+        elif opcode == 0xA1 or opcode == 0x2A:
+            quantity = data[offset + 20]
+            yield (PARSER_CANCEL_ORDER if opcode == 0xA1 else PARSER_EXECUTE_ORDER, stock, 0, order_id, quantity,
+                   quantity << 24 | order_id << 16)
+        offset += length
+
+class BookReference:
+    """
+    Reference model of order_book_wrapper: one book per stock_identifier.
+
+    Each order_book is a max-heap over every resting order of its stock
+    (both sides), reporting the highest 8.8 price and the number of orders.
+    ADD inserts, CANCEL deletes the order and EXECUTE reduces it, deleting
+    it once nothing is left. Heaps are pruned lazily, so each message costs
+    O(log n).
+    """
+
+    def __init__(self, num_books=NUM_BOOKS):
+        """
+        Initialize empty books.
+
+        Parameters:
+        - num_books: Number of order_book instances
+        """
+        self.orders = [{} for _ in range(num_books)]  # order_id -> [price, quantity]
+        self.heaps = [[] for _ in range(num_books)]  # (-price, order_id)
+
+    @property
+    def valid(self):
+        """True while every book holds an order (best_price_valid of the wrapper)."""
+        return all(self.orders)
+
+    def apply(self, request, stock, order_id, quantity, price):
+        """
+        Apply one parser output.
+
+        Parameters:
+        - request: PARSER_ADD_ORDER, PARSER_CANCEL_ORDER or PARSER_EXECUTE_ORDER
+        - stock: stock_identifier
+        - order_id: 8-bit order ID
+        - quantity: 8-bit quantity
+        - price: 16-bit price (ADD only)
+
+        Returns:
+        - Tuple (size_book, best_price_o) of the stock's book afterwards
+        """
+        orders = self.orders[stock]
+        heap = self.heaps[stock]
+        if request == PARSER_ADD_ORDER:
+            orders[order_id] = [price, quantity]
+            heapq.heappush(heap, (-price, order_id))
+        elif request == PARSER_CANCEL_ORDER:
+            orders.pop(order_id, None)
+        else:
+            order = orders.get(order_id)
+            if order is not None:
+                order[1] -= quantity
+                if order[1] <= 0:
+                    del orders[order_id]
+        while heap:
+            order = orders.get(heap[0][1])
+            if order is not None and order[0] == -heap[0][0]:
+                break
+            heapq.heappop(heap)
+        return len(orders) & 0xFF, -heap[0][0] if heap else 0
+
+def clocks_per_bit(clk_freq=UART_CLK_FREQ, baud_rate=UART_BAUD_RATE):
+    """
+    Clock cycles per UART bit, rounded as uart_rx computes CYCLES_PER_BIT.
+
+    Parameters:
+    - clk_freq: Clock frequency in Hz
+    - baud_rate: Baud rate
+
+    Returns:
+    - Integer cycles per bit
+    """
+    return (clk_freq + baud_rate // 2) // baud_rate
+
+def uart_table(samples_per_bit=1, idle_bits=1):
+    """
+    Precompute the serialised form of every byte value.
+
+    Each character is a start bit (0), eight data bits LSB first and a stop
+    bit (1), followed by idle_bits idle (1) bits; every bit is written as
+    samples_per_bit lines of one hex digit.
+
+    Parameters:
+    - samples_per_bit: Lines per bit (1 for one line per bit time, or
+      clocks_per_bit() for one line per clock)
+    - idle_bits: Idle bit times between characters
+
+    Returns:
+    - List of 256 strings
+    """
+    table = []
+    for value in range(256):
+        bits = [0] + [(value >> bit) & 1 for bit in range(8)] + [1] * (1 + idle_bits)
+        table.append(''.join(f"{bit}\n" * samples_per_bit for bit in bits))
+    return table
+
+def write_stimulus(rows, prefix, symbol_table=None, uart=False, clk_freq=UART_CLK_FREQ,
+                   baud_rate=UART_BAUD_RATE, samples_per_bit=1, idle_bits=1, chunk_rows=CHUNK_ROWS):
+    """
+    Write $readmemh stimulus and expected-output files for a session.
+
+    Rows are encoded, checked against the reference models and written a
+    chunk at a time, so memory stays flat however long the session is.
+    Files written (all one value per line, hex):
+    - <prefix>_bytes.mem: parser_top data_in bytes, one per in_ready pulse
+    - <prefix>_parser.mem: expected parser outputs per message (PARSER_RECORD)
+    - <prefix>_book.mem: expected order book state per message (BOOK_RECORD)
+    - <prefix>_uart.mem: (with uart) the same bytes as uart_rx input bits
+    - <prefix>_params.vh: `defines with the counts and UART timing
+
+    Parameters:
+    - rows: Iterable of session row dictionaries (a list, SessionColumns or generator)
+    - prefix: Output path prefix
+    - symbol_table: Optional SymbolTable supplying ADD order symbols
+    - uart: If True, also write the UART bit stream
+    - clk_freq, baud_rate: UART timing; CLKS_PER_BIT is derived as in uart_rx
+    - samples_per_bit: Lines per bit in the UART stream
+    - idle_bits: Idle bit times between UART characters
+    - chunk_rows: Rows encoded per chunk
+
+    Returns:
+    - Dictionary of rows, messages, rewritten, bytes and uart_samples counts
+    """
+    stats = {'rows': 0, 'messages': 0, 'rewritten': 0, 'bytes': 0, 'uart_samples': 0}
+    book = BookReference()
+    table = uart_table(samples_per_bit, idle_bits) if uart else None
+    samples_per_char = (10 + idle_bits) * samples_per_bit
+    directory = os.path.dirname(prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    files = {name: open(f"{prefix}_{name}.mem", 'w') for name in (['bytes', 'parser', 'book'] + (['uart'] if uart else []))}
+    try:
+        frames = []
+        symbols = {}  # stock_id -> 8-byte symbol
+        for row_type, row, rewritten in board_rows(_counted(rows, stats)):
+            stats['rewritten'] += rewritten
+            symbol = None
+            if row_type == 'ADD':
+                symbol = symbols.get(row['stock_id'])
+                if symbol is None:
+                    stock_id = row['stock_id']
+                    symbol = symbols[stock_id] = format_symbol(symbol_table.symbol(stock_id)) \
+                        if symbol_table is not None else default_symbol(stock_id)
+            frames.append(encode_frame(row_type, row, stats['messages'] + len(frames), symbol))
+            if len(frames) >= chunk_rows:
+                _write_chunk(files, b''.join(frames), len(frames), book, table, samples_per_char, stats)
+                frames = []
+        if frames:
+            _write_chunk(files, b''.join(frames), len(frames), book, table, samples_per_char, stats)
+    finally:
+        for f in files.values():
+            f.close()
+
+    with open(f"{prefix}_params.vh", 'w') as f:
+        f.write(f"// Generated by tb_stimulus.py\n"
+                f"`define TB_STIM_BYTES {stats['bytes']}\n"
+                f"`define TB_STIM_MESSAGES {stats['messages']}\n"
+                f"`define TB_STIM_UART_SAMPLES {stats['uart_samples']}\n"
+                f"`define TB_UART_CLK_FREQ {clk_freq}\n"
+                f"`define TB_UART_BAUD_RATE {baud_rate}\n"
+                f"`define TB_UART_CLKS_PER_BIT {clocks_per_bit(clk_freq, baud_rate)}\n"
+                f"`define TB_UART_SAMPLES_PER_BIT {samples_per_bit}\n")
+    return stats
+
+def _counted(rows, stats):
+    for row in rows:
+        stats['rows'] += 1
+        yield row
+
+def _write_chunk(files, data, count, book, table, samples_per_char, stats):
+    # bytes.hex(sep) formats the whole chunk in C
+    files['bytes'].write(data.hex('\n') + '\n')
+    parser_lines = []
+    book_lines = []
+    pack_parser = PARSER_RECORD.pack
+    pack_book = BOOK_RECORD.pack
+    apply = book.apply
+    messages = 0
+    for request, stock, order_type, order_id, quantity, order_to_add in parse_stream(data):
+        parser_lines.append(pack_parser(request, stock, order_type, order_id, quantity, order_to_add).hex())
+        size, best = apply(request, stock, order_id, quantity, order_to_add & 0xFFFF)
+        book_lines.append(pack_book(stock, size, best).hex())
+        messages += 1
+    if messages != count:
+        raise ValueError(f"Reference parser produced {messages} outputs for {count} frames")
+    files['parser'].write('\n'.join(parser_lines) + '\n')
+    files['book'].write('\n'.join(book_lines) + '\n')
+    if table is not None:
+        files['uart'].write(''.join(map(table.__getitem__, data)))
+        stats['uart_samples'] += len(data) * samples_per_char
+    stats['messages'] += count
+    stats['bytes'] += len(data)
+
+def main():
+    """
+    Command line entry point: write testbench vectors for a CSV or generated session.
+    """
+    import argparse
+
+    from config_manager import load_config
+    from symbol_table import load_symbol_table
+
+    parser = argparse.ArgumentParser(description="Write $readmemh stimulus and expected outputs for "
+                                                 "parser_top_tb / uart_top_tb")
+    parser.add_argument("source", help="Session CSV, or 'generator' / 'realistic' / 'stress' to generate one")
+    parser.add_argument("prefix", help="Output path prefix")
+    parser.add_argument("--rows", type=int, default=1500,
+                        help="Rows for 'generator', ADD rows per stock for 'realistic', "
+                             "scale of the worst-case tour for 'stress'")
+    parser.add_argument("--config", default="config.ini", help="Config file for 'generator' and the symbol table")
+    parser.add_argument("--uart", action="store_true", help="Also write the uart_rx input bit stream")
+    parser.add_argument("--clk-freq", type=int, default=UART_CLK_FREQ)
+    parser.add_argument("--baud-rate", type=int, default=UART_BAUD_RATE)
+    parser.add_argument("--per-clock", action="store_true",
+                        help="Write one UART sample per clock instead of one per bit")
+    parser.add_argument("--idle-bits", type=int, default=1, help="Idle bit times between UART characters")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    symbol_table = load_symbol_table(config)
+    if args.source == 'generator':
+        from market_data_generator import generate_market_data
+        rows = generate_market_data(args.rows, config, symbol_table)
+    elif args.source == 'realistic':
+        from market_data_gen_new import generate_realistic_market_data
+        rows = generate_realistic_market_data(number_of_stocks=len(symbol_table), rows_per_stock=args.rows,
+                                              symbol_table=symbol_table,
+                                              execute_probability=config["execute_probability"],
+                                              replace_probability=config["replace_probability"])
+    elif args.source == 'stress':
+        from stress_scenarios import ScenarioMarket, worst_case_program
+        market = ScenarioMarket(symbol_table, quantity_min=config["quantity_min"],
+                                quantity_max=config["quantity_max"])
+        rows = worst_case_program(market, args.rows)
+    else:
+        from session_columns import load_session_csv
+        rows = load_session_csv(args.source)
+
+    samples_per_bit = clocks_per_bit(args.clk_freq, args.baud_rate) if args.per_clock else 1
+    stats = write_stimulus(rows, args.prefix, symbol_table, uart=args.uart, clk_freq=args.clk_freq,
+                           baud_rate=args.baud_rate, samples_per_bit=samples_per_bit, idle_bits=args.idle_bits)
+    print(f"{stats['rows']} rows -> {stats['messages']} messages ({stats['rewritten']} rewritten), "
+          f"{stats['bytes']} bytes, {stats['uart_samples']} UART samples")
+
+if __name__ == "__main__":
+    main()
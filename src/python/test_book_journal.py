@@ -0,0 +1,153 @@
+import random
+
+import pytest
+
+from book_journal import BookJournal, JOURNAL_RECORD, book_to_packets, read_journal, recover
+from stock_book import StockBook
+
+def state(book):
+    # Orders plus each side's order, which carries time priority at equal prices
+    sides = {(stock_id, is_buy): [entry["order_id"] for entry in entries]
+             for is_buy, side in ((True, book.buy_orders), (False, book.sell_orders))
+             for stock_id, entries in side.items() if entries}
+    return book.orders, sides
+
+def crash(journal):
+    # Stop without the closing snapshot, as a killed process would
+    journal.flush()
+    journal.file.close()
+
+def random_flow(journal, rng, count, reference=None):
+    for _ in range(count):
+        live = list(journal.book.orders)
+        draw = rng.random()
+        if live and draw < 0.2:
+            order_id = rng.choice(live)
+            journal.remove_order(order_id)
+            if reference is not None:
+                reference.remove_order(order_id)
+        elif live and draw < 0.35:
+            order_id, quantity = rng.choice(live), rng.randint(1, 20)
+            journal.execute_order(order_id, quantity)
+            if reference is not None:
+                reference.execute_order(order_id, quantity)
+        elif live and draw < 0.45:
+            order_id, new_order_id = rng.choice(live), rng.randint(1, 10**6)
+            price, quantity = round(rng.uniform(50, 60), 2), rng.randint(1, 20)
+            if new_order_id not in journal.book.orders:
+                journal.replace_order(order_id, new_order_id, price, quantity)
+                if reference is not None:
+                    reference.replace_order(order_id, new_order_id, price, quantity)
+        else:
+            order_id = rng.randint(1, 10**6)
+            if order_id in journal.book.orders:
+                continue
+            stock_id, is_buy = rng.randrange(4), rng.random() < 0.5
+            price, quantity = round(rng.uniform(50, 60), 1), rng.randint(1, 20)
+            journal.add_order(order_id, stock_id, is_buy, price, quantity)
+            if reference is not None:
+                reference.add_order(order_id, stock_id, is_buy, price, quantity)
+
+@pytest.fixture
+def files(tmp_path):
+    return str(tmp_path / "book.journal"), str(tmp_path / "book.snapshot")
+
+def test_snapshot_round_trip():
+    book = StockBook()
+    book.add_order(1, 0, True, 10.0, 5)
+    book.add_order(2, 0, True, 10.0, 6)
+    book.add_order(3, 0, True, 11.0, 7)
+    book.add_order(4, 2, False, 9.5, 8)
+    restored, sequence = StockBook.from_snapshot(book.to_snapshot(42))
+    assert sequence == 42
+    assert state(restored) == state(book)
+    assert [entry["order_id"] for entry in restored.buy_orders[0]] == [3, 1, 2]
+
+def test_bad_snapshots():
+    data = StockBook().to_snapshot()
+    with pytest.raises(ValueError):
+        StockBook.from_snapshot(b'X' + data[1:])
+    book = StockBook()
+    book.add_order(1, 0, True, 10.0, 5)
+    with pytest.raises(ValueError):
+        StockBook.from_snapshot(book.to_snapshot()[:-1])
+
+def test_recovery_after_crash(files):
+    rng = random.Random(1)
+    journal = BookJournal(*files, snapshot_interval=0)
+    random_flow(journal, rng, 2000)
+    expected = state(journal.book)
+    sequence = journal.sequence
+    crash(journal)
+    book, recovered_sequence, replayed = recover(*files)
+    assert state(book) == expected
+    assert recovered_sequence == replayed == sequence
+
+def test_recovery_replays_only_the_tail(files):
+    rng = random.Random(2)
+    journal = BookJournal(*files, snapshot_interval=500)
+    random_flow(journal, rng, 2000)
+    expected = state(journal.book)
+    sequence = journal.sequence
+    crash(journal)
+    book, recovered_sequence, replayed = recover(*files)
+    assert state(book) == expected
+    assert recovered_sequence == sequence
+    assert replayed < 500
+
+def test_journal_matches_plain_book(files):
+    rng = random.Random(3)
+    reference = StockBook()
+    journal = BookJournal(*files, snapshot_interval=300)
+    random_flow(journal, rng, 2000, reference)
+    assert state(journal.book) == state(reference)
+    journal.close()
+    reopened = BookJournal(*files)
+    assert reopened.replayed == 0
+    assert state(reopened.book) == state(reference)
+    reopened.close()
+
+def test_torn_record_is_dropped(files):
+    journal = BookJournal(*files, snapshot_interval=0)
+    for order_id in range(1, 6):
+        journal.add_order(order_id, 0, True, 10.0 + order_id, 5)
+    crash(journal)
+    with open(files[0], 'ab') as f:
+        f.write(bytes(JOURNAL_RECORD.size // 2))
+    assert [record[0] for record in read_journal(files[0])] == [1, 2, 3, 4, 5]
+
+    # Records written after recovering must not land behind the torn one
+    journal = BookJournal(*files, snapshot_interval=0)
+    assert journal.sequence == 5
+    journal.add_order(100, 0, True, 20.0, 5)
+    journal.remove_order(1)
+    crash(journal)
+    book, sequence, _ = recover(*files)
+    assert sorted(book.orders) == [2, 3, 4, 5, 100]
+    assert sequence == 7
+
+def test_not_a_journal(files):
+    with open(files[0], 'wb') as f:
+        f.write(b'NOTAJOURNAL' + bytes(32))
+    with pytest.raises(ValueError):
+        list(read_journal(files[0]))
+
+def test_unknown_orders(files):
+    journal = BookJournal(*files)
+    assert not journal.remove_order(1)
+    assert journal.reduce_order(1, 5) is None
+    assert journal.execute_order(1, 5) == 0
+    assert not journal.replace_order(1, 2, 10.0, 5)
+    assert journal.sequence == 0
+    journal.add_order(1, 0, True, 10.0, 5)
+    assert journal.execute_order(1, 8) == 5
+    assert journal.book.orders == {}
+    journal.close()
+
+def test_book_to_packets_keeps_insertion_order():
+    book = StockBook()
+    book.add_order(7, 1, False, 10.0, 5)
+    book.add_order(3, 0, True, 11.0, 6)
+    packets = book_to_packets(book)
+    assert [packet['order_id'] for packet in packets] == [7, 3]
+    assert packets[1] == {'type': 'ADD', 'stock_id': 0, 'order_id': 3, 'is_buy': True, 'price': 11.0, 'quantity': 6}
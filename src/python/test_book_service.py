@@ -0,0 +1,128 @@
+import random
+import struct
+
+import pytest
+
+from book_service import BookService, ShmRing, COMMAND, OP_ADD
+from stock_book import StockBook
+
+@pytest.fixture
+def ring():
+    ring = ShmRing(4)
+    yield ring
+    ring.close(unlink=True)
+
+def best(side):
+    return None if side is None else (side["price"], side["quantity"])
+
+def test_ring_is_fifo_across_wraparound(ring):
+    for round_start in range(0, 12, 3):
+        for order_id in range(round_start, round_start + 3):
+            assert ring.push(OP_ADD, order_id, 0, 1, 10.0, 5)
+        assert ring.pending() == 3
+        commands = ring.peek_batch()
+        assert [command[1] for command in commands] == list(range(round_start, round_start + 3))
+        ring.consume(len(commands))
+    assert ring.pending() == 0
+    assert ring.peek_batch() == []
+
+def test_full_ring_refuses_pushes(ring):
+    for order_id in range(4):
+        assert ring.push(OP_ADD, order_id, 0, 1, 10.0, 5)
+    assert not ring.push(OP_ADD, 4, 0, 1, 10.0, 5)
+    ring.consume(1)
+    assert ring.push(OP_ADD, 4, 0, 1, 10.0, 5)
+
+def test_peek_does_not_consume(ring):
+    ring.push(OP_ADD, 1, 0, 1, 10.0, 5)
+    assert ring.peek_batch() == ring.peek_batch() == [(OP_ADD, 1, 0, 1, 10.0, 5)]
+    assert ring.pending() == 1
+
+def test_attach_by_name(ring):
+    consumer = ShmRing(name=ring.name)
+    try:
+        assert consumer.capacity == ring.capacity
+        ring.push(OP_ADD, 7, 3, 0, 12.5, 9)
+        assert consumer.peek_batch() == [(OP_ADD, 7, 3, 0, 12.5, 9)]
+        consumer.consume(1)
+        assert ring.pending() == 0
+        assert not consumer.stop_requested()
+        ring.request_stop()
+        assert consumer.stop_requested()
+    finally:
+        consumer.close()
+
+def test_custom_record():
+    record = struct.Struct('<Id')
+    ring = ShmRing(8, record=record)
+    try:
+        assert COMMAND.size != record.size
+        ring.push(3, 1.5)
+        assert ring.peek_batch() == [(3, 1.5)]
+    finally:
+        ring.close(unlink=True)
+
+@pytest.fixture
+def service():
+    # A tiny ring forces commands through the backlog
+    service = BookService(num_workers=2, max_stocks=8, ring_capacity=16)
+    yield service
+    service.close()
+
+def test_stock_outside_the_table(service):
+    with pytest.raises(ValueError):
+        service.add_order(1, 8, True, 10.0, 5)
+
+def test_order_tracking(service):
+    service.add_order(1, 0, True, 10.0, 5)
+    assert service.execute_order(1, 2)
+    assert service.orders[1] == [0, True, 3]
+    assert service.replace_order(1, 2, 11.0, 4)
+    assert list(service.orders) == [2]
+    assert service.orders[2] == [0, True, 4]
+    assert service.reduce_order(2, 4)
+    assert service.orders == {}
+    assert not service.reduce_order(2, 1)
+    assert not service.replace_order(2, 3, 11.0, 4)
+    assert not service.remove_order(9)
+    assert service.wait_idle()
+    assert service.get_all_stocks() == []
+
+def test_matches_stock_book(service):
+    rng = random.Random(7)
+    book = StockBook()
+    live = []
+    next_id = 1
+    for _ in range(3000):
+        draw = rng.random()
+        if live and draw < 0.2:
+            order_id = live.pop(rng.randrange(len(live)))
+            assert service.remove_order(order_id) == book.remove_order(order_id)
+        elif live and draw < 0.35:
+            order_id = rng.choice(live)
+            quantity = rng.randint(1, 20)
+            assert service.execute_order(order_id, quantity)
+            if book.reduce_order(order_id, quantity) == 0:
+                live.remove(order_id)
+        elif live and draw < 0.45:
+            order_id = live.pop(rng.randrange(len(live)))
+            price, quantity = round(rng.uniform(50, 60), 2), rng.randint(1, 20)
+            assert service.replace_order(order_id, next_id, price, quantity)
+            assert book.replace_order(order_id, next_id, price, quantity)
+            live.append(next_id)
+            next_id += 1
+        else:
+            stock_id, is_buy = rng.randrange(8), rng.random() < 0.5
+            price, quantity = round(rng.uniform(50, 60), 2), rng.randint(1, 20)
+            service.add_order(next_id, stock_id, is_buy, price, quantity)
+            book.add_order(next_id, stock_id, is_buy, price, quantity)
+            live.append(next_id)
+            next_id += 1
+    assert service.wait_idle()
+    assert book.orders
+    assert set(service.orders) == set(book.orders)
+    assert service.get_all_stocks() == book.get_all_stocks()
+    for stock_id in range(8):
+        assert best(service.get_highest_buy(stock_id)) == best(book.get_highest_buy(stock_id))
+        assert best(service.get_lowest_sell(stock_id)) == best(book.get_lowest_sell(stock_id))
+        assert service.get_order_count(stock_id) == book.get_order_count(stock_id)
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from flow_control import FlowController, RESPONSE_BYTES
+from packet_utils import create_add_order_packet
+
+def frame(order_id, stock_id=0):
+    return create_add_order_packet(stock_id, order_id, 50.0, 10, True)
+
+def answer(controller, timestamp):
+    # One decision: a packet per stock, in stock order
+    for stock_id in range(4):
+        controller.on_packet({'stock_id': stock_id}, timestamp)
+
+def seeded(timestamp=0.0, **kwargs):
+    # The board only answers once every book holds an order, so only the last ADD is waited for
+    controller = FlowController(**kwargs)
+    for stock_id in range(4):
+        controller.on_sent(frame(stock_id + 1, stock_id), timestamp)
+    assert controller.tracker.in_flight == 1
+    return controller
+
+def round_trip(controller, sent, latency, order_id=10):
+    controller.on_sent(frame(order_id), sent)
+    answer(controller, sent + latency)
+
+def test_frames_before_books_fill_are_not_waited_for():
+    controller = FlowController()
+    for stock_id in range(3):
+        controller.on_sent(frame(stock_id + 1, stock_id), 0.0)
+    assert controller.tracker.in_flight == 0
+    assert controller.delay == controller.initial_delay
+
+def test_slow_start_until_congestion():
+    controller = seeded(initial_delay=0.1)
+    answer(controller, 0.02)
+    assert controller.rate == pytest.approx(10 * 1.25)
+    round_trip(controller, 1.0, 0.02)
+    assert controller.rate == pytest.approx(10 * 1.25 ** 2)
+    assert controller.decreases == 0
+
+def test_latency_spike_cuts_then_grows_linearly():
+    controller = seeded(initial_delay=0.1, beta=0.5, increase=0.1)
+    answer(controller, 0.02)
+    round_trip(controller, 1.0, 0.1)  # 5 times the fastest round trip
+    assert controller.decreases == 1
+    assert controller.congestion_rate == pytest.approx(12.5)
+    assert controller.rate == pytest.approx(6.25)
+    round_trip(controller, 2.0, 0.02)
+    round_trip(controller, 3.0, 0.02)
+    assert controller.rate == pytest.approx(6.25 + 2 * 1.25)
+
+def test_one_cut_per_round_trip():
+    controller = seeded(initial_delay=0.1)
+    answer(controller, 0.02)
+    controller.on_sent(frame(10), 1.0)
+    controller.on_sent(frame(11), 1.001)
+    answer(controller, 1.1)
+    answer(controller, 1.101)
+    assert controller.tracker.responses == 3
+    assert controller.decreases == 1
+
+def test_lost_frame_cuts_the_rate():
+    controller = seeded(initial_delay=0.1, timeout=1.0)
+    answer(controller, 0.02)
+    rate = controller.rate
+    controller.on_sent(frame(10), 5.0)
+    answer(controller, 7.0)  # expires the frame first, then finds nothing to match
+    assert controller.tracker.lost == 1
+    assert controller.tracker.unmatched == 1
+    assert controller.decreases == 1
+    assert controller.rate == pytest.approx(rate * controller.beta)
+
+def test_fastest_round_trip_is_at_least_the_wire_time():
+    controller = seeded(initial_delay=0.1, baud_rate=115200)
+    answer(controller, 1e-6)
+    assert controller.min_rtt == pytest.approx((len(frame(1)) + RESPONSE_BYTES) * 10 / 115200)
+
+def test_delay_bounds():
+    controller = seeded(initial_delay=0.1, min_delay=0.05)
+    answer(controller, 0.02)
+    for index in range(1, 20):
+        round_trip(controller, index, 0.02)
+    assert controller.delay == 0.05
+    controller = FlowController(initial_delay=5.0, max_delay=1.0)
+    assert controller.delay == 1.0
+
+def test_window_blocks_the_sender_until_an_answer():
+    now = time.perf_counter() - 10.0
+    controller = seeded(now, initial_delay=0.01, window=2, timeout=60.0)
+    controller.on_sent(frame(10), now)
+    assert controller.tracker.in_flight == 2
+    running = iter([True, True, False])
+    assert not controller.wait(lambda: next(running))
+
+    result = []
+    sender = threading.Thread(target=lambda: result.append(controller.wait(lambda: True)))
+    sender.start()
+    time.sleep(0.1)
+    assert not result
+    answer(controller, time.perf_counter())
+    sender.join(timeout=1.0)
+    assert result == [True]
+    # The window, not the rate, held the sender back: no increase
+    assert controller.rate == pytest.approx(1 / 0.01)
+
+def test_reset():
+    controller = seeded(initial_delay=0.1)
+    answer(controller, 0.02)
+    round_trip(controller, 1.0, 0.1)
+    controller.reset()
+    assert controller.delay == 0.1
+    snapshot = controller.snapshot()
+    assert snapshot['srtt'] is None
+    assert snapshot['in_flight'] == snapshot['sent'] == snapshot['lost'] == snapshot['decreases'] == 0
+    assert len(controller.summary_lines()) == 2
@@ -0,0 +1,171 @@
+import random
+
+import pytest
+
+from matching_engine import MatchingEngine, fill_to_execute_row
+
+def traded(fills):
+    return [(fill['resting_order_id'], fill['price'], fill['quantity']) for fill in fills]
+
+class ReferenceBook:
+    """Brute-force price-time matching the engine is checked against."""
+
+    def __init__(self):
+        self.orders = {}  # order_id -> [sequence, stock_id, is_buy, price, remaining]
+        self.sequence = 0
+
+    def submit(self, order_id, stock_id, is_buy, price, quantity):
+        self.orders.pop(order_id, None)
+        resting = sorted((order for order in self.orders.items()
+                          if order[1][1] == stock_id and order[1][2] != is_buy),
+                         key=lambda order: ((-order[1][3] if not is_buy else order[1][3]), order[1][0]))
+        fills = []
+        for resting_id, order in resting:
+            if quantity == 0 or (order[3] > price if is_buy else order[3] < price):
+                break
+            amount = min(quantity, order[4])
+            order[4] -= amount
+            quantity -= amount
+            fills.append((resting_id, order[3], amount))
+            if order[4] == 0:
+                del self.orders[resting_id]
+        if quantity:
+            self.sequence += 1
+            self.orders[order_id] = [self.sequence, stock_id, is_buy, price, quantity]
+        return fills, quantity
+
+    def best(self, stock_id, is_buy):
+        prices = [order[3] for order in self.orders.values() if order[1] == stock_id and order[2] == is_buy]
+        if not prices:
+            return None
+        return max(prices) if is_buy else min(prices)
+
+def test_better_price_trades_first():
+    engine = MatchingEngine()
+    engine.submit(1, 0, False, 10.02, 5)
+    engine.submit(2, 0, False, 10.01, 5)
+    fills, remaining = engine.submit(3, 0, True, 10.05, 7)
+    assert traded(fills) == [(2, 10.01, 5), (1, 10.02, 2)]
+    assert remaining == 0
+    assert engine.orders[1][4] == 3
+
+def test_earlier_order_trades_first_within_a_level():
+    engine = MatchingEngine()
+    for order_id in (1, 2, 3):
+        engine.submit(order_id, 0, True, 20.0, 4)
+    fills, _ = engine.submit(4, 0, False, 20.0, 6)
+    assert traded(fills) == [(1, 20.0, 4), (2, 20.0, 2)]
+
+def test_limit_is_never_traded_through():
+    engine = MatchingEngine()
+    engine.submit(1, 0, False, 10.5, 5)
+    fills, remaining = engine.submit(2, 0, True, 10.4, 5)
+    assert fills == []
+    assert remaining == 5
+    assert engine.best_bid(0) == 10.4
+    assert engine.best_ask(0) == 10.5
+
+def test_unfilled_rest_and_immediate_or_cancel():
+    engine = MatchingEngine()
+    engine.submit(1, 0, False, 10.0, 3)
+    _, remaining = engine.submit(2, 0, True, 10.0, 5, rest=False)
+    assert remaining == 2
+    assert 2 not in engine.orders
+    engine.submit(3, 0, False, 10.0, 3)
+    _, remaining = engine.submit(None, 0, True, None, 10)  # market order
+    assert remaining == 7
+    assert engine.best_bid(0) is None
+
+def test_stocks_do_not_trade_with_each_other():
+    engine = MatchingEngine()
+    engine.submit(1, 0, False, 10.0, 3)
+    fills, _ = engine.submit(2, 1, True, 10.0, 3)
+    assert fills == []
+
+def test_cancel_keeps_queue_order():
+    engine = MatchingEngine()
+    for order_id in (1, 2, 3):
+        engine.submit(order_id, 0, True, 20.0, 4)
+    assert engine.cancel(2)
+    assert not engine.cancel(2)
+    assert not engine.cancel(99)
+    fills, _ = engine.submit(4, 0, False, 20.0, 8)
+    assert traded(fills) == [(1, 20.0, 4), (3, 20.0, 4)]
+    assert engine.best_bid(0) is None
+
+def test_cancel_below_the_best_level():
+    engine = MatchingEngine()
+    engine.submit(1, 0, True, 20.0, 4)
+    engine.submit(2, 0, True, 19.0, 4)
+    engine.submit(3, 0, True, 18.0, 4)
+    engine.cancel(2)
+    engine.cancel(1)
+    assert engine.best_bid(0) == 18.0
+    assert engine.depth(0, True) == [(18.0, 4, 1)]
+
+def test_reduce_keeps_priority():
+    engine = MatchingEngine()
+    engine.submit(1, 0, True, 20.0, 10)
+    engine.submit(2, 0, True, 20.0, 10)
+    assert engine.reduce(1, 6) == 4
+    assert engine.reduce(99, 1) is None
+    fills, _ = engine.submit(3, 0, False, 20.0, 5)
+    assert traded(fills) == [(1, 20.0, 4), (2, 20.0, 1)]
+    assert engine.reduce(2, 9) == 0
+    assert 2 not in engine.orders
+    assert engine.best_bid(0) is None
+
+def test_replace_loses_priority():
+    engine = MatchingEngine()
+    engine.submit(1, 0, True, 20.0, 10)
+    engine.submit(2, 0, True, 20.0, 10)
+    assert engine.replace(1, 5, 20.0, 10) == ([], 10)
+    assert engine.replace(1, 6, 20.0, 10) is None
+    fills, _ = engine.submit(3, 0, False, 20.0, 15)
+    assert traded(fills) == [(2, 20.0, 10), (5, 20.0, 5)]
+
+def test_reused_id_replaces_the_resting_order():
+    engine = MatchingEngine()
+    engine.submit(1, 0, True, 20.0, 10)
+    engine.submit(1, 0, True, 19.0, 3)
+    assert engine.depth(0, True) == [(19.0, 3, 1)]
+
+def test_depth_aggregates_levels():
+    engine = MatchingEngine()
+    engine.submit(1, 0, False, 10.1, 2)
+    engine.submit(2, 0, False, 10.1, 3)
+    engine.submit(3, 0, False, 10.3, 1)
+    engine.submit(4, 0, False, 10.2, 4)
+    assert engine.depth(0, False, 2) == [(10.1, 5, 2), (10.2, 4, 1)]
+
+def test_fill_counters_and_execute_row():
+    engine = MatchingEngine()
+    engine.submit(1, 3, True, 20.0, 10)
+    fills, _ = engine.submit(2, 3, False, 19.0, 4)
+    assert engine.fill_count == 1
+    assert engine.filled_quantity == 4
+    assert fill_to_execute_row(fills[0]) == {'type': 'EXECUTE', 'stock_id': 3, 'order_id': 1, 'is_buy': True,
+                                             'price': 20.0, 'quantity': 4}
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_reference_book(seed):
+    rng = random.Random(seed)
+    engine = MatchingEngine()
+    reference = ReferenceBook()
+    for order_id in range(1, 3000):
+        stock_id = rng.randrange(2)
+        if reference.orders and rng.random() < 0.2:
+            victim = rng.choice(sorted(reference.orders))
+            del reference.orders[victim]
+            assert engine.cancel(victim)
+            continue
+        is_buy = rng.random() < 0.5
+        price = round(10 + rng.randint(-10, 10) * 0.01, 2)
+        quantity = rng.randint(1, 20)
+        fills, remaining = engine.submit(order_id, stock_id, is_buy, price, quantity)
+        assert (traded(fills), remaining) == reference.submit(order_id, stock_id, is_buy, price, quantity)
+        for side in (True, False):
+            best = engine.best_bid(stock_id) if side else engine.best_ask(stock_id)
+            assert best == reference.best(stock_id, side)
+    assert engine.fill_count > 0
+    assert set(engine.orders) == set(reference.orders)
@@ -0,0 +1,126 @@
+import random
+
+import pytest
+
+from config_manager import DEFAULT_CONFIG
+from market_data_gen_new import generate_realistic_market_data
+from market_data_generator import generate_market_data
+from order_ids import OrderIdAllocator, MAX_ORDER_ID, remap_session_ids, session_ids_valid
+from session_columns import SessionColumns
+
+def add(order_id, stock_id=0, quantity=10):
+    return {'type': 'ADD', 'stock_id': stock_id, 'order_id': order_id, 'is_buy': True,
+            'price': 50.0, 'quantity': quantity}
+
+def cancel(order_id, stock_id=0):
+    return {'type': 'CANCEL', 'stock_id': stock_id, 'order_id': order_id, 'is_buy': True,
+            'price': None, 'quantity': None}
+
+def live_ids_never_reused(rows):
+    # Replays the rows and checks every ADD (or REPLACE target) takes a free ID
+    live = {}
+    for row in rows:
+        if row['type'] == 'ADD':
+            if row['order_id'] in live:
+                return False
+            live[row['order_id']] = row['quantity']
+            continue
+        if row['order_id'] not in live:
+            return False
+        if row['type'] == 'EXECUTE':
+            live[row['order_id']] -= row['quantity']
+            if live[row['order_id']] > 0:
+                continue
+        live.pop(row['order_id'])
+        if row['type'] == 'REPLACE':
+            if row['new_order_id'] in live:
+                return False
+            live[row['new_order_id']] = row['quantity']
+    return True
+
+def test_allocate_hands_out_every_id_once():
+    allocator = OrderIdAllocator()
+    ids = [allocator.allocate(0, True) for _ in range(MAX_ORDER_ID)]
+    assert sorted(ids) == list(range(1, MAX_ORDER_ID + 1))
+    assert allocator.full
+    assert allocator.allocate(0, True) is None
+    assert allocator.refusals == 1
+
+def test_released_id_is_reused_last():
+    allocator = OrderIdAllocator(1, 4)
+    first = allocator.allocate(0, True)
+    allocator.release(first)
+    assert [allocator.allocate(0, True) for _ in range(4)] == [2, 3, 4, first]
+
+def test_release_of_unknown_id():
+    allocator = OrderIdAllocator()
+    order_id = allocator.allocate(0, True)
+    assert allocator.release(order_id)
+    assert not allocator.release(order_id)
+    assert not allocator.release(200)
+    assert len(allocator) == 0
+
+def test_evict_takes_the_oldest_live_order():
+    allocator = OrderIdAllocator(1, 3)
+    for stock_id in range(3):
+        allocator.allocate(stock_id, stock_id % 2 == 0)
+    allocator.release(1)
+    allocator.allocate(5, False)
+    assert allocator.evict() == (2, 1, False)
+    assert allocator.evictions == 1
+    assert 2 not in allocator
+    assert allocator.oldest() == (3, 2, True)
+
+def test_live_ids_per_side():
+    allocator = OrderIdAllocator()
+    buy = allocator.allocate(7, True)
+    sell = allocator.allocate(7, False)
+    assert allocator.live_ids(7, True) == {buy}
+    assert allocator.live_ids(7, False) == {sell}
+    allocator.release(buy)
+    assert allocator.live_ids(7, True) == set()
+    assert allocator.live_ids(8, True) == set()
+
+def test_session_ids_valid():
+    assert session_ids_valid(SessionColumns.from_rows([add(1), cancel(1), add(1)]))
+    assert not session_ids_valid(SessionColumns.from_rows([add(1), add(1)]))
+    assert not session_ids_valid(SessionColumns.from_rows([cancel(1)]))
+    assert not session_ids_valid(SessionColumns.from_rows([add(MAX_ORDER_ID + 1)]))
+
+def test_valid_session_is_not_remapped():
+    session = SessionColumns.from_rows([add(1), add(2), cancel(1)])
+    remapped, stats = remap_session_ids(session)
+    assert remapped is session
+    assert stats == {'evicted': 0, 'reused': 0, 'dropped': 0}
+
+def test_remap_wide_ids_into_board_space():
+    rows = [add(order_id) for order_id in range(1000, 1400)]
+    rows += [cancel(order_id) for order_id in range(1200, 1400)]
+    remapped, stats = remap_session_ids(SessionColumns.from_rows(rows))
+    assert session_ids_valid(remapped)
+    # 400 orders over 255 IDs: the oldest 145 were cancelled to make room
+    assert stats['evicted'] == 400 - MAX_ORDER_ID
+    assert stats['dropped'] == 0
+
+def test_remap_reused_and_unknown_ids():
+    rows = [add(9), add(9, quantity=20), cancel(9), cancel(42)]
+    remapped, stats = remap_session_ids(SessionColumns.from_rows(rows))
+    assert session_ids_valid(remapped)
+    assert stats['reused'] == 1
+    assert stats['dropped'] == 1
+    assert [row['type'] for row in remapped] == ['ADD', 'CANCEL', 'ADD', 'CANCEL']
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_generator_never_reuses_live_ids(seed):
+    random.seed(seed)
+    config = dict(DEFAULT_CONFIG, cancel_probability=0.1, execute_probability=0.1, replace_probability=0.1)
+    rows = generate_market_data(5000, config)
+    assert live_ids_never_reused(rows)
+    assert session_ids_valid(SessionColumns.from_rows(rows))
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_realistic_generator_never_reuses_live_ids(seed):
+    random.seed(seed)
+    rows = generate_realistic_market_data(4, 2000, execute_probability=0.1, replace_probability=0.2)
+    assert live_ids_never_reused(rows)
+    assert session_ids_valid(SessionColumns.from_rows(rows))
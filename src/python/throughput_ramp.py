@@ -0,0 +1,487 @@
+import random
+import threading
+import time
+from collections import deque
+
+from order_ids import OrderIdAllocator
+from packet_utils import create_packet, parse_fpga_response_packet, split_response_packets
+
+BOARD_STOCKS = 4  # order_book_wrapper instances; the parser keeps two bits of the stock locate
+RAMP_COLUMNS = ['target_rate', 'sent_rate', 'response_rate', 'sent', 'responses', 'lost', 'loss',
+                'p50_ms', 'p99_ms', 'max_ms', 'saturated']
+
+def ramp_rows(symbol_table, depth=16, seed=None, reserved_ids=()):
+    """
+    Endless order flow for the ramp that never empties a board book.
+
+    order_book_wrapper only raises best_price_valid while every stock's book
+    holds an order, and only then does the board answer. The first row per
+    stock adds a base order that stays on the book; after that, stocks are
+    visited in turn, adding orders near the baseline price until depth of
+    them rest and then cancelling the oldest. Only the board's first
+    BOARD_STOCKS stocks are traded.
+
+    Parameters:
+    - symbol_table: SymbolTable of the stocks to trade
+    - depth: Orders per stock on top of the base order (at most 62, so
+      every order keeps its own 8-bit ID; lowered to fit the free IDs)
+    - seed: Optional random seed
+    - reserved_ids: Order IDs already resting on the board, never used
+
+    Yields:
+    - Session row dictionaries
+    """
+    rng = random.Random(seed)
+    stock_ids = symbol_table.stock_ids()[:BOARD_STOCKS]
+    order_ids = OrderIdAllocator()
+    reserved_ids = set(reserved_ids)
+    order_ids.free = deque(order_id for order_id in order_ids.free if order_id not in reserved_ids)
+    depth = min(depth, len(order_ids.free) // len(stock_ids) - 1)
+    if depth < 1:
+        raise ValueError(f"Too few free order IDs for the ramp ({len(order_ids.free)}); cancel resting orders first")
+    resting = {stock_id: deque() for stock_id in stock_ids}  # stock_id -> order IDs, oldest first
+
+    def add(stock_id):
+        baseline = symbol_table.baseline_price(stock_id)
+        tick = symbol_table.tick_size(stock_id)
+        is_buy = rng.random() < 0.5
+        return {'type': 'ADD', 'stock_id': stock_id, 'order_id': order_ids.allocate(stock_id, is_buy),
+                'is_buy': is_buy, 'price': round(max(baseline + rng.randint(-50, 50) * tick, tick), 2),
+                'quantity': rng.randint(1, 100)}
+
+    for stock_id in stock_ids:
+        yield add(stock_id)
+    while True:
+        for stock_id in stock_ids:
+            orders = resting[stock_id]
+            if len(orders) < depth:
+                row = add(stock_id)
+                orders.append(row['order_id'])
+            else:
+                order_id = orders.popleft()
+                order_ids.release(order_id)
+                row = {'type': 'CANCEL', 'stock_id': stock_id, 'order_id': order_id, 'is_buy': False,
+                       'price': None, 'quantity': 0}
+            yield row
+
+class ResponseTracker:
+    """
+    Correlates the board's decisions with the frames that triggered them.
+
+    Every frame the board applies while all books hold an order makes the
+    trading strategy emit one decision: a burst of response packets, one
+    per stock in stock order. A burst starts at the first packet whose
+    stock ID does not follow the previous one. The board answers in the
+    order it receives frames, so each burst is matched to the oldest
+    frame still waiting; frames waiting longer than the timeout are
+    counted as lost.
+
+    Skipped answers would leave that matching one frame behind for good,
+    and answers arriving after their frame was counted as lost one frame
+    ahead, so both can be bounded: a frame waiting longer than max_latency
+    while the burst fits the next one's latency bounds is counted as lost,
+    and a burst arriving sooner than min_latency after the frame it would
+    match is left unmatched. Both are off by default.
+    """
+
+    def __init__(self, timeout=1.0, keep_latencies=True):
+        """
+        Initialize a tracker with nothing outstanding.
+
+        Parameters:
+        - timeout: Seconds after which an unanswered frame is lost
+        - keep_latencies: Collect every latency for finish() (off for
+          trackers that run for a whole session)
+        """
+        self.timeout = timeout
+        self.min_latency = 0.0
+        self.max_latency = None
+        self.keep_latencies = keep_latencies
+        self.lock = threading.Lock()
+        self.outstanding = deque()  # send times of unanswered frames
+        self.last_stock_id = None
+        self.reset()
+
+    def reset(self):
+        """Start a new measurement; frames still waiting are forgotten."""
+        with self.lock:
+            self.outstanding.clear()
+            self.sent = 0
+            self.responses = 0
+            self.lost = 0
+            self.unmatched = 0  # bursts with no frame waiting (late answers to a previous step)
+            self.latencies = []
+
+    def on_sent(self, timestamp):
+        """
+        Record a frame written to the board.
+
+        Parameters:
+        - timestamp: time.perf_counter() after the write
+        """
+        with self.lock:
+            self.outstanding.append(timestamp)
+            self.sent += 1
+
+    @property
+    def in_flight(self):
+        """Number of frames waiting for an answer."""
+        return len(self.outstanding)
+
+    def expire(self, now):
+        """
+        Count frames waiting longer than the timeout as lost.
+
+        Parameters:
+        - now: time.perf_counter()
+
+        Returns:
+        - Number of frames newly counted as lost
+        """
+        with self.lock:
+            return self._expire(now)
+
+    def _expire(self, now):
+        outstanding = self.outstanding
+        deadline = now - self.timeout
+        lost = 0
+        while outstanding and outstanding[0] < deadline:
+            outstanding.popleft()
+            lost += 1
+        self.lost += lost
+        return lost
+
+    def on_packet(self, parsed, timestamp):
+        """
+        Record a response packet.
+
+        Parameters:
+        - parsed: Packet as returned by parse_fpga_response_packet
+        - timestamp: time.perf_counter() when it was read
+
+        Returns:
+        - Latency in seconds when the packet answers a frame, None otherwise
+        """
+        stock_id = parsed['stock_id']
+        starts_burst = self.last_stock_id is None or stock_id <= self.last_stock_id
+        self.last_stock_id = stock_id
+        if not starts_burst:
+            return None
+        with self.lock:
+            self._expire(timestamp)
+            outstanding = self.outstanding
+            if self.max_latency is not None:
+                while (len(outstanding) > 1 and timestamp - outstanding[0] > self.max_latency
+                       and self.min_latency <= timestamp - outstanding[1] <= self.max_latency):
+                    outstanding.popleft()
+                    self.lost += 1
+            if not outstanding or timestamp - outstanding[0] < self.min_latency:
+                self.unmatched += 1
+                return None
+            latency = timestamp - outstanding.popleft()
+            if self.keep_latencies:
+                self.latencies.append(latency)
+            self.responses += 1
+            return latency
+
+    def finish(self):
+        """
+        Count every frame still waiting as lost.
+
+        Returns:
+        - Tuple (sent, responses, lost, sorted latencies in seconds)
+        """
+        with self.lock:
+            self.lost += len(self.outstanding)
+            self.outstanding.clear()
+            return self.sent, self.responses, self.lost, sorted(self.latencies)
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+class ThroughputRamp:
+    """
+    Steps the send rate up until the board saturates.
+
+    Each step sends frames at a fixed rate for step_seconds, paced against
+    a perf_counter() schedule so the rate does not drift with write and
+    sleep overhead, then waits drain_seconds for late responses. The step
+    is saturated when more than loss_threshold of its frames went
+    unanswered, when its p99 latency exceeds latency_factor times that of
+    the first step, or when the host could not even send at the target
+    rate. The ramp stops at the first saturated step; the knee is the last
+    step before it.
+    """
+
+    def __init__(self, serial_port, symbol_table, start_rate=50.0, max_rate=1000.0, step_factor=1.25,
+                 step_seconds=5.0, drain_seconds=1.0, loss_threshold=0.01, latency_factor=3.0,
+                 on_step=None, capture=None, reserved_ids=()):
+        """
+        Prepare a ramp on an open serial port.
+
+        Parameters:
+        - serial_port: Open serial.Serial connected to the board
+        - symbol_table: SymbolTable of the stocks to trade
+        - start_rate: Frames per second of the first step
+        - max_rate: Highest rate tried
+        - step_factor: Rate multiplier between steps
+        - step_seconds: Sending time per step
+        - drain_seconds: Wait for late responses after each step (also the loss timeout)
+        - loss_threshold: Fraction of unanswered frames that marks saturation
+        - latency_factor: p99 latency growth over the first step that marks saturation
+        - on_step: Optional callable invoked with each step's result dictionary
+        - capture: Optional WireCapture recording both directions
+        - reserved_ids: Order IDs of orders resting on the board, which the
+          ramp leaves alone (it would overwrite and then cancel them)
+        """
+        self.serial_port = serial_port
+        self.symbol_table = symbol_table
+        self.start_rate = start_rate
+        self.max_rate = max_rate
+        self.step_factor = step_factor
+        self.step_seconds = step_seconds
+        self.drain_seconds = drain_seconds
+        self.loss_threshold = loss_threshold
+        self.latency_factor = latency_factor
+        self.on_step = on_step
+        self.capture = capture
+        self.tracker = ResponseTracker(timeout=drain_seconds)
+        self.rows = ramp_rows(symbol_table, seed=1, reserved_ids=reserved_ids)
+        self.steps = []
+        self.knee = None  # last unsaturated step
+        self.running = False
+        self.stopped = False  # stop() was called
+        self.decode_errors = 0
+        self.resting = {}  # order_id -> row of the ramp's orders on the board
+
+    def run(self):
+        """
+        Run the ramp to the knee (or max_rate) and return the curve.
+
+        Returns:
+        - List of step result dictionaries with the RAMP_COLUMNS keys
+        """
+        self.running = True
+        reader = threading.Thread(target=self._read_responses, name="ramp-rx")
+        reader.daemon = True
+        reader.start()
+        try:
+            # Base orders first, so every book is valid before anything is measured
+            for _ in range(min(len(self.symbol_table), BOARD_STOCKS)):
+                self._send(next(self.rows))
+            time.sleep(self.drain_seconds)
+
+            baseline_p99 = None
+            rate = self.start_rate
+            while self.running and rate <= self.max_rate:
+                step = self._run_step(rate)
+                if baseline_p99 is None:
+                    if not step['responses']:
+                        raise RuntimeError("The board did not answer at the first step")
+                    baseline_p99 = step['p99_ms']
+                step['saturated'] = (step['loss'] > self.loss_threshold
+                                     or step['p99_ms'] > self.latency_factor * baseline_p99
+                                     or step['sent_rate'] < 0.9 * rate)
+                self.steps.append(step)
+                if self.on_step is not None:
+                    self.on_step(step)
+                if step['saturated']:
+                    break
+                self.knee = step
+                rate *= self.step_factor
+        finally:
+            # Take the ramp's orders off the board again
+            if self.serial_port.is_open:
+                for row in list(self.resting.values()):
+                    self._send(dict(row, type='CANCEL', price=None, quantity=0))
+            self.running = False
+            reader.join(timeout=1)
+        return self.steps
+
+    def stop(self):
+        """Abort the ramp after the current frame."""
+        self.stopped = True
+        self.running = False
+
+    def _send(self, row):
+        if row['type'] == 'ADD':
+            self.resting[row['order_id']] = row
+        else:
+            self.resting.pop(row['order_id'], None)
+        frame = create_packet(row, self.symbol_table.symbol(row['stock_id']))
+        self.serial_port.write(frame)
+        if self.capture:
+            self.capture.record_tx(frame)
+
+    def _run_step(self, rate):
+        tracker = self.tracker
+        tracker.reset()
+        interval = 1.0 / rate
+        start = time.perf_counter()
+        end = start + self.step_seconds
+        next_send = start
+        while self.running:
+            now = time.perf_counter()
+            if now >= end:
+                break
+            if now < next_send:
+                time.sleep(next_send - now)
+            self._send(next(self.rows))
+            tracker.on_sent(time.perf_counter())
+            # A slow write delays the schedule rather than triggering a catch-up burst
+            next_send = max(next_send + interval, time.perf_counter() - interval)
+        elapsed = time.perf_counter() - start
+        time.sleep(self.drain_seconds)
+
+        sent, responses, lost, latencies = tracker.finish()
+        return {
+            'target_rate': rate,
+            'sent_rate': sent / elapsed if elapsed > 0 else 0.0,
+            'response_rate': responses / elapsed if elapsed > 0 else 0.0,
+            'sent': sent,
+            'responses': responses,
+            'lost': lost,
+            'loss': lost / sent if sent else 0.0,
+            'p50_ms': _percentile(latencies, 0.5) * 1e3,
+            'p99_ms': _percentile(latencies, 0.99) * 1e3,
+            'max_ms': latencies[-1] * 1e3 if latencies else 0.0,
+            'saturated': False
+        }
+
+    def _read_responses(self):
+        buffer = bytearray()
+        while self.running:
+            waiting = self.serial_port.in_waiting
+            if not waiting:
+                time.sleep(0.0005)
+                continue
+            data = self.serial_port.read(waiting)
+            timestamp = time.perf_counter()
+            if self.capture:
+                self.capture.record_rx(data)
+            buffer.extend(data)
+            packets, dropped = split_response_packets(buffer)
+            self.decode_errors += dropped
+            for packet in packets:
+                parsed = parse_fpga_response_packet(packet)
+                if parsed is None:
+                    self.decode_errors += 1
+                else:
+                    self.tracker.on_packet(parsed, timestamp)
+
+def format_curve(steps):
+    """
+    Format ramp results as a table.
+
+    Parameters:
+    - steps: Step result dictionaries from ThroughputRamp.run()
+
+    Returns:
+    - List of lines
+    """
+    lines = [f"{'Target/s':>9}{'Sent/s':>9}{'Resp/s':>9}{'Loss %':>8}{'p50 ms':>9}{'p99 ms':>9}{'Max ms':>9}"]
+    for step in steps:
+        lines.append(f"{step['target_rate']:>9.1f}{step['sent_rate']:>9.1f}{step['response_rate']:>9.1f}"
+                     f"{step['loss'] * 100:>8.2f}{step['p50_ms']:>9.2f}{step['p99_ms']:>9.2f}{step['max_ms']:>9.2f}"
+                     f"{'  saturated' if step['saturated'] else ''}")
+    return lines
+
+def save_curve(steps, filename):
+    """
+    Write ramp results to a CSV file (one row per step).
+
+    Parameters:
+    - steps: Step result dictionaries from ThroughputRamp.run()
+    - filename: Output CSV filename
+    """
+    import csv
+
+    with open(filename, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=RAMP_COLUMNS)
+        writer.writeheader()
+        for step in steps:
+            writer.writerow({key: round(value, 3) if isinstance(value, float) else value
+                             for key, value in step.items()})
+
+def plot_curve(steps, filename):
+    """
+    Plot response rate and latency against the send rate into an image.
+
+    Parameters:
+    - steps: Step result dictionaries from ThroughputRamp.run()
+    - filename: Output image filename (format from the extension)
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    rates = [step['sent_rate'] for step in steps]
+    fig, throughput_axis = plt.subplots(figsize=(8, 5))
+    throughput_axis.plot(rates, [step['response_rate'] for step in steps], 'o-', label="Responses/s")
+    throughput_axis.set_xlabel("Sent frames/s")
+    throughput_axis.set_ylabel("Responses/s")
+    latency_axis = throughput_axis.twinx()
+    latency_axis.plot(rates, [step['p50_ms'] for step in steps], 's--', color="tab:orange", label="p50 latency")
+    latency_axis.plot(rates, [step['p99_ms'] for step in steps], '^--', color="tab:red", label="p99 latency")
+    latency_axis.set_ylabel("Latency (ms)")
+    fig.legend(loc="upper left")
+    fig.tight_layout()
+    fig.savefig(filename)
+    plt.close(fig)
+
+def main():
+    """
+    Command line entry point: ramp the send rate on a serial port and report the knee.
+    """
+    import argparse
+    import serial
+
+    from config_manager import load_config
+    from symbol_table import load_symbol_table
+
+    parser = argparse.ArgumentParser(description="Find the send rate at which the board saturates")
+    parser.add_argument("--port", required=True, help="Serial port connected to the board")
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--start-rate", type=float, help="Frames/s of the first step")
+    parser.add_argument("--max-rate", type=float, help="Highest rate tried")
+    parser.add_argument("--step-factor", type=float, help="Rate multiplier between steps")
+    parser.add_argument("--step-seconds", type=float, help="Sending time per step")
+    parser.add_argument("--csv", help="Write the curve to this CSV")
+    parser.add_argument("--plot", help="Plot the curve into this image (needs matplotlib)")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    serial_port = serial.Serial(port=args.port, baudrate=config["baud_rate"], timeout=0.1)
+    ramp = ThroughputRamp(
+        serial_port, load_symbol_table(config),
+        start_rate=args.start_rate or config["ramp_start_rate"],
+        max_rate=args.max_rate or config["ramp_max_rate"],
+        step_factor=args.step_factor or config["ramp_step_factor"],
+        step_seconds=args.step_seconds or config["ramp_step_seconds"],
+        loss_threshold=config["ramp_loss_threshold"],
+        latency_factor=config["ramp_latency_factor"],
+        on_step=lambda step: print(format_curve([step])[1], flush=True))
+    print(format_curve([])[0])
+    try:
+        steps = ramp.run()
+    finally:
+        serial_port.close()
+
+    print()
+    if ramp.knee is not None:
+        print(f"Knee: {ramp.knee['response_rate']:.1f} responses/s at {ramp.knee['sent_rate']:.1f} frames/s "
+              f"(p99 {ramp.knee['p99_ms']:.2f} ms)")
+    else:
+        print("Saturated at the first step; lower --start-rate")
+    if ramp.decode_errors:
+        print(f"{ramp.decode_errors} undecodable response bytes/packets")
+    csv_file = args.csv or config["ramp_output_file"]
+    if csv_file:
+        save_curve(steps, csv_file)
+    if args.plot:
+        plot_curve(steps, args.plot)
+
+if __name__ == "__main__":
+    main()
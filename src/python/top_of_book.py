@@ -0,0 +1,158 @@
+import struct
+import time
+
+TABLE_MAGIC = b'HFTTOB'
+TABLE_VERSION = 1
+TABLE_HEADER = struct.Struct('<6sHIQ')  # magic, version, number of stocks, total updates
+TABLE_HEADER_SIZE = 64  # records start on their own cache line
+
+# Per-stock record: a sequence counter (odd while being written) followed by the fields
+RECORD_SEQUENCE = struct.Struct('<Q')
+RECORD_FIELDS = struct.Struct('<ddIII4x')  # bid price, ask price, bid qty, ask qty, order count
+RECORD_SIZE = RECORD_SEQUENCE.size + RECORD_FIELDS.size
+UPDATES_OFFSET = struct.calcsize('<6sHI')
+
+MAX_READ_RETRIES = 100000
+
+class TopOfBookTable:
+    """
+    Seqlock-protected best bid/ask table in shared memory.
+
+    One writer per stock (StockBook or a book service worker) bumps the
+    stock's sequence to odd, writes the fields and bumps it back to even.
+    Readers in any process copy the fields and retry if the sequence was
+    odd or changed meanwhile, so reads never block the writer and never
+    return a torn record. sequence // 2 is the stock's update count.
+    """
+
+    def __init__(self, num_stocks=256, name=None, create=True):
+        """
+        Create or attach to a table.
+
+        Parameters:
+        - num_stocks: Number of stock slots (stock IDs 0..num_stocks-1) when creating
+        - name: Shared memory name (None lets the OS pick one when creating)
+        - create: Create the table (True) or attach to an existing one (False)
+        """
+        # multiprocessing is imported on first use to keep importing StockBook cheap
+        import multiprocessing
+        from multiprocessing import resource_tracker, shared_memory
+
+        self.owner = create
+        if create:
+            size = TABLE_HEADER_SIZE + num_stocks * RECORD_SIZE
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # Left behind by a process that did not shut down cleanly
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.shm.buf[:size] = bytes(size)
+            TABLE_HEADER.pack_into(self.shm.buf, 0, TABLE_MAGIC, TABLE_VERSION, num_stocks, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            if multiprocessing.parent_process() is None:
+                # An unrelated reader process must not unlink the table when it exits
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+            magic, version, num_stocks, _ = TABLE_HEADER.unpack_from(self.shm.buf, 0)
+            if magic != TABLE_MAGIC or version != TABLE_VERSION:
+                self.shm.close()
+                raise ValueError(f"{name} is not a top-of-book table")
+        self.name = self.shm.name
+        self.num_stocks = num_stocks
+        self.buf = self.shm.buf
+
+    def publish(self, stock_id, bid, bid_qty, ask, ask_qty, order_count):
+        """
+        Write a stock's top of book (writer side).
+
+        Parameters:
+        - stock_id: Stock slot
+        - bid, bid_qty: Best bid price and quantity (quantity 0 for an empty side)
+        - ask, ask_qty: Best ask price and quantity (quantity 0 for an empty side)
+        - order_count: Number of resting orders
+        """
+        if not 0 <= stock_id < self.num_stocks:
+            return
+        buf = self.buf
+        offset = TABLE_HEADER_SIZE + stock_id * RECORD_SIZE
+        sequence = RECORD_SEQUENCE.unpack_from(buf, offset)[0]
+        RECORD_SEQUENCE.pack_into(buf, offset, sequence + 1)
+        RECORD_FIELDS.pack_into(buf, offset + RECORD_SEQUENCE.size, bid, ask, bid_qty, ask_qty, order_count)
+        RECORD_SEQUENCE.pack_into(buf, offset, sequence + 2)
+        # Total update counter; several writer processes may race on it, it is only a hint
+        RECORD_SEQUENCE.pack_into(buf, UPDATES_OFFSET, RECORD_SEQUENCE.unpack_from(buf, UPDATES_OFFSET)[0] + 1)
+
+    def read(self, stock_id):
+        """
+        Read a consistent copy of a stock's top of book.
+
+        Parameters:
+        - stock_id: Stock slot
+
+        Returns:
+        - Tuple (bid, bid_qty, ask, ask_qty, order_count, update_count)
+        """
+        buf = self.buf
+        offset = TABLE_HEADER_SIZE + stock_id * RECORD_SIZE
+        for _ in range(MAX_READ_RETRIES):
+            before = RECORD_SEQUENCE.unpack_from(buf, offset)[0]
+            if before & 1:
+                continue  # write in progress
+            bid, ask, bid_qty, ask_qty, count = RECORD_FIELDS.unpack_from(buf, offset + RECORD_SEQUENCE.size)
+            if RECORD_SEQUENCE.unpack_from(buf, offset)[0] == before:
+                return bid, bid_qty, ask, ask_qty, count, before >> 1
+        raise RuntimeError(f"Writer of stock {stock_id} appears to have stopped mid-update")
+
+    def updates(self):
+        """Total number of publishes across all stocks."""
+        return RECORD_SEQUENCE.unpack_from(self.buf, UPDATES_OFFSET)[0]
+
+    def active_stocks(self):
+        """
+        Get the stocks with resting orders.
+
+        Returns:
+        - Sorted list of stock IDs
+        """
+        return [stock_id for stock_id in range(self.num_stocks) if self.read(stock_id)[4]]
+
+    def close(self):
+        """Detach, and free the shared memory if this table created it."""
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def main():
+    """
+    Command line entry point: print a running simulator's top of book.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Watch a shared-memory top-of-book table")
+    parser.add_argument("name", help="Shared memory name (top_of_book_name in config.ini)")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between refreshes")
+    parser.add_argument("--once", action="store_true", help="Print once and exit")
+    args = parser.parse_args()
+
+    table = TopOfBookTable(name=args.name, create=False)
+    try:
+        while True:
+            print(f"{time.strftime('%H:%M:%S')} {table.updates()} updates")
+            for stock_id in table.active_stocks():
+                bid, bid_qty, ask, ask_qty, count, updates = table.read(stock_id)
+                print(f"  {stock_id:5} {count:6} orders  {bid_qty:6} @ {bid:8.2f} | "
+                      f"{ask:8.2f} @ {ask_qty:<6} ({updates} updates)")
+            if args.once:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        table.close()
+
+if __name__ == "__main__":
+    main()
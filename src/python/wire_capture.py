@@ -0,0 +1,305 @@
+import struct
+import threading
+import time
+from collections import deque
+
+from itch_codec import BOARD, BOARD_BUY, price_from_board
+
+CAPTURE_MAGIC = b'HFTCAP'
+CAPTURE_VERSION = 1
+FILE_HEADER = struct.Struct('<6sH')
+
+# Record header: perf_counter_ns timestamp, direction, payload length
+RECORD_HEADER = struct.Struct('<QBI')
+
+DIRECTION_TX = 0  # host -> board frame
+DIRECTION_RX = 1  # board -> host chunk as returned by serial.read()
+DIRECTION_SESSION = 2  # session marker, payload is the wall clock time_ns
+DIRECTION_NAMES = {DIRECTION_TX: 'TX', DIRECTION_RX: 'RX', DIRECTION_SESSION: 'SESSION'}
+
+SESSION_PAYLOAD = struct.Struct('<Q')
+
+class WireCapture:
+    """
+    Append-only binary recorder for both directions of the serial link.
+
+    The hot path (record_tx/record_rx) only takes a timestamp and appends a
+    tuple to a deque; a background thread packs and writes records in large
+    buffered writes.
+    """
+
+    def __init__(self, filename, flush_interval=0.2, buffer_size=1024 * 1024):
+        """
+        Open (or append to) a capture file and start the writer thread.
+
+        Parameters:
+        - filename: Path of the capture file
+        - flush_interval: Seconds between background writes
+        - buffer_size: Size of the file write buffer
+        """
+        self.filename = filename
+        self.flush_interval = flush_interval
+        self.file = open(filename, 'ab', buffering=buffer_size)
+        if self.file.tell() == 0:
+            self.file.write(FILE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION))
+
+        self.pending = deque()  # (timestamp_ns, direction, payload)
+        self.records_written = 0
+        self.bytes_written = 0
+        self.running = True
+        self.wakeup = threading.Event()
+        self.write_lock = threading.Lock()  # flush() drains from the caller's thread too
+
+        self.start_session()
+
+        self.writer_thread = threading.Thread(target=self._writer_loop, name="wire-capture")
+        self.writer_thread.daemon = True
+        self.writer_thread.start()
+
+    def start_session(self):
+        """Write a session marker correlating perf_counter_ns with wall clock time."""
+        self.pending.append((time.perf_counter_ns(), DIRECTION_SESSION, SESSION_PAYLOAD.pack(time.time_ns())))
+
+    def record_tx(self, data):
+        """
+        Record a frame written to the board.
+
+        Parameters:
+        - data: Frame bytes
+        """
+        self.pending.append((time.perf_counter_ns(), DIRECTION_TX, bytes(data)))
+
+    def record_rx(self, data):
+        """
+        Record a chunk read from the board.
+
+        Parameters:
+        - data: Chunk bytes
+        """
+        self.pending.append((time.perf_counter_ns(), DIRECTION_RX, bytes(data)))
+
+    def _drain(self):
+        # deque append/popleft are thread-safe, so producers never block; the
+        # lock only keeps two drains from splitting the same records
+        with self.write_lock:
+            self._drain_locked()
+
+    def _drain_locked(self):
+        count = len(self.pending)
+        if not count:
+            return
+        pack = RECORD_HEADER.pack
+        popleft = self.pending.popleft
+        chunks = []
+        for _ in range(count):
+            timestamp, direction, payload = popleft()
+            chunks.append(pack(timestamp, direction, len(payload)))
+            chunks.append(payload)
+        data = b''.join(chunks)
+        self.file.write(data)
+        self.records_written += count
+        self.bytes_written += len(data)
+
+    def _writer_loop(self):
+        while self.running:
+            self.wakeup.wait(self.flush_interval)
+            self._drain()
+        with self.write_lock:
+            self._drain_locked()
+            self.file.flush()
+
+    def flush(self):
+        """Write all pending records and flush the file."""
+        with self.write_lock:
+            self._drain_locked()
+            self.file.flush()
+
+    def close(self):
+        """Stop the writer thread and close the file."""
+        if not self.running:
+            return
+        self.running = False
+        self.wakeup.set()
+        self.writer_thread.join()
+        self.file.close()
+
+def read_capture(filename):
+    """
+    Read all records from a capture file.
+
+    Parameters:
+    - filename: Path of the capture file
+
+    Yields:
+    - (timestamp_ns, direction, payload) tuples in recording order
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+
+    magic, version = FILE_HEADER.unpack_from(data, 0)
+    if magic != CAPTURE_MAGIC:
+        raise ValueError(f"{filename} is not a wire capture")
+    if version != CAPTURE_VERSION:
+        raise ValueError(f"Unsupported capture version {version}")
+
+    offset = FILE_HEADER.size
+    end = len(data)
+    header_size = RECORD_HEADER.size
+    while offset + header_size <= end:
+        timestamp, direction, length = RECORD_HEADER.unpack_from(data, offset)
+        offset += header_size
+        if offset + length > end:
+            break  # truncated tail from an interrupted run
+        yield timestamp, direction, data[offset:offset + length]
+        offset += length
+
+def analyze_capture(filename, pnl_fill_model=None):
+    """
+    Reconstruct sessions, response latencies and final book state from a capture.
+
+    Latency is measured from the last TX frame to each complete response
+    packet; responses are reassembled from RX chunks the same way
+    receive_packets does.
+
+    Parameters:
+    - filename: Path of the capture file
+    - pnl_fill_model: If set, account the responses as the strategy's
+      orders with this PnLTracker fill model, marked against the book as
+      it stood when each response arrived
+
+    Returns:
+    - List of session dictionaries with counts, latencies (ns), a StockBook
+      and (with pnl_fill_model) a PnLTracker under 'pnl'
+    """
+    from packet_utils import parse_fpga_response_packet
+    from pnl_tracker import PnLTracker
+    from stock_book import StockBook
+
+    sessions = []
+    session = None
+    rx_buffer = bytearray()
+    last_tx = None
+
+    for timestamp, direction, payload in read_capture(filename):
+        if direction == DIRECTION_SESSION or session is None:
+            wall_clock = SESSION_PAYLOAD.unpack(payload)[0] if direction == DIRECTION_SESSION else None
+            session = {
+                'start_wall_ns': wall_clock,
+                'start_ns': timestamp,
+                'end_ns': timestamp,
+                'tx_frames': 0,
+                'tx_bytes': 0,
+                'rx_bytes': 0,
+                'responses': [],
+                'latencies_ns': [],
+                'decode_errors': 0,
+                'book': StockBook(),
+                'pnl': PnLTracker(pnl_fill_model) if pnl_fill_model else None
+            }
+            sessions.append(session)
+            rx_buffer = bytearray()
+            last_tx = None
+            if direction == DIRECTION_SESSION:
+                continue
+
+        session['end_ns'] = timestamp
+        if direction == DIRECTION_TX:
+            session['tx_frames'] += 1
+            session['tx_bytes'] += len(payload)
+            last_tx = timestamp
+            stocks = _apply_tx_frame(session['book'], payload)
+            if session['pnl'] is not None:
+                for stock_id in stocks:
+                    session['pnl'].mark_from_book(stock_id, session['book'])
+        elif direction == DIRECTION_RX:
+            session['rx_bytes'] += len(payload)
+            rx_buffer.extend(payload)
+            while rx_buffer:
+                packet_length = rx_buffer[0]
+                if packet_length == 0:
+                    del rx_buffer[0]
+                    session['decode_errors'] += 1
+                    continue
+                if len(rx_buffer) < packet_length:
+                    break
+                packet = rx_buffer[:packet_length]
+                del rx_buffer[:packet_length]
+                parsed = parse_fpga_response_packet(packet)
+                if parsed is None:
+                    session['decode_errors'] += 1
+                    continue
+                parsed['timestamp_ns'] = timestamp
+                session['responses'].append(parsed)
+                if session['pnl'] is not None:
+                    session['pnl'].on_response(parsed, session['book'])
+                if last_tx is not None:
+                    session['latencies_ns'].append(timestamp - last_tx)
+
+    return sessions
+
+def _apply_tx_frame(book, frame):
+    # Returns the stock of every message in the frame
+    stocks = []
+    for codec, values in BOARD.decode_stream(frame):
+        stocks.append(values[0])
+        if codec.type_code == 'A' or codec.type_code == 'F':
+            stock_id, order_id = values[0], values[3]
+            book.add_order(order_id, stock_id, values[4] == BOARD_BUY, price_from_board(values[7]), values[5])
+        elif codec.type_code == 'E' or codec.type_code == 'C':
+            book.execute_order(values[3], values[4])
+        elif codec.type_code == 'X' or codec.type_code == 'D':
+            # The board deletes the whole order on CANCEL, whatever its quantity field says
+            book.remove_order(values[3])
+        elif codec.type_code == 'U':
+            book.replace_order(values[3], values[4], price_from_board(values[6]), values[5])
+    return stocks
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+def main():
+    """
+    Command line entry point: summarize or dump a capture file.
+    """
+    import argparse
+
+    from pnl_tracker import FILL_MODELS
+
+    parser = argparse.ArgumentParser(description="Inspect a wire capture recorded by the simulator")
+    parser.add_argument("capture_file")
+    parser.add_argument("--dump", action="store_true", help="Print every record")
+    parser.add_argument("--pnl", choices=FILL_MODELS,
+                        help="Account the board's responses as orders with this fill model")
+    args = parser.parse_args()
+
+    if args.dump:
+        for timestamp, direction, payload in read_capture(args.capture_file):
+            print(f"{timestamp} {DIRECTION_NAMES.get(direction, direction):7} "
+                  f"{' '.join(f'{b:02X}' for b in payload)}")
+        return
+
+    for index, session in enumerate(analyze_capture(args.capture_file, args.pnl)):
+        duration = (session['end_ns'] - session['start_ns']) / 1e9
+        latencies = sorted(session['latencies_ns'])
+        print(f"Session {index}: {duration:.3f} s, {session['tx_frames']} TX frames "
+              f"({session['tx_bytes']} bytes), {len(session['responses'])} responses "
+              f"({session['rx_bytes']} bytes), {session['decode_errors']} decode errors")
+        if latencies:
+            print(f"  Latency TX->RX: p50 {_percentile(latencies, 0.5) / 1e3:.1f} us, "
+                  f"p99 {_percentile(latencies, 0.99) / 1e3:.1f} us, max {latencies[-1] / 1e3:.1f} us")
+        book = session['book']
+        for stock_id in book.get_all_stocks():
+            best_buy = book.get_highest_buy(stock_id)
+            best_sell = book.get_lowest_sell(stock_id)
+            print(f"  Stock {stock_id}: {book.get_order_count(stock_id)} orders, "
+                  f"best buy {best_buy['price'] if best_buy else '-'}, "
+                  f"best sell {best_sell['price'] if best_sell else '-'}")
+        if session['pnl'] is not None:
+            for line in session['pnl'].summary_lines():
+                print(f"  {line}")
+
+if __name__ == "__main__":
+    main()